@@ -0,0 +1,308 @@
+"""
+Пакетная генерация договоров для набора ППЭ (все, по типу ГИА или по организации).
+Данные всех договоров загружаются заранее несколькими запросами на весь набор,
+а заполнение шаблонов docxtpl выполняется параллельно в пуле процессов.
+Результат и ошибка по каждому ППЭ записываются в манифест manifest.csv.
+
+Пример запуска:
+    python batch_contracts.py D:\\Договоры --gia-type 1 --date 01.03.2025
+    python batch_contracts.py D:\\Договоры --school-id 123 --workers 4
+"""
+
+import argparse
+import csv
+import io
+import os
+import re
+import time
+import logging
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+
+from database import (
+    execute_query, execute_queries, get_exam_year, update_equipment_agreements_bulk,
+    close_pool, database_error,
+)
+from progress import print_progress
+from repository import (
+    ContractRecord, EquipmentItem, PPE_CONTRACTS_BULK_QUERY, equipment_items_bulk_query, group_by_ppe,
+)
+from contracts import build_contract_context, render_contract, find_template
+
+logger = logging.getLogger('contracts')
+
+# Номер договора по умолчанию, как у get_default_contract_number;
+# доступны поля {ppe_id}, {ppe_number} и {school_id}
+DEFAULT_NUMBER_FORMAT = "ППЭ-{ppe_id}"
+MANIFEST_NAME = "manifest.csv"
+MANIFEST_COLUMNS = ["ppe_id", "ppe_number", "school_id", "contract_number", "status", "path", "error", "seconds"]
+
+PPE_SELECT_QUERY = """
+    SELECT id, ppe_number, ppe_address_fact, school_id, gia_type
+    FROM dat_ppe
+    WHERE {where}
+    ORDER BY id
+"""
+# Как DETAILS_QUERY и get_responsible_info_by_school_id: для организации берётся одна строка
+DETAILS_BULK_QUERY = """
+    SELECT DISTINCT ON (school_id)
+           school_id, fullname, address, inn, kpp, okpo, ogrn, cur_acc, bank_acc, pers_acc
+    FROM dat_ppe_details
+    WHERE school_id = ANY(%s)
+    ORDER BY school_id
+"""
+RESPONSIBLE_BULK_QUERY = """
+    SELECT DISTINCT ON (school_id) school_id, "position", surname, first_name, second_name
+    FROM dat_responsible
+    WHERE school_id = ANY(%s)
+    ORDER BY school_id
+"""
+
+_FILENAME_RE = re.compile(r'[\\/:*?"<>|]+')
+
+
+def select_ppes(gia_type=None, school_id=None):
+    """
+    ППЭ пакета: (id, ppe_number, ppe_address_fact, school_id, gia_type).
+    Без фильтров — все ППЭ.
+    """
+    conditions, params = ["TRUE"], []
+    if gia_type:
+        conditions.append("gia_type = %s")
+        params.append(gia_type)
+    if school_id is not None:
+        conditions.append("school_id = %s")
+        params.append(school_id)
+    return execute_query(PPE_SELECT_QUERY.format(where=" AND ".join(conditions)), tuple(params))
+
+def load_contexts(ppes):
+    """
+    Загружает данные договоров для всех ППЭ пакета одним пакетом запросов
+    (database.execute_queries: с psycopg 3 — за одну сетевую задержку).
+
+    Returns:
+        dict: ppe_id -> (реквизиты, ответственное лицо, спецификация, договоры)
+    """
+    ppe_ids = [ppe[0] for ppe in ppes]
+    school_ids = list({ppe[3] for ppe in ppes if ppe[3] is not None})
+    year = get_exam_year()
+    details_rows, responsible_rows, equipment_rows, contract_rows = execute_queries([
+        (DETAILS_BULK_QUERY, (school_ids,)),
+        (RESPONSIBLE_BULK_QUERY, (school_ids,)),
+        (equipment_items_bulk_query(), (year, ppe_ids)),
+        (PPE_CONTRACTS_BULK_QUERY, (year, ppe_ids)),
+    ])
+    details = {row[0]: tuple(row) for row in details_rows}
+    responsible = {
+        row[0]: {"job_title": row[1], "surname": row[2], "name": row[3], "second_name": row[4]}
+        for row in responsible_rows
+    }
+    equipment = group_by_ppe(equipment_rows, EquipmentItem)
+    contracts = group_by_ppe(contract_rows, ContractRecord)
+
+    empty_responsible = {"job_title": "", "surname": "", "name": "", "second_name": ""}
+    return {
+        ppe[0]: (
+            details.get(ppe[3]),
+            responsible.get(ppe[3], empty_responsible),
+            equipment.get(ppe[0], []),
+            contracts.get(ppe[0], []),
+        )
+        for ppe in ppes
+    }
+
+def _contract_filename(number, ppe_id, used):
+    """
+    Имя файла договора; при совпадении имён к нему добавляется id ППЭ,
+    а если занято и такое имя — порядковый номер.
+    """
+    base = f"Договор_{_FILENAME_RE.sub('_', number).strip()}"
+    name = f"{base}.docx"
+    if name in used:
+        name = f"{base}_{ppe_id}.docx"
+        suffix = 2
+        while name in used:
+            name = f"{base}_{ppe_id}_{suffix}.docx"
+            suffix += 1
+    used.add(name)
+    return name
+
+# ---------- Процессы пула ----------
+
+_template = None
+
+def _init_worker(template_path):
+    """Шаблон читается один раз на процесс, каждый договор заполняет его копию в памяти."""
+    global _template
+    with open(template_path, "rb") as f:
+        _template = f.read()
+
+def _render_job(job):
+    """Заполняет один договор; ошибка возвращается, а не пробрасывается, чтобы не остановить пакет."""
+    ppe_id, save_path, context = job
+    started = time.perf_counter()
+    try:
+        render_contract(io.BytesIO(_template), context, save_path)
+        return ppe_id, None, time.perf_counter() - started
+    except Exception as e:
+        return ppe_id, f"{type(e).__name__}: {e}", time.perf_counter() - started
+
+# ---------- Пакет ----------
+
+def generate_contracts_batch(output_dir, gia_type=None, school_id=None, contract_date=None,
+                             number_format=DEFAULT_NUMBER_FORMAT, workers=None,
+                             update_agreements=True, progress=None):
+    """
+    Генерирует договоры для набора ППЭ в каталог output_dir.
+
+    Args:
+        gia_type (int, optional): Только ППЭ этого типа ГИА
+        school_id (optional): Только ППЭ этой организации
+        contract_date (str, optional): Дата договоров ДД.ММ.ГГГГ (по умолчанию сегодня)
+        number_format (str): Шаблон номера договора
+        workers (int, optional): Число процессов (по умолчанию по числу ядер; 1 — без пула)
+        update_agreements (bool): Проставить agreement оборудованию ППЭ с готовым договором,
+            как при скачивании договора в интерфейсе
+        progress (callable, optional): progress(done, total) после каждого договора
+
+    Returns:
+        dict: Число договоров total, ok и errors, время elapsed (с), docs_per_sec, путь манифеста
+    """
+    started = time.perf_counter()
+    contract_date = contract_date or datetime.now().strftime("%d.%m.%Y")
+    workers = workers or os.cpu_count() or 1
+    template_path = find_template()
+    os.makedirs(output_dir, exist_ok=True)
+
+    ppes = select_ppes(gia_type, school_id)
+    contexts = load_contexts(ppes) if ppes else {}
+    load_seconds = time.perf_counter() - started
+
+    jobs, results, used_names = [], {}, set()
+    for ppe in ppes:
+        ppe_id, ppe_number, _, ppe_school_id, _ = ppe
+        number = number_format.format(ppe_id=ppe_id, ppe_number=ppe_number, school_id=ppe_school_id)
+        save_path = os.path.join(output_dir, _contract_filename(number, ppe_id, used_names))
+        details, responsible, equipment, contracts = contexts[ppe_id]
+        results[ppe_id] = {
+            "ppe_id": ppe_id, "ppe_number": ppe_number, "school_id": ppe_school_id,
+            "contract_number": number, "status": "error", "path": "", "error": "", "seconds": "",
+        }
+        try:
+            context = build_contract_context(
+                contracts, number, contract_date, tuple(ppe), details, equipment, responsible
+            )
+        except Exception as e:
+            results[ppe_id]["error"] = f"{type(e).__name__}: {e}"
+            continue
+        jobs.append((ppe_id, save_path, context))
+
+    def record(ppe_id, save_path, error, seconds):
+        result = results[ppe_id]
+        result["seconds"] = f"{seconds:.2f}"
+        if error:
+            result["error"] = error
+            logger.error(f"Договор ППЭ {ppe_id} не сформирован: {error}")
+        else:
+            result.update(status="ok", path=save_path)
+
+    total = len(ppes)
+    done = total - len(jobs)
+    if workers == 1 or len(jobs) <= 1:
+        _init_worker(template_path)
+        for job in jobs:
+            ppe_id, error, seconds = _render_job(job)
+            record(ppe_id, job[1], error, seconds)
+            done += 1
+            if progress:
+                progress(done, total)
+    else:
+        paths = {job[0]: job[1] for job in jobs}
+        with ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(template_path,)) as pool:
+            futures = [pool.submit(_render_job, job) for job in jobs]
+            for future in as_completed(futures):
+                try:
+                    ppe_id, error, seconds = future.result()
+                except BrokenProcessPool as e:
+                    # Процесс пула аварийно завершился — его договоры остаются с ошибкой
+                    logger.error(f"Пул процессов генерации договоров остановлен: {e}")
+                    break
+                record(ppe_id, paths[ppe_id], error, seconds)
+                done += 1
+                if progress:
+                    progress(done, total)
+
+    ok = [result for result in results.values() if result["status"] == "ok"]
+    if update_agreements and ok:
+        update_equipment_agreements_bulk(
+            [(result["ppe_id"], result["contract_number"], contract_date) for result in ok]
+        )
+
+    manifest_path = os.path.join(output_dir, MANIFEST_NAME)
+    with open(manifest_path, "w", newline="", encoding="utf-8-sig") as f:
+        writer = csv.DictWriter(f, fieldnames=MANIFEST_COLUMNS, delimiter=";")
+        writer.writeheader()
+        writer.writerows(results.values())
+
+    elapsed = time.perf_counter() - started
+    summary = {
+        "total": total,
+        "ok": len(ok),
+        "errors": total - len(ok),
+        "load_seconds": round(load_seconds, 2),
+        "elapsed": round(elapsed, 2),
+        "docs_per_sec": round(len(ok) / elapsed, 2) if elapsed else 0.0,
+        "workers": workers,
+        "manifest": manifest_path,
+    }
+    logger.info(f"Пакетная генерация договоров: {summary}")
+    return summary
+
+def main():
+    parser = argparse.ArgumentParser(description="Пакетная генерация договоров для набора ППЭ")
+    parser.add_argument("output_dir", help="Каталог для договоров и манифеста")
+    scope = parser.add_mutually_exclusive_group()
+    scope.add_argument("--gia-type", type=int, help="Только ППЭ типа ГИА (1 - ЕГЭ, 3 - ОГЭ)")
+    scope.add_argument("--school-id", help="Только ППЭ организации")
+    parser.add_argument("--date", help="Дата договоров ДД.ММ.ГГГГ (по умолчанию сегодня)")
+    parser.add_argument("--number-format", default=DEFAULT_NUMBER_FORMAT,
+                        help="Номер договора: поля {ppe_id}, {ppe_number}, {school_id}")
+    parser.add_argument("--workers", type=int, help="Число процессов (по умолчанию по числу ядер)")
+    parser.add_argument("--no-agreements", action="store_true",
+                        help="Не проставлять agreement оборудованию ППЭ")
+    parser.add_argument("--quiet", action="store_true", help="Не выводить ход генерации")
+    args = parser.parse_args()
+
+    if args.date:
+        try:
+            datetime.strptime(args.date, "%d.%m.%Y")
+        except ValueError:
+            parser.error("дата договоров должна быть в формате ДД.ММ.ГГГГ")
+
+    started = time.perf_counter()
+    progress = None if args.quiet else lambda done, total: print_progress(done, total, started, "договоров")
+    try:
+        summary = generate_contracts_batch(
+            args.output_dir, args.gia_type, args.school_id, args.date, args.number_format,
+            args.workers, not args.no_agreements, progress,
+        )
+    except (FileNotFoundError, database_error()) as e:
+        print(f"\nОшибка пакетной генерации: {e}")
+        raise SystemExit(1)
+    finally:
+        close_pool()
+
+    if progress:
+        print()
+    print(
+        f"Договоров: {summary['ok']} из {summary['total']}, ошибок: {summary['errors']}; "
+        f"загрузка данных {summary['load_seconds']} с, всего {summary['elapsed']} с, "
+        f"{summary['docs_per_sec']} договоров/с ({summary['workers']} процессов)"
+    )
+    print(f"Манифест: {summary['manifest']}")
+    if summary["errors"]:
+        raise SystemExit(1)
+
+if __name__ == "__main__":
+    main()
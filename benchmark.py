@@ -0,0 +1,458 @@
+"""
+Замеры производительности слоя работы с БД на локальном PostgreSQL.
+
+Пример запуска:
+    python benchmark.py pool --host localhost --user postgres --password postgres --ppe-id 1
+"""
+
+import argparse
+import gc
+import json
+import math
+import statistics
+import threading
+import time
+import tracemalloc
+from datetime import datetime
+
+import database
+from repository import EquipDataRecord
+
+
+def _percentile(values, pct):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+def _report(title, timings):
+    """Печатает сводку по списку замеров (в секундах)."""
+    ms = [t * 1000 for t in timings]
+    print(
+        f"{title:<40} n={len(ms):<5} "
+        f"mean={statistics.mean(ms):8.2f} мс  "
+        f"p50={_percentile(ms, 50):8.2f} мс  "
+        f"p95={_percentile(ms, 95):8.2f} мс"
+    )
+
+def _measure(func, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - started)
+    return timings
+
+# Запросы, которые выполняются при выборе одного ППЭ в интерфейсе
+def _ppe_select_queries(ppe_id):
+    return [
+        ("SELECT school_id FROM dat_ppe WHERE id = %s", (ppe_id,)),
+        ("SELECT gia_type FROM dat_ppe WHERE id = %s", (ppe_id,)),
+        ("""SELECT pd.fullname, pd.address, pd.inn, pd.kpp, pd.okpo, pd.ogrn
+            FROM dat_ppe p
+            LEFT JOIN dat_ppe_details pd ON p.school_id = pd.school_id
+            WHERE p.id = %s""", (ppe_id,)),
+        ("""SELECT r.position, r.surname, r.first_name, r.second_name
+            FROM dat_responsible r JOIN dat_ppe p ON r.school_id = p.school_id
+            WHERE p.id = %s""", (ppe_id,)),
+        ("""SELECT de.equip_type, de.equip_mark, de.equip_mod, de.release_year, ed.amount
+            FROM equip_data ed
+            JOIN dat_equip de ON ed.equip_id = de.id::INTEGER
+            WHERE ed.exam_year = %s AND ed.ppe_id = %s""", (database.EXAM_YEAR, ppe_id)),
+        ("""SELECT c.contract_date, c.contract_number, c.supplier, c.supplier_inn, c.contract_name
+            FROM dat_contract c
+            JOIN equip_data ed ON ed.contract_id = c.id AND ed.exam_year = c.exam_year
+            WHERE c.exam_year = %s AND ed.ppe_id = %s
+            GROUP BY c.exam_year, c.id""", (database.EXAM_YEAR, ppe_id)),
+    ]
+
+def _run_unpooled(queries):
+    """Прежнее поведение: новое соединение на каждый запрос."""
+    for query, params in queries:
+        conn = database.connect_to_database()
+        try:
+            cursor = conn.cursor()
+            cursor.execute(query, params)
+            cursor.fetchall()
+        finally:
+            conn.close()
+
+def _run_pooled(queries):
+    for query, params in queries:
+        database.execute_query(query, params)
+
+def bench_pool(args):
+    """Сравнение задержки выбора ППЭ без пула и с пулом соединений."""
+    queries = _ppe_select_queries(args.ppe_id)
+
+    _report("Без пула (соединение на запрос)",
+            _measure(lambda: _run_unpooled(queries), args.repeat))
+
+    database.get_pool()
+    _run_pooled(queries)  # прогрев пула
+    _report("С пулом соединений",
+            _measure(lambda: _run_pooled(queries), args.repeat))
+    print(f"Состояние пула: {database.get_pool().stats()}")
+    database.close_pool()
+
+def _save_contract_legacy(ppe_id, contract_number, contract_date, contract_name):
+    """Прежний путь сохранения: SELECT, затем UPDATE или INSERT, затем связывание."""
+    date_value = datetime.strptime(contract_date, "%d.%m.%Y")
+    year = database.EXAM_YEAR
+    existing = database.execute_query(
+        "SELECT id FROM dat_contract WHERE exam_year = %s AND contract_number = %s", (year, contract_number))
+    if existing:
+        result = database.execute_query(
+            "UPDATE dat_contract SET contract_date = %s, contract_name = %s "
+            "WHERE exam_year = %s AND id = %s RETURNING id",
+            (date_value, contract_name, year, existing[0][0]))
+    else:
+        result = database.execute_query(
+            "INSERT INTO dat_contract (exam_year, contract_number, contract_date, contract_name) "
+            "VALUES (%s, %s, %s, %s) RETURNING id",
+            (year, contract_number, date_value, contract_name))
+    database.execute_query(
+        "UPDATE equip_data SET contract_id = %s WHERE exam_year = %s AND ppe_id = %s",
+        (result[0][0], year, ppe_id), fetch=False)
+
+def _run_workstations(save, args):
+    """Запускает args.workstations потоков, каждый сохраняет args.saves договоров."""
+    errors = []
+    timings = []
+    lock = threading.Lock()
+
+    def worker(station):
+        for i in range(args.saves):
+            # Номера пересекаются между рабочими местами, чтобы проверить гонки
+            number = f"BENCH-{i % args.contracts}"
+            started = time.perf_counter()
+            try:
+                save(args.ppe_id, number, "01.02.2025", f"Замер {station}")
+            except Exception as e:
+                with lock:
+                    errors.append(e)
+                continue
+            with lock:
+                timings.append(time.perf_counter() - started)
+
+    threads = [threading.Thread(target=worker, args=(n,)) for n in range(args.workstations)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return timings, errors, time.perf_counter() - started
+
+def _cleanup_bench_contracts():
+    database.execute_query("""
+        UPDATE equip_data SET contract_id = NULL
+        WHERE contract_id IN (SELECT id FROM dat_contract WHERE contract_number LIKE 'BENCH-%%')
+    """, fetch=False)
+    database.execute_query(
+        "DELETE FROM dat_contract WHERE contract_number LIKE 'BENCH-%%'", fetch=False)
+
+def bench_contract_save(args):
+    """
+    Пропускная способность сохранения договоров с нескольких рабочих мест.
+    Внимание: меняет contract_id оборудования ППЭ --ppe-id, запускать только на тестовой базе.
+    """
+    database.POOL_CONFIG['maxconn'] = max(database.POOL_CONFIG['maxconn'], args.workstations)
+    variants = [
+        ("Прежнее сохранение (3-4 запроса)", _save_contract_legacy),
+        ("INSERT ... ON CONFLICT одной командой", database.save_contract_data),
+    ]
+    for title, save in variants:
+        _cleanup_bench_contracts()
+        timings, errors, elapsed = _run_workstations(save, args)
+        if timings:
+            _report(title, timings)
+        total = args.workstations * args.saves
+        print(f"{'':<40} {len(timings) / elapsed:8.1f} сохранений/с, ошибок: {len(errors)} из {total}")
+    _cleanup_bench_contracts()
+    database.close_pool()
+
+# Выборка с числовыми и датовыми столбцами для сравнения текстовой и бинарной передачи
+_TYPED_DUMP_QUERY = """
+    SELECT ed.ppe_id, ed.amount, de.equip_price, de.release_year, c.contract_date
+    FROM equip_data ed
+    JOIN dat_equip de ON ed.equip_id = de.id::INTEGER
+    LEFT JOIN dat_contract c ON c.id = ed.contract_id
+"""
+
+def bench_backends(args):
+    """Сравнение драйверов psycopg2 и psycopg 3 (pipeline, бинарные результаты)."""
+    queries = _ppe_select_queries(args.ppe_id)
+    for backend in ("psycopg2", "psycopg3"):
+        database.close_pool()
+        database.DB_BACKEND = backend
+        try:
+            database.execute_queries(queries)  # прогрев пула
+        except RuntimeError as e:
+            print(f"{backend}: {e}")
+            continue
+        _report(f"{backend}: запросы выбора ППЭ",
+                _measure(lambda: database.execute_queries(queries), args.repeat))
+        _report(f"{backend}: выгрузка чисел и дат",
+                _measure(lambda: database.execute_query(_TYPED_DUMP_QUERY), max(1, args.repeat // 10)))
+    database.close_pool()
+    database.DB_BACKEND = "psycopg2"
+
+def bench_prepared(args):
+    """Горячие запросы карточки ППЭ: обычное выполнение и подготовленные операторы."""
+    school_id = database.execute_query("SELECT school_id FROM dat_ppe WHERE id = %s", (args.ppe_id,))[0][0]
+    calls = [
+        ("ppe_equipment", (database.EXAM_YEAR, args.ppe_id)),
+        ("ppe_contracts", (database.EXAM_YEAR, database.EXAM_YEAR, args.ppe_id)),
+        ("ppe_details", (school_id,)),
+        ("responsible_person", (school_id,)),
+    ]
+
+    def run_plain():
+        for name, params in calls:
+            database.execute_query(database._statements[name], params)
+
+    def run_prepared():
+        for name, params in calls:
+            database.execute_prepared(name, params)
+
+    run_plain()
+    _report("Обычные запросы", _measure(run_plain, args.repeat))
+    _report("Подготовленные операторы", _measure(run_prepared, args.repeat))
+    for name, stats in database.get_prepared_stats().items():
+        print(f"  {name}: {stats}")
+    database.close_pool()
+
+# Строки equip_data размножаются generate_series до нужного числа
+_EQUIP_ROWS_QUERY = """
+    SELECT s.* FROM (
+        SELECT ed.ppe_id, de.equip_type, de.equip_mark, de.equip_mod, de.release_year,
+               de."name_in_1C", ed.inv_number, de.equip_price, ed.amount,
+               ed.agreement, ed.contract_id
+        FROM equip_data ed
+        JOIN dat_equip de ON ed.equip_id = de.id::INTEGER
+    ) s
+    CROSS JOIN generate_series(1, %(copies)s)
+    LIMIT %(rows)s
+"""
+_EQUIP_FIELDS = EquipDataRecord.__slots__
+
+def _load_tuples(params, batch_size):
+    rows = []
+    for batch in database.stream_query_batches(_EQUIP_ROWS_QUERY, params, batch_size):
+        rows.extend(batch)
+    return rows
+
+def _load_dicts(params, batch_size):
+    # Прежний путь: кортеж драйвера заворачивается в словарь для каждой строки
+    rows = []
+    for batch in database.stream_query_batches(_EQUIP_ROWS_QUERY, params, batch_size):
+        rows.extend(dict(zip(_EQUIP_FIELDS, row)) for row in batch)
+    return rows
+
+def _load_records(params, batch_size):
+    rows = []
+    for batch in database.stream_query_batches(_EQUIP_ROWS_QUERY, params, batch_size, record=EquipDataRecord):
+        rows.extend(batch)
+    return rows
+
+def bench_records(args):
+    """Память и время загрузки args.rows строк equip_data: кортежи, словари, записи __slots__."""
+    count = database.execute_query("SELECT count(*) FROM equip_data")[0][0]
+    if not count:
+        print("Таблица equip_data пуста")
+        return
+    params = {"rows": args.rows, "copies": math.ceil(args.rows / count)}
+    variants = [
+        ("Кортежи драйвера", _load_tuples),
+        ("Кортежи -> dict", _load_dicts),
+        ("Записи __slots__ (фабрика строк)", _load_records),
+    ]
+    baseline = None
+    for title, load in variants:
+        gc.collect()
+        started = time.perf_counter()
+        rows = load(params, args.batch_size)
+        elapsed = time.perf_counter() - started
+        loaded = len(rows)
+        del rows
+        gc.collect()
+
+        # Память замеряется отдельным проходом: tracemalloc замедляет загрузку
+        tracemalloc.start()
+        rows = load(params, args.batch_size)
+        retained = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        del rows
+
+        baseline = elapsed if baseline is None else baseline
+        print(
+            f"{title:<40} строк={loaded:<8} время={elapsed:7.2f} с  "
+            f"преобразование={elapsed - baseline:+6.2f} с  "
+            f"память={retained / 2**20:8.1f} МБ ({retained / max(loaded, 1):6.1f} байт/строка)"
+        )
+    database.close_pool()
+
+def bench_replicas(args):
+    """
+    Чтение карточки ППЭ с основного сервера и с реплики (--replica-port).
+    Для проверки достаточно двух локальных экземпляров PostgreSQL, второй —
+    реплика первого (pg_basebackup -R).
+    """
+    queries = _ppe_select_queries(args.ppe_id)
+
+    _run_pooled(queries)  # прогрев пула
+    _report("Основной сервер",
+            _measure(lambda: _run_pooled(queries), args.repeat))
+    database.close_pool()
+
+    database.DB_READ_REPLICAS[:] = [{"host": args.replica_host or args.host, "port": args.replica_port}]
+    # Отставание проверяется в фоне: до первой проверки чтение идёт с основного сервера
+    database.get_read_replicas().wait_checked(timeout=10)
+    _run_pooled(queries)
+    _report("Чтение с реплики",
+            _measure(lambda: _run_pooled(queries), args.repeat))
+    stats = database.get_routing_stats()
+    print(f"Маршрутизация: {stats}")
+    if not stats["reads"]:
+        print("Реплика недоступна или отстаёт — чтение шло с основного сервера")
+
+    # Сразу после записи чтение возвращается на основной сервер
+    database.execute_query("UPDATE dat_ppe SET id = id WHERE id = %s", (args.ppe_id,), fetch=False)
+    fallbacks = stats["fallbacks"]
+    _run_pooled(queries)
+    print(f"Чтений с основного сервера после записи: {database.get_routing_stats()['fallbacks'] - fallbacks}")
+    database.close_pool()
+
+# Синтетический набор за несколько лет в отдельной схеме: одна и та же таблица оборудования
+# без секций (как до миграции 9) и секционированная по exam_year, с одинаковыми индексами
+_PARTITION_SCHEMA = "bench_partitions"
+_PARTITION_PPE_COUNT = 1500
+_PARTITION_QUERIES = [
+    ("Страница оборудования ППЭ", """
+        SELECT id, equip_id, amount FROM {table}
+        WHERE exam_year = %(year)s AND ppe_id = %(ppe_id)s AND id > 0
+        ORDER BY id LIMIT 201
+    """, 1),
+    ("Оборудование ППЭ без договора", """
+        SELECT count(*) FROM {table}
+        WHERE exam_year = %(year)s AND ppe_id = %(ppe_id)s AND (agreement IS NULL OR agreement = '')
+    """, 1),
+    ("Сводка года по ППЭ", """
+        SELECT ppe_id, count(*) FROM {table}
+        WHERE exam_year = %(year)s
+        GROUP BY ppe_id
+    """, 10),
+]
+
+def _create_partition_dataset(years, per_year):
+    schema = _PARTITION_SCHEMA
+    statements = [
+        f"DROP SCHEMA IF EXISTS {schema} CASCADE",
+        f"CREATE SCHEMA {schema}",
+        f"""
+        CREATE TABLE {schema}.equip_flat (
+            id bigint PRIMARY KEY, exam_year smallint NOT NULL, ppe_id integer, equip_id integer,
+            inv_number text, amount integer, agreement text, contract_id integer
+        )
+        """,
+        f"""
+        CREATE TABLE {schema}.equip_part (LIKE {schema}.equip_flat, PRIMARY KEY (exam_year, id))
+        PARTITION BY LIST (exam_year)
+        """,
+        *[f"CREATE TABLE {schema}.equip_part_y{year} PARTITION OF {schema}.equip_part FOR VALUES IN ({year})"
+          for year in years],
+        f"""
+        INSERT INTO {schema}.equip_flat
+        SELECT g + 1, {years[0]} + g / {per_year}, 1 + g %% {_PARTITION_PPE_COUNT}, 1 + g %% 50,
+               'INV-' || g, 1,
+               CASE WHEN g %% 3 = 0 THEN NULL ELSE (g %% 1000) || '/' || ({years[0]} + g / {per_year}) END,
+               g %% 1000
+        FROM generate_series(0, {per_year * len(years) - 1}) g
+        """,
+        f"INSERT INTO {schema}.equip_part SELECT * FROM {schema}.equip_flat",
+    ]
+    # Индексы миграций 2 и 6 на обеих таблицах
+    for table in ("equip_flat", "equip_part"):
+        statements += [
+            f"CREATE INDEX ON {schema}.{table} (ppe_id)",
+            f"CREATE INDEX ON {schema}.{table} (ppe_id, id)",
+            f"CREATE INDEX ON {schema}.{table} (contract_id)",
+            f"CREATE INDEX ON {schema}.{table} (ppe_id) WHERE agreement IS NULL OR agreement = ''",
+            f"ANALYZE {schema}.{table}",
+        ]
+    for statement in statements:
+        database.execute_query(statement, fetch=False)
+
+def _plan_relations(plan):
+    """Таблицы и секции, которые читает план."""
+    found = [plan["Relation Name"]] if "Relation Name" in plan else []
+    for child in plan.get("Plans", []):
+        found.extend(_plan_relations(child))
+    return found
+
+def bench_partitions(args):
+    """
+    Запросы оборудования текущего года на синтетическом наборе за args.years лет
+    (args.rows строк): таблица без секций и секционированная по exam_year.
+    """
+    years = list(range(database.EXAM_YEAR - args.years + 1, database.EXAM_YEAR + 1))
+    per_year = max(1, args.rows // args.years)
+    started = time.perf_counter()
+    _create_partition_dataset(years, per_year)
+    print(f"Набор: {len(years)} лет по {per_year} строк, создан за {time.perf_counter() - started:.1f} с")
+
+    params = {"year": database.EXAM_YEAR, "ppe_id": args.ppe_id}
+    try:
+        for title, query, divisor in _PARTITION_QUERIES:
+            for label, table in (("без секций", "equip_flat"), ("секции по году", "equip_part")):
+                sql = query.format(table=f"{_PARTITION_SCHEMA}.{table}")
+                plan = database.execute_query("EXPLAIN (FORMAT JSON) " + sql, params)[0][0]
+                if isinstance(plan, str):
+                    plan = json.loads(plan)
+                relations = sorted(set(_plan_relations(plan[0]["Plan"])))
+                database.execute_query(sql, params)  # прогрев кэша страниц
+                _report(f"{title}: {label}",
+                        _measure(lambda: database.execute_query(sql, params), max(1, args.repeat // divisor)))
+                print(f"{'':<40} читает: {', '.join(relations)}")
+    finally:
+        database.execute_query(f"DROP SCHEMA IF EXISTS {_PARTITION_SCHEMA} CASCADE", fetch=False)
+        database.close_pool()
+
+BENCHMARKS = {
+    "pool": bench_pool,
+    "contract-save": bench_contract_save,
+    "backends": bench_backends,
+    "prepared": bench_prepared,
+    "records": bench_records,
+    "replicas": bench_replicas,
+    "partitions": bench_partitions,
+}
+
+def main():
+    parser = argparse.ArgumentParser(description="Замеры производительности работы с БД")
+    parser.add_argument("benchmark", choices=sorted(BENCHMARKS))
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("--port", type=int, default=5432)
+    parser.add_argument("--user", default="postgres")
+    parser.add_argument("--password", default="postgres")
+    parser.add_argument("--database", default="equipment_ppe")
+    parser.add_argument("--ppe-id", type=int, default=1)
+    parser.add_argument("--repeat", type=int, default=50)
+    parser.add_argument("--workstations", type=int, default=8)
+    parser.add_argument("--saves", type=int, default=100)
+    parser.add_argument("--contracts", type=int, default=5)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--batch-size", type=int, default=database.STREAM_BATCH_SIZE)
+    parser.add_argument("--replica-host")
+    parser.add_argument("--replica-port", type=int, default=5433)
+    parser.add_argument("--years", type=int, default=5)
+    args = parser.parse_args()
+
+    # Замеры выполняются только на локальном сервере, а не на рабочем
+    database.DB_CONFIG.update(
+        host=args.host, port=args.port, user=args.user,
+        password=args.password, database=args.database,
+    )
+    BENCHMARKS[args.benchmark](args)
+
+if __name__ == "__main__":
+    main()
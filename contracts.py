@@ -7,7 +7,8 @@ import os
 import logging
 from docxtpl import DocxTemplate
 from datetime import datetime
-from database import connect_to_database, execute_query, get_ppe_details
+from database import connect_to_database, execute_query, get_ppe_details, get_ppe_info, get_exam_year
+from repository import EquipmentItem, get_equipment_items, get_school_equipment_items
 from num2words import num2words
 
 # Настройка логирования
@@ -26,79 +27,20 @@ TEMPLATE_PATHS = [
 
 def get_equipment_list(ppe_number):
     """
-    Запрашивает данные оборудования, агрегирует и возвращает список словарей
+    Возвращает спецификацию оборудования ППЭ (записи EquipmentItem)
     для вставки в шаблон docxtpl (equipment_list).
-    Учитывает только оборудование с пустым полем agreement.
-    Теперь принимает ИНН вместо номера ППЭ.
-    """
-    query = """
-        SELECT
-        row_number() OVER (ORDER BY "name_in_1C") AS row_num,
-        "name_in_1C"                   AS equip_name,
-        COUNT(*)                       AS equip_count,
-        string_agg(DISTINCT inv_number::text, '\n ') AS inv_numbers,
-        equip_price                    AS price,
-        equip_price * COUNT(*)         AS total_price
-        FROM equip_data
-        JOIN "dat_equip"
-            ON "dat_equip"."id" = equip_data.equip_id
-        WHERE ppe_id = %s
-        GROUP BY "name_in_1C", equip_price
-        ORDER BY "name_in_1C";
     """
-
-    rows = execute_query(query, (ppe_number,))
-
-    equipment_list = []
-    for row in rows:
-        equipment_list.append({
-            "row_number":   row[0],
-            "equip_name":   row[1],
-            "count_equip":  row[2],
-            "inv_numbers":  row[3],
-            "equip_price":  f"{row[4]:.2f}",
-            "total_price":  f"{row[5]:.2f}"
-        })
-
+    equipment_list = get_equipment_items(ppe_number)
     logger.info(f"Получено {len(equipment_list)} позиций оборудования для организации для ППЭ {ppe_number}")
     return equipment_list
 
 def get_equipment_list_by_school_id(school_id):
     """
-    Запрашивает данные оборудования по school_id организации, агрегирует и возвращает список словарей
+    Возвращает спецификацию оборудования организации по school_id (записи EquipmentItem)
     для вставки в шаблон docxtpl (equipment_list).
     Учитывает только оборудование с пустым полем agreement.
     """
-    query = """
-        SELECT
-        row_number() OVER (ORDER BY "name_in_1C") AS row_num,
-        "name_in_1C"                   AS equip_name,
-        COUNT(*)                       AS equip_count,
-        string_agg(DISTINCT inv_number::text, '\n ') AS inv_numbers,
-        equip_price                    AS price,
-        equip_price * COUNT(*)         AS total_price
-        FROM equip_data
-        JOIN "dat_equip" ON "dat_equip"."id" = equip_data.equip_id
-        JOIN dat_ppe ON dat_ppe.id = equip_data.ppe_id
-        WHERE dat_ppe.school_id = %s
-        AND (agreement IS NULL OR agreement = '')
-        GROUP BY "name_in_1C", equip_price
-        ORDER BY "name_in_1C";
-    """
-
-    rows = execute_query(query, (school_id,))
-
-    equipment_list = []
-    for row in rows:
-        equipment_list.append({
-            "row_number":   row[0],
-            "equip_name":   row[1],
-            "count_equip":  row[2],
-            "inv_numbers":  row[3],
-            "equip_price":  f"{row[4]:.2f}",
-            "total_price":  f"{row[5]:.2f}"
-        })
-
+    equipment_list = get_school_equipment_items(school_id)
     logger.info(f"Получено {len(equipment_list)} позиций оборудования для организации с school_id {school_id}")
     return equipment_list
 
@@ -146,6 +88,195 @@ def find_template():
 
     raise FileNotFoundError("Шаблон договора не найден")
 
+# Реквизиты организации для договора (в индексе справочников нет банковских счетов)
+DETAILS_QUERY = """
+    SELECT pd.school_id, pd.fullname, pd.address, pd.inn, pd.kpp, pd.okpo, pd.ogrn, pd.cur_acc, pd.bank_acc, pd.pers_acc
+    FROM dat_ppe_details pd
+    JOIN dat_ppe p ON pd.school_id = p.school_id
+    WHERE p.school_id = %s
+    LIMIT 1
+"""
+
+_EMPTY_RESPONSIBLE = {
+    "job_title": "",
+    "surname": "",
+    "name": "",
+    "second_name": "",
+    "name_initial": "",
+    "second_name_initial": "",
+    "full_name_with_initials": "",
+    "responsible_fullname": "",
+    "job_title_genitive": "",
+    "surname_genitive": "",
+    "name_genitive": "",
+    "second_name_genitive": "",
+    "full_name_genitive": "",
+    "full_name_with_initials_genitive": "",
+    "job_title_and_full_name_genitive": "",
+    "job_title_and_full_name_with_initials_genitive": ""
+}
+
+def _responsible_context(responsible_info):
+    """Переменные шаблона для ответственного лица: ФИО, инициалы и родительный падеж."""
+    context = dict(responsible_info)
+
+    # Добавляем инициалы и полное ФИО с инициалами
+    if responsible_info["name"] and responsible_info["second_name"]:
+        name_initial = responsible_info["name"][0] if responsible_info["name"] else ""
+        second_name_initial = responsible_info["second_name"][0] if responsible_info["second_name"] else ""
+
+        context["name_initial"] = name_initial + "." if name_initial else ""
+        context["second_name_initial"] = second_name_initial + "." if second_name_initial else ""
+
+        # ФИО с инициалами (Иванов И.И.)
+        context["full_name_with_initials"] = (
+            f"{responsible_info['surname']} {context['name_initial']} {context['second_name_initial']}"
+        ).strip()
+
+        # ФИО полностью (Иванов Иван Иванович)
+        context["responsible_fullname"] = (
+            f"{responsible_info['surname']} {responsible_info['name']} {responsible_info['second_name']}"
+        ).strip()
+    else:
+        context["name_initial"] = ""
+        context["second_name_initial"] = ""
+        context["full_name_with_initials"] = responsible_info["surname"]
+        context["responsible_fullname"] = responsible_info["surname"]
+
+    # Добавляем версии в родительном падеже
+    try:
+        context["job_title_genitive"] = convert_to_genitive(responsible_info["job_title"])
+        context["surname_genitive"] = convert_to_genitive(responsible_info["surname"])
+        context["name_genitive"] = convert_to_genitive(responsible_info["name"])
+        context["second_name_genitive"] = convert_to_genitive(responsible_info["second_name"])
+
+        # Полное ФИО в родительном падеже
+        context["full_name_genitive"] = f"{context['surname_genitive']} {context['name_genitive']} {context['second_name_genitive']}".strip()
+
+        # ФИО с инициалами в родительном падеже
+        if context.get("name_initial") and context.get("second_name_initial"):
+            context["full_name_with_initials_genitive"] = f"{context['surname_genitive']} {context['name_initial']} {context['second_name_initial']}".strip()
+        else:
+            context["full_name_with_initials_genitive"] = context["surname_genitive"]
+
+        # Должность и ФИО в родительном падеже
+        context["job_title_and_full_name_genitive"] = f"{context.get('job_title_genitive', '')} {context.get('full_name_genitive', '')}".strip()
+        context["job_title_and_full_name_with_initials_genitive"] = f"{context.get('job_title_genitive', '')} {context.get('full_name_with_initials_genitive', '')}".strip()
+
+        logger.info(f"Добавлены переменные в родительном падеже: {context['job_title_genitive']}, {context['full_name_genitive']}")
+    except Exception as e:
+        logger.error(f"Ошибка при формировании родительного падежа: {e}")
+        # Устанавливаем значения по умолчанию
+        context["job_title_genitive"] = context.get("job_title", "")
+        context["surname_genitive"] = context.get("surname", "")
+        context["name_genitive"] = context.get("name", "")
+        context["second_name_genitive"] = context.get("second_name", "")
+        context["full_name_genitive"] = context.get("surname", "")
+        context["full_name_with_initials_genitive"] = context.get("surname", "")
+        context["job_title_and_full_name_genitive"] = f"{context.get('job_title', '')} {context.get('surname', '')}".strip()
+        context["job_title_and_full_name_with_initials_genitive"] = f"{context.get('job_title', '')} {context.get('surname', '')}".strip()
+    return context
+
+def build_contract_context(contracts_data, code_contract, contract_date, ppe, details, equipment_list, responsible_info):
+    """
+    Собирает контекст шаблона договора из уже полученных данных (без обращений к БД).
+
+    Args:
+        contracts_data (list): Контракты для вставки в шаблон (contracts)
+        ppe (tuple): (id, ppe_number, ppe_address_fact, school_id, gia_type) или None
+        details (tuple): Строка DETAILS_QUERY или None
+        equipment_list (list): Записи EquipmentItem; None — спецификацию получить не удалось
+        responsible_info (dict): Результат get_responsible_info_by_school_id; None — не удалось получить
+    """
+    # Проверка типа contract_date и преобразование в datetime, если это строка
+    if isinstance(contract_date, str):
+        contract_date = datetime.strptime(contract_date, "%d.%m.%Y")
+
+    # Инициализация контекста
+    context = {}
+
+    # Убедимся, что contract_date - это объект datetime
+    if isinstance(contract_date, datetime):
+        day_int = int(contract_date.day)
+        month_int = int(contract_date.month)
+        year_int = int(contract_date.year)
+        month_rus = build_month_name_rus(month_int)
+
+        # Подготовка контекста для шаблона
+        context = {
+            "code_contract": code_contract,
+            "day": day_int,
+            "month_name": month_rus,
+            "year": year_int,
+            "year_next": int(year_int) + 1,  # Увеличиваем год на 1
+        }
+
+    # Формирование контекста для контрактов
+    context["contracts"] = contracts_data
+
+    if details:
+        # Добавляем все реквизиты в контекст с правильными именами полей
+        context["school_id"] = details[0] if details[0] else ""
+        context["school_fullname"] = details[1] if details[1] else ""
+        context["school_address"] = details[2] if details[2] else ""
+        context["INN"] = details[3] if details[3] else ""
+        context["KPP"] = details[4] if details[4] else ""
+        context["OKPO"] = details[5] if details[5] else ""
+        context["OGRN"] = details[6] if details[6] else ""
+        context["cur_acc"] = details[7] if details[7] else ""
+        context["bank_acc"] = details[8] if details[8] else ""
+        context["pers_acc"] = details[9] if details[9] else ""
+
+        # Дублируем некоторые поля с разными именами для совместимости с шаблоном
+        context["fullname"] = context["school_fullname"]
+        context["address"] = context["school_address"]
+
+    if ppe:
+        context["ppe_address"] = ppe[2] if ppe[2] else ""
+
+    if equipment_list is None:
+        context["equipment_list"] = [
+            EquipmentItem(1, "Тестовое оборудование (ошибка при загрузке)", 1, "ERROR", 0, 0)
+        ]
+        context["total"] = "0.00"
+        context["total_price_text"] = "Ноль рублей 00 копеек"
+    else:
+        if not equipment_list:
+            logger.warning(f"Предупреждение: Список оборудования пуст для ППЭ {ppe[0] if ppe else None}")
+            # Добавляем тестовую запись для отладки
+            equipment_list = [EquipmentItem(1, "Тестовое оборудование", 1, "TEST123", 1000, 1000)]
+
+        context["equipment_list"] = equipment_list
+
+        total = float(sum(row.total for row in equipment_list))
+        context["total"] = f"{total:.2f}"
+        context["total_price_text"] = amount_to_text_rus(total)
+
+    if responsible_info is None:
+        # Добавляем пустые значения для полей ответственного
+        context.update(_EMPTY_RESPONSIBLE)
+    else:
+        context.update(_responsible_context(responsible_info))
+    return context
+
+def render_contract(template, context, save_path):
+    """
+    Заполняет шаблон договора контекстом и сохраняет документ.
+
+    Args:
+        template: Путь к шаблону или файловый объект (BytesIO с содержимым шаблона)
+    """
+    doc = DocxTemplate(template)
+    doc.render(context)
+
+    for table in doc.tables:
+        for row in list(table.rows):                         # делаем копию, иначе skip‑прыжки
+            if all(cell.text.strip() == "" for cell in row.cells):
+                row._tr.getparent().remove(row._tr)          # XML‑удаление :contentReference[oaicite:0]{index=0}
+
+    doc.save(save_path)
+    return save_path
+
 def generate_contract(contracts_data, save_path, code_contract, contract_date, ppe_number):
     """
     Генерирует договор на основе шаблона для нескольких контрактов.
@@ -160,209 +291,37 @@ def generate_contract(contracts_data, save_path, code_contract, contract_date, p
         if save_dir and not os.path.exists(save_dir):
             os.makedirs(save_dir)
 
-        # Проверка типа contract_date и преобразование в datetime, если это строка
-        if isinstance(contract_date, str):
-            contract_date = datetime.strptime(contract_date, "%d.%m.%Y")
-
-        # Инициализация контекста
-        context = {}
-
-        # Убедимся, что contract_date - это объект datetime
-        if isinstance(contract_date, datetime):
-            day_int = int(contract_date.day)
-            month_int = int(contract_date.month)
-            year_int = int(contract_date.year)
-            month_rus = build_month_name_rus(month_int)
-
-            # Подготовка контекста для шаблона
-            context = {
-                "code_contract": code_contract,
-                "day": day_int,
-                "month_name": month_rus,
-                "year": year_int,
-                "year_next": int(year_int) + 1,  # Увеличиваем год на 1
-            }
-
-        # 2. Формирование контекста для контрактов
-        context["contracts"] = contracts_data 
-
-        # Получаем school_id для ППЭ
-        query_school_id = """
-            SELECT school_id FROM dat_ppe
-            WHERE id = %s
-            LIMIT 1
-        """
-        school_id_result = execute_query(query_school_id, (ppe_number,))
-
-        # Используем обновленный запрос с правильными именами полей
-        query_details = """
-            SELECT pd.school_id, pd.fullname, pd.address, pd.inn, pd.kpp, pd.okpo, pd.ogrn, pd.cur_acc, pd.bank_acc, pd.pers_acc
-            FROM dat_ppe_details pd
-            JOIN dat_ppe p ON pd.school_id = p.school_id
-            WHERE p.school_id = %s
-            LIMIT 1
-        """
-        details_result = execute_query(query_details, (school_id_result[0],))
-
-        if details_result and len(details_result) > 0:
-            # Добавляем все реквизиты в контекст с правильными именами полей
-            context["school_id"] = details_result[0][0] if details_result[0][0] else ""
-            context["school_fullname"] = details_result[0][1] if details_result[0][1] else ""
-            context["school_address"] = details_result[0][2] if details_result[0][2] else ""
-            context["INN"] = details_result[0][3] if details_result[0][3] else ""
-            context["KPP"] = details_result[0][4] if details_result[0][4] else ""
-            context["OKPO"] = details_result[0][5] if details_result[0][5] else ""
-            context["OGRN"] = details_result[0][6] if details_result[0][6] else ""
-            context["cur_acc"] = details_result[0][7] if details_result[0][7] else ""
-            context["bank_acc"] = details_result[0][8] if details_result[0][8] else ""
-            context["pers_acc"] = details_result[0][9] if details_result[0][9] else ""
-
-            # Сохраняем ИНН для дальнейшего использования
-            inn = context["INN"]
-
-            # Дублируем некоторые поля с разными именами для совместимости с шаблоном
-            context["fullname"] = context["school_fullname"]
-            context["address"] = context["school_address"]
-
-            logger.info(f"Загружены реквизиты для school_id {school_id_result}: {context}")
-
-        query_ppe_address = """
-            SELECT ppe_address_fact FROM dat_ppe
-            WHERE id = %s
-        """
-        address_result = execute_query(query_ppe_address, (ppe_number,))
-        if address_result and len(address_result) > 0:
-            context["ppe_address"] = address_result[0][0] if address_result[0][0] else ""
+        # school_id и адрес ППЭ берутся из индекса справочников (или с сервера, пока он не загружен)
+        ppe = get_ppe_info(ppe_number)
+        school_id = ppe[3] if ppe else None
+
+        details_result = execute_query(DETAILS_QUERY, (school_id,))
+        details = details_result[0] if details_result else None
+        if details:
+            logger.info(f"Загружены реквизиты для school_id {school_id}: {details}")
 
         try:
             # Используем ppe_id для получения списка оборудования
             equipment_list = get_equipment_list(ppe_number)  # Передаем номер ППЭ
-            context["equipment_list"] = equipment_list
-
-            if not equipment_list:
-                logger.warning(f"Предупреждение: Список оборудования пуст для {ppe_number}")
-                # Добавляем тестовую запись для отладки
-                equipment_list = [{
-                    "row_number": 1,
-                    "equip_name": "Тестовое оборудование",
-                    "count_equip": 1,
-                    "inv_numbers": "TEST123",
-                    "equip_price": "1000.00",
-                    "total_price": "1000.00"
-                }]
-
-            context["equipment_list"] = equipment_list
-
-            total = sum(float(row["total_price"]) for row in equipment_list)
-            context["total"] = f"{total:.2f}"
-            context["total_price_text"] = amount_to_text_rus(total)
-
-
-            logger.info(f"Список оборудования в контексте: {len(context.get('equipment_list', []))} позиций")
+            logger.info(f"Список оборудования в контексте: {len(equipment_list)} позиций")
         except Exception as e:
             logger.error(f"Ошибка при получении списка оборудования: {e}")
             import traceback
             logger.error(traceback.format_exc())
-            context["equipment_list"] = [{
-                "row_number": 1,
-                "equip_name": "Тестовое оборудование (ошибка при загрузке)",
-                "count_equip": 1,
-                "inv_numbers": "ERROR",
-                "equip_price": "0.00",
-                "total_price": "0.00"
-            }]
-            context["total"] = "0.00"
-            context["total_price_text"] = "Ноль рублей 00 копеек"
+            equipment_list = None
 
         try:
-            responsible_info = get_responsible_info_by_school_id(school_id_result[0])
+            responsible_info = get_responsible_info_by_school_id(school_id)
             logger.info(f"Получена информация об ответственном лице по ППЭ {ppe_number}: {responsible_info}")
-
-            # Добавляем базовую информацию об ответственном лице
-            context.update(responsible_info)
-
-            # Добавляем инициалы и полное ФИО с инициалами
-            if responsible_info["name"] and responsible_info["second_name"]:
-                name_initial = responsible_info["name"][0] if responsible_info["name"] else ""
-                second_name_initial = responsible_info["second_name"][0] if responsible_info["second_name"] else ""
-
-                context["name_initial"] = name_initial + "." if name_initial else ""
-                context["second_name_initial"] = second_name_initial + "." if second_name_initial else ""
-
-                # ФИО с инициалами (Иванов И.И.)
-                context["full_name_with_initials"] = (
-                    f"{responsible_info['surname']} {context['name_initial']} {context['second_name_initial']}"
-                ).strip()
-
-                # ФИО полностью (Иванов Иван Иванович)
-                context["responsible_fullname"] = (
-                    f"{responsible_info['surname']} {responsible_info['name']} {responsible_info['second_name']}"
-                ).strip()
-            else:
-                context["name_initial"] = ""
-                context["second_name_initial"] = ""
-                context["full_name_with_initials"] = responsible_info["surname"]
-                context["responsible_fullname"] = responsible_info["surname"]
-
-            # Добавляем версии в родительном падеже
-            try:
-                context["job_title_genitive"] = convert_to_genitive(responsible_info["job_title"])
-                context["surname_genitive"] = convert_to_genitive(responsible_info["surname"])
-                context["name_genitive"] = convert_to_genitive(responsible_info["name"])
-                context["second_name_genitive"] = convert_to_genitive(responsible_info["second_name"])
-
-                # Полное ФИО в родительном падеже
-                context["full_name_genitive"] = f"{context['surname_genitive']} {context['name_genitive']} {context['second_name_genitive']}".strip()
-
-                # ФИО с инициалами в родительном падеже
-                if context.get("name_initial") and context.get("second_name_initial"):
-                    context["full_name_with_initials_genitive"] = f"{context['surname_genitive']} {context['name_initial']} {context['second_name_initial']}".strip()
-                else:
-                    context["full_name_with_initials_genitive"] = context["surname_genitive"]
-
-                # Должность и ФИО в родительном падеже
-                context["job_title_and_full_name_genitive"] = f"{context.get('job_title_genitive', '')} {context.get('full_name_genitive', '')}".strip()
-                context["job_title_and_full_name_with_initials_genitive"] = f"{context.get('job_title_genitive', '')} {context.get('full_name_with_initials_genitive', '')}".strip()
-
-                logger.info(f"Добавлены переменные в родительном падеже: {context['job_title_genitive']}, {context['full_name_genitive']}")
-            except Exception as e:
-                logger.error(f"Ошибка при формировании родительного падежа: {e}")
-                # Устанавливаем значения по умолчанию
-                context["job_title_genitive"] = context.get("job_title", "")
-                context["surname_genitive"] = context.get("surname", "")
-                context["name_genitive"] = context.get("name", "")
-                context["second_name_genitive"] = context.get("second_name", "")
-                context["full_name_genitive"] = context.get("surname", "")
-                context["full_name_with_initials_genitive"] = context.get("surname", "")
-                context["job_title_and_full_name_genitive"] = f"{context.get('job_title', '')} {context.get('surname', '')}".strip()
-                context["job_title_and_full_name_with_initials_genitive"] = f"{context.get('job_title', '')} {context.get('surname', '')}".strip()
-
         except Exception as e:
             logger.error(f"Ошибка при получении информации об ответственном: {e}")
             import traceback
             logger.error(traceback.format_exc())
-            # Добавляем пустые значения для полей ответственного
-            context.update({
-                "job_title": "",
-                "surname": "",
-                "name": "",
-                "second_name": "",
-                "name_initial": "",
-                "second_name_initial": "",
-                "full_name_with_initials": "",
-                "responsible_fullname": "",
-                "job_title_genitive": "",
-                "surname_genitive": "",
-                "name_genitive": "",
-                "second_name_genitive": "",
-                "full_name_genitive": "",
-                "full_name_with_initials_genitive": "",
-                "job_title_and_full_name_genitive": "",
-                "job_title_and_full_name_with_initials_genitive": ""
-            })
-
-        # 9. Генерация документа
-        doc = DocxTemplate(template_path)
+            responsible_info = None
+
+        context = build_contract_context(
+            contracts_data, code_contract, contract_date, ppe, details, equipment_list, responsible_info
+        )
 
         # Выводим в лог ключи контекста для отладки
         logger.info(f"Ключи контекста: {list(context.keys())}")
@@ -375,15 +334,8 @@ def generate_contract(contracts_data, save_path, code_contract, contract_date, p
                     'job_title_and_full_name_genitive', 'job_title_and_full_name_with_initials_genitive']:
             logger.info(f"  {key}: {context.get(key, 'НЕ ЗАДАНО')}")
 
-        doc.render(context)
-
-        for table in doc.tables:
-            for row in list(table.rows):                         # делаем копию, иначе skip‑прыжки
-                if all(cell.text.strip() == "" for cell in row.cells):
-                    row._tr.getparent().remove(row._tr)          # XML‑удаление :contentReference[oaicite:0]{index=0}
-
-        # 10. Сохранение результата
-        doc.save(save_path)
+        # Генерация и сохранение документа
+        render_contract(template_path, context, save_path)
         logger.info(f"Договор сформирован и сохранён: {save_path}")
 
         return save_path
@@ -431,9 +383,9 @@ def get_contract_data_from_db(identifier, use_school_id=False):
                 c.contract_date,
                 c.contract_name
             FROM dat_contract c
-            JOIN equip_data ed ON ed.contract_id = c.id
+            JOIN equip_data ed ON ed.contract_id = c.id AND ed.exam_year = c.exam_year
             JOIN dat_ppe p ON p.id = ed.ppe_id
-            WHERE p.school_id = %s
+            WHERE c.exam_year = %s AND p.school_id = %s
             LIMIT 1
         """
     else:
@@ -443,12 +395,12 @@ def get_contract_data_from_db(identifier, use_school_id=False):
                 contract_date,
                 contract_name
             FROM dat_contract c
-            JOIN equip_data ed ON ed.contract_id = c.id
-            WHERE ed.ppe_id = %s
+            JOIN equip_data ed ON ed.contract_id = c.id AND ed.exam_year = c.exam_year
+            WHERE c.exam_year = %s AND ed.ppe_id = %s
             LIMIT 1
         """
 
-    rows = execute_query(query, (identifier,))
+    rows = execute_query(query, (get_exam_year(), identifier))
 
     if rows and len(rows) > 0:
         row = rows[0]
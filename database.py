@@ -4,10 +4,28 @@
 """
 
 import psycopg2
+import psycopg2.extensions
 import tkinter as tk
 from tkinter import ttk
 from datetime import datetime
+from dataclasses import dataclass, field
+import atexit
 import logging
+import re
+import threading
+import time
+import weakref
+from collections import defaultdict
+from contextlib import contextmanager
+from db_pool import ConnectionPool
+import db_psycopg3
+import query_stats
+from psycopg2.pool import PoolError
+from local_replica import LocalReplica, DEFAULT_REPLICA_PATH
+from db_listener import ChangeListener
+from reference_index import ReferenceIndex
+from read_replicas import ReadReplicaSet
+from query_cache import QueryCache, write_target_tables
 
 # Настройка логирования
 logging.basicConfig(
@@ -25,6 +43,110 @@ DB_CONFIG = {
     'database': 'equipment_ppe'
 }
 
+# Реплики только для чтения (потоковая репликация основного сервера). Параметры
+# каждой дополняют DB_CONFIG, например {'host': '192.168.1.240'} или {'port': 5433}
+DB_READ_REPLICAS = []
+
+# Маршрутизация чтения на реплики: max_lag — допустимое отставание реплики, сек.;
+# check_interval — сек. между проверками отставания; read_after_write — сек. после
+# записи, в течение которых чтение идёт с основного сервера (видны свои изменения);
+# connect_timeout — сек. ожидания соединения с репликой при проверке отставания
+READ_REPLICA_CONFIG = {
+    'max_lag': 5,
+    'check_interval': 10,
+    'read_after_write': 5,
+    'connect_timeout': 3
+}
+
+# Драйвер БД: 'psycopg2' или 'psycopg3' (pipeline mode и бинарная передача результатов)
+DB_BACKEND = 'psycopg2'
+
+# Параметры пула соединений
+POOL_CONFIG = {
+    'minconn': 1,
+    'maxconn': 8,
+    'checkout_timeout': 10,        # сек. ожидания свободного соединения
+    'health_check_interval': 30    # сек. простоя, после которых соединение проверяется
+}
+
+# Параметры кэша справочных данных
+CACHE_CONFIG = {
+    'max_entries': 512,
+    'ttl': 300                     # сек. жизни записи
+}
+
+# Размер пачки строк для потокового чтения серверным курсором
+STREAM_BATCH_SIZE = 1000
+
+# Год экзаменационной кампании. equip_data и dat_contract секционированы по exam_year
+# (миграция 9): запросы оборудования и договоров передают этот год, и планировщик
+# читает только секцию текущей кампании
+EXAM_YEAR = 2025
+EXAM_YEAR_TABLES = ("equip_data", "dat_contract")
+
+# Версия схемы (migrations.py), без которой запросы приложения не работают:
+# миграция 9 добавляет exam_year. Проверяется при создании пула; migrations.py
+# отключает проверку, так как сам обновляет схему
+REQUIRED_SCHEMA_VERSION = 9
+CHECK_SCHEMA_VERSION = True
+
+# Размер страницы списков ППЭ, оборудования и контрактов (постраничная выборка по ключу)
+PAGE_SIZE = 200
+
+# Ограничение времени выполнения запросов на сервере (statement_timeout), мс.
+# Действует внутри query_scope; запросы вне групп (загрузчики, выгрузки) не ограничиваются
+TIMEOUT_CONFIG = {
+    'interactive': 5000            # карточка ППЭ при выборе в списке
+}
+
+# Предзагрузка карточек соседних ППЭ списка (prefetch.py): depth — число ППЭ
+# в каждую сторону от выбранного, ttl — сек. жизни загруженной карточки
+PREFETCH_CONFIG = {
+    'enabled': True,
+    'depth': 2,
+    'ttl': 60
+}
+
+# Локальная реплика SQLite: список ППЭ и карточки читаются из неё,
+# а сервер догоняется в фоне раз в sync_interval секунд
+LOCAL_REPLICA_CONFIG = {
+    'enabled': True,
+    'path': DEFAULT_REPLICA_PATH,
+    'sync_interval': 60
+}
+
+# Индексы dat_ppe, dat_ppe_details и dat_responsible в памяти: загружаются при запуске,
+# перестраиваются раз в refresh_interval секунд и по уведомлениям об изменениях
+REFERENCE_INDEX_CONFIG = {
+    'enabled': True,
+    'refresh_interval': 300
+}
+
+_pool = None
+_pool_lock = threading.Lock()
+_read_replicas = None
+_last_write = 0.0                  # time.monotonic() последней записи на основной сервер
+_replica = None
+_reference = None
+_listener = None
+_stream_counter = 0
+query_cache = QueryCache(**CACHE_CONFIG)
+
+# Реестр подготовленных операторов: имя -> SQL с параметрами %s
+_statements = {}
+# Операторы, уже подготовленные на каждом соединении пула (psycopg2)
+_prepared_on = weakref.WeakKeyDictionary()
+_prepared_stats = defaultdict(lambda: {"prepares": 0, "executions": 0, "prepare_ms": 0.0, "execute_ms": 0.0})
+_prepared_lock = threading.Lock()
+
+# Группы запросов для отмены: группа текущего потока, открытые блоки query_scope
+# (группа -> число), выполняющиеся запросы (группа -> соединения) и отменённые группы
+_scope = threading.local()
+_scopes = defaultdict(int)
+_running = defaultdict(set)
+_cancelled = set()
+_cancel_lock = threading.Lock()
+
 def connect_to_database():
     """Установка соединения с базой данных PostgreSQL."""
     try:
@@ -34,44 +156,1147 @@ def connect_to_database():
         logger.error(f"Ошибка подключения к базе данных: {e}")
         raise
 
-def execute_query(query, params=None, fetch=True):
+def _driver():
+    """Возвращает модуль драйвера выбранного DB_BACKEND (для классов исключений)."""
+    if DB_BACKEND == 'psycopg3':
+        db_psycopg3._require_driver()
+        return db_psycopg3.psycopg
+    return psycopg2
+
+def database_error():
+    """
+    Класс ошибок драйвера БД выбранного DB_BACKEND (psycopg2.Error или psycopg.Error)
+    для обработки ошибок сервера в модулях, не зависящих от драйвера.
+    """
+    return _driver().Error
+
+class _RecordCursor(psycopg2.extensions.cursor):
+    """Курсор psycopg2, отдающий строки записями класса record вместо кортежей."""
+    record = None
+
+    def fetchone(self):
+        row = super().fetchone()
+        return None if row is None else self.record(*row)
+
+    def fetchmany(self, size=None):
+        record = self.record
+        return [record(*row) for row in super().fetchmany(self.arraysize if size is None else size)]
+
+    def fetchall(self):
+        record = self.record
+        return [record(*row) for row in super().fetchall()]
+
+    def __iter__(self):
+        record = self.record
+        for row in super().__iter__():
+            yield record(*row)
+
+_record_cursors = {}
+
+def _cursor_factory(record):
+    """Подкласс _RecordCursor для класса записи (создаётся один раз на класс)."""
+    factory = _record_cursors.get(record)
+    if factory is None:
+        factory = _record_cursors.setdefault(
+            record, type(f"{record.__name__}Cursor", (_RecordCursor,), {"record": record}))
+    return factory
+
+def _new_cursor(conn, record=None, name=None):
+    """
+    Курсор выбранного драйвера. С record строки результата сразу создаются
+    записями этого класса (record(*values)), без промежуточных кортежей у psycopg 3.
+    С name курсор серверный (именованный).
+    """
+    if DB_BACKEND == 'psycopg3':
+        return db_psycopg3.new_cursor(conn, record, name)
+    if record is None:
+        return conn.cursor(name=name) if name else conn.cursor()
+    return conn.cursor(name=name, cursor_factory=_cursor_factory(record))
+
+def _make_pool(config):
+    connect = db_psycopg3.connect if DB_BACKEND == 'psycopg3' else psycopg2.connect
+    return ConnectionPool(**POOL_CONFIG, connect=connect, errors=(_driver().Error,), **config)
+
+class SchemaVersionError(RuntimeError):
+    """Схема базы данных старее REQUIRED_SCHEMA_VERSION."""
+
+def _check_schema_version(pool):
+    """Останавливает запуск, если к базе не применены нужные миграции."""
+    with pool.connection(shared=False) as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT to_regclass('schema_migrations') IS NOT NULL")
+        version = None
+        if cursor.fetchone()[0]:
+            cursor.execute("SELECT max(version) FROM schema_migrations")
+            version = cursor.fetchone()[0]
+        conn.rollback()
+    if version is None or version < REQUIRED_SCHEMA_VERSION:
+        message = (
+            f"Схема базы данных устарела (версия {version or 0}, требуется {REQUIRED_SCHEMA_VERSION}): "
+            f"выполните python migrations.py migrate"
+        )
+        logger.error(message)
+        raise SchemaVersionError(message)
+
+def get_pool():
+    """Возвращает общий пул соединений, создавая его при первом обращении."""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                driver = _driver()
+                try:
+                    pool = _make_pool(DB_CONFIG)
+                except driver.Error as e:
+                    logger.error(f"Ошибка подключения к базе данных: {e}")
+                    raise
+                if CHECK_SCHEMA_VERSION:
+                    try:
+                        _check_schema_version(pool)
+                    except Exception:
+                        pool.closeall()
+                        raise
+                _pool = pool
+                atexit.register(close_pool)
+    return _pool
+
+def get_connection(shared=True):
+    """
+    Контекстный менеджер для получения соединения из пула.
+
+    Пример:
+        with get_connection() as conn:
+            cursor = conn.cursor()
+    """
+    return get_pool().connection(shared=shared)
+
+def get_read_replicas():
+    """Возвращает набор реплик для чтения или None, если реплики не настроены."""
+    global _read_replicas
+    if _read_replicas is None and DB_READ_REPLICAS:
+        with _pool_lock:
+            if _read_replicas is None:
+                _read_replicas = ReadReplicaSet(
+                    [{**DB_CONFIG, 'connect_timeout': READ_REPLICA_CONFIG['connect_timeout'], **replica}
+                     for replica in DB_READ_REPLICAS],
+                    _make_pool, _is_connection_error,
+                    max_lag=READ_REPLICA_CONFIG['max_lag'],
+                    check_interval=READ_REPLICA_CONFIG['check_interval'],
+                )
+    return _read_replicas
+
+def get_read_connection(shared=True):
+    """
+    Контекстный менеджер соединения для читающего запроса: с репликой, если она
+    не отстаёт больше допустимого, иначе (и сразу после записи) — с основным сервером.
+    """
+    replicas = get_read_replicas()
+    if replicas is None:
+        return get_connection(shared)
+    replica = None
+    if time.monotonic() - _last_write >= READ_REPLICA_CONFIG['read_after_write']:
+        replica = replicas.pick()
+    replicas.note_read(replica is not None)
+    if replica is None:
+        return get_connection(shared)
+    return replicas.connection(replica, shared)
+
+def _note_write():
+    """Отмечает запись на основной сервер: ближайшие чтения не уходят на реплики."""
+    global _last_write
+    _last_write = time.monotonic()
+
+# Запросы, которые нельзя выполнять на реплике: изменение данных, блокировки строк,
+# последовательности и функции, меняющие состояние сервера
+_PRIMARY_ONLY = re.compile(
+    r"\b(INSERT|UPDATE|DELETE|MERGE|SHARE|nextval|setval|pg_advisory\w*|pg_notify|txid_current\w*)\b",
+    re.IGNORECASE,
+)
+
+def _is_routable_read(query):
+    return _is_read_query(query) and not _PRIMARY_ONLY.search(query)
+
+def get_routing_stats():
+    """Счётчики чтений с реплик и с основного сервера, отставание реплик (None без реплик)."""
+    return _read_replicas.stats() if _read_replicas is not None else None
+
+def close_pool():
+    """Закрывает все соединения пула и пулов реплик."""
+    global _pool, _read_replicas
+    logger.info(f"Статистика кэша запросов: {query_cache.stats()}")
+    if _read_replicas is not None:
+        logger.info(f"Маршрутизация чтения на реплики: {_read_replicas.stats()}")
+    query_stats.dump_summary()
+    with _pool_lock:
+        if _pool is not None:
+            _pool.closeall()
+            _pool = None
+        if _read_replicas is not None:
+            _read_replicas.closeall()
+            _read_replicas = None
+
+def start_local_replica():
+    """
+    Открывает локальную реплику и запускает её фоновую синхронизацию.
+    Не обращается к серверу, поэтому не задерживает запуск приложения.
+
+    Returns:
+        LocalReplica: Реплика или None, если она отключена
+    """
+    global _replica
+    if not LOCAL_REPLICA_CONFIG['enabled']:
+        return None
+    if _replica is None:
+        _replica = LocalReplica(LOCAL_REPLICA_CONFIG['path'], LOCAL_REPLICA_CONFIG['sync_interval'])
+        _replica.start()
+    return _replica
+
+def get_replica():
+    """Возвращает реплику, если она запущена и уже синхронизирована, иначе None."""
+    if _replica is not None and _replica.is_ready():
+        return _replica
+    return None
+
+def start_reference_index():
+    """
+    Запускает фоновую загрузку индексов справочников.
+    До завершения первой загрузки запросы идут в реплику или на сервер.
+
+    Returns:
+        ReferenceIndex: Индексы или None, если они отключены
+    """
+    global _reference
+    if not REFERENCE_INDEX_CONFIG['enabled']:
+        return None
+    if _reference is None:
+        _reference = ReferenceIndex(REFERENCE_INDEX_CONFIG['refresh_interval'])
+        if _replica is not None:
+            # Реплика замечает изменения реквизитов и ответственных, о которых нет уведомлений
+            _replica.add_listener(
+                lambda changed: _reference.request_refresh()
+                if {"dat_ppe", "dat_ppe_details", "dat_responsible"} & set(changed) else None
+            )
+        _reference.start()
+    return _reference
+
+def get_reference_index():
+    """Возвращает индексы справочников, если они уже загружены, иначе None."""
+    if _reference is not None and _reference.loaded:
+        return _reference
+    return None
+
+def start_change_listener(callback):
+    """
+    Подписывается на уведомления об изменениях ППЭ, оборудования и договоров.
+
+    Перед вызовом callback(events) из фонового потока сбрасывается кэш
+    изменённых таблиц, догоняется локальная реплика и для каждого события
+    заполняется список затронутых ППЭ (ppe_ids).
+    """
+    global _listener
+
+    def on_events(events):
+        tables = {event.table for event in events}
+        if None in tables:
+            query_cache.clear()
+        else:
+            query_cache.invalidate(*tables)
+        if _reference is not None and tables & {None, "dat_ppe", "dat_ppe_details", "dat_responsible"}:
+            _reference.request_refresh()
+        if _replica is not None:
+            try:
+                _replica.sync()
+            except Exception as e:
+                logger.warning(f"Не удалось синхронизировать реплику по уведомлению: {e}")
+        for event in events:
+            event.ppe_ids = _changed_ppe_ids(event)
+        callback(events)
+
+    if _listener is None:
+        _listener = ChangeListener(DB_CONFIG, on_events, backend=DB_BACKEND)
+        _listener.start()
+    return _listener
+
+def _changed_ppe_ids(event):
+    """Определяет ППЭ, затронутые событием; None — неизвестно или любые."""
+    if event.ids is None:
+        return None
+    if event.table in ("dat_ppe", "equip_data"):
+        return [int(i) for i in event.ids]
+    if event.table == "dat_contract":
+        rows = execute_query(
+            "SELECT DISTINCT ppe_id FROM equip_data WHERE exam_year = %s AND contract_id = ANY(%s)",
+            (EXAM_YEAR, list(event.ids))
+        )
+        return [row[0] for row in rows]
+    if event.table in ("dat_ppe_details", "dat_responsible"):
+        # Ключ уведомления — school_id: реквизиты и ответственный относятся к организации
+        rows = execute_query("SELECT id FROM dat_ppe WHERE school_id = ANY(%s)", (list(event.ids),))
+        return [row[0] for row in rows]
+    return None
+
+def _is_connection_error(error):
+    driver = _driver()
+    return (isinstance(error, (PoolError, driver.OperationalError, driver.InterfaceError))
+            and not is_cancelled_error(error))
+
+def is_cancelled_error(error):
+    """Запрос прерван отменой cancel_queries или по statement_timeout."""
+    return isinstance(error, _driver().errors.QueryCanceled)
+
+@contextmanager
+def query_scope(group, timeout=None):
+    """
+    Относит запросы внутри блока (в текущем потоке) к группе group.
+
+    Выполняющиеся запросы группы можно прервать из другого потока вызовом
+    cancel_queries(group); timeout (мс) задаёт statement_timeout каждому запросу.
+
+    Пример:
+        with query_scope(f"ppe-{ppe_id}", TIMEOUT_CONFIG['interactive']):
+            bundle = get_ppe_bundle(ppe_id)
+    """
+    previous = getattr(_scope, "current", None)
+    _scope.current = (group, timeout)
+    with _cancel_lock:
+        _scopes[group] += 1
+    try:
+        yield
+    finally:
+        _scope.current = previous
+        with _cancel_lock:
+            _scopes[group] -= 1
+            if not _scopes[group]:
+                del _scopes[group]
+                _cancelled.discard(group)
+
+def cancel_queries(group):
     """
-    Выполняет SQL-запрос к базе данных.
+    Отменяет запросы группы: выполняющиеся прерываются на сервере (connection.cancel),
+    последующие запросы группы завершаются ошибкой QueryCanceled без обращения к серверу.
+
+    Returns:
+        int: Число прерванных выполняющихся запросов
+    """
+    with _cancel_lock:
+        if group not in _scopes:
+            return 0
+        _cancelled.add(group)
+        connections = list(_running.get(group, ()))
+        for conn in connections:
+            try:
+                conn.cancel()
+            except _driver().Error as e:
+                logger.warning(f"Не удалось отменить запрос группы {group}: {e}")
+    if connections:
+        logger.info(f"Отменено запросов группы {group}: {len(connections)}")
+    return len(connections)
+
+@contextmanager
+def _scoped(conn):
+    """Регистрирует запрос группы текущего потока на соединении conn на время выполнения."""
+    current = getattr(_scope, "current", None)
+    if current is None:
+        yield
+        return
+    group, timeout = current
+    with _cancel_lock:
+        if group in _cancelled:
+            raise _driver().errors.QueryCanceled(f"Запросы группы {group} отменены")
+        _running[group].add(conn)
+    try:
+        if timeout:
+            # SET LOCAL действует до конца транзакции запроса
+            conn.cursor().execute("SELECT set_config('statement_timeout', %s, true)", (str(int(timeout)),))
+        yield
+    finally:
+        with _cancel_lock:
+            _running[group].discard(conn)
+            if not _running[group]:
+                del _running[group]
+
+def _is_read_query(query):
+    # WITH ... AS (INSERT/UPDATE/DELETE ...) — запись: её нельзя повторять после обрыва
+    return (query.lstrip().split(None, 1)[0].upper() in ("SELECT", "WITH")
+            and not write_target_tables(query))
+
+def execute_query(query, params=None, fetch=True, record=None):
+    """
+    Выполняет SQL-запрос к базе данных через пул соединений.
     
     Args:
         query (str): SQL-запрос
         params (tuple, optional): Параметры запроса
         fetch (bool, optional): Нужно ли возвращать результат запроса
+        record (type, optional): Класс записи для строк результата (repository.py)
         
     Returns:
         list: Результат запроса или None в случае ошибки
     """
-    conn = None
+    # Читающий запрос повторяется один раз, если соединение оборвалось
+    # (например, сервер был перезапущен) — пул выдаст новое соединение.
+    # Читающий запрос на реплике при обрыве повторяется уже на основном сервере:
+    # оборвавшаяся реплика исключается из чтения до следующей проверки.
+    driver = _driver()
+    attempts = 2 if _is_read_query(query) else 1
+    connection = get_read_connection if _is_routable_read(query) else get_connection
+    for attempt in range(attempts):
+        try:
+            with connection() as conn:
+                try:
+                    started = time.perf_counter()
+                    cursor = _new_cursor(conn, record)
+                    with _scoped(conn):
+                        cursor.execute(query, params or ())
+
+                        if fetch:
+                            result = cursor.fetchall()
+                            rows = len(result)
+                        else:
+                            result = cursor.rowcount
+                            rows = result
+                    conn.commit()
+                    query_stats.record(query, time.perf_counter() - started, rows)
+                    tables = write_target_tables(query)
+                    if tables:
+                        query_cache.invalidate(*tables)
+                    if connection is get_connection and not _is_read_query(query):
+                        _note_write()
+                    return result
+                except driver.Error:
+                    if not conn.closed:
+                        conn.rollback()
+                    raise
+        except (driver.OperationalError, driver.InterfaceError) as e:
+            if attempt + 1 < attempts and not is_cancelled_error(e):
+                logger.warning(f"Соединение потеряно, повтор запроса: {e}")
+                continue
+            logger.error(f"Ошибка выполнения запроса: {e}")
+            raise
+        except driver.Error as e:
+            logger.error(f"Ошибка выполнения запроса: {e}")
+            raise
+
+def execute_queries(queries):
+    """
+    Выполняет несколько независимых читающих запросов на одном соединении.
+    С драйвером psycopg 3 запросы отправляются пакетом в режиме pipeline,
+    то есть за одну сетевую задержку вместо одной на каждый запрос.
+
+    Args:
+        queries (list): Кортежи (запрос, параметры)
+
+    Returns:
+        list: Результаты запросов в том же порядке
+    """
+    driver = _driver()
+    routable = all(_is_routable_read(query) for query, _ in queries)
     try:
-        conn = connect_to_database()
-        cursor = conn.cursor()
-        cursor.execute(query, params or ())
-        
-        if fetch:
-            result = cursor.fetchall()
-        else:
-            conn.commit()
-            result = cursor.rowcount
-            
+        with (get_read_connection() if routable else get_connection()) as conn:
+            try:
+                with _scoped(conn):
+                    if DB_BACKEND == 'psycopg3':
+                        started = time.perf_counter()
+                        results = db_psycopg3.execute_pipeline(conn, queries)
+                        # В pipeline время отдельных запросов не разделить — учитывается пакет
+                        query_stats.record(
+                            "PIPELINE: " + " ; ".join(query for query, _ in queries),
+                            time.perf_counter() - started,
+                            sum(len(r) for r in results if isinstance(r, list))
+                        )
+                    else:
+                        results = []
+                        cursor = conn.cursor()
+                        for query, params in queries:
+                            started = time.perf_counter()
+                            cursor.execute(query, params or ())
+                            results.append(cursor.fetchall())
+                            query_stats.record(query, time.perf_counter() - started, len(results[-1]))
+                conn.commit()
+                return results
+            except driver.Error:
+                if not conn.closed:
+                    conn.rollback()
+                raise
+    except driver.Error as e:
+        logger.error(f"Ошибка выполнения пакета запросов: {e}")
+        raise
+
+def stream_query_batches(query, params=None, batch_size=STREAM_BATCH_SIZE, record=None):
+    """
+    Выполняет читающий запрос через именованный серверный курсор
+    и отдаёт результат пачками по batch_size строк.
+
+    Для курсора берётся отдельное соединение из пула, поэтому внутри цикла
+    можно выполнять другие запросы через execute_query.
+
+    Yields:
+        list: Очередная пачка строк
+    """
+    global _stream_counter
+    with _pool_lock:
+        _stream_counter += 1
+        cursor_name = f"stream_{threading.get_ident()}_{_stream_counter}"
+
+    driver = _driver()
+    connection = get_read_connection if _is_routable_read(query) else get_connection
+    with connection(shared=False) as conn:
+        cursor = _new_cursor(conn, record, cursor_name)
+        started = time.perf_counter()
+        total_rows = 0
+        try:
+            with _scoped(conn):
+                cursor.itersize = batch_size
+                cursor.execute(query, params or ())
+                while True:
+                    rows = cursor.fetchmany(batch_size)
+                    if not rows:
+                        break
+                    total_rows += len(rows)
+                    yield rows
+            # Учитывается полное время чтения, включая обработку пачек вызывающим кодом
+            query_stats.record(query, time.perf_counter() - started, total_rows)
+        except driver.Error as e:
+            logger.error(f"Ошибка выполнения потокового запроса: {e}")
+            raise
+        finally:
+            if not conn.closed:
+                try:
+                    cursor.close()
+                    conn.rollback()
+                except driver.Error:
+                    pass
+
+def stream_query(query, params=None, batch_size=STREAM_BATCH_SIZE):
+    """
+    Построчный генератор поверх stream_query_batches.
+    В памяти одновременно находится не более batch_size строк.
+    """
+    for rows in stream_query_batches(query, params, batch_size):
+        yield from rows
+
+def register_statement(name, query):
+    """
+    Регистрирует горячий запрос для выполнения подготовленным оператором.
+
+    Args:
+        name (str): Имя оператора (идентификатор SQL)
+        query (str): Читающий запрос с параметрами %s
+    """
+    _statements[name] = query.strip().rstrip(";")
+
+def _to_positional(query):
+    """Заменяет параметры %s на $1, $2, ... для команды PREPARE."""
+    parts = query.split("%s")
+    return "".join(part + (f"${i + 1}" if i < len(parts) - 1 else "") for i, part in enumerate(parts))
+
+def execute_prepared(name, params=(), record=None):
+    """
+    Выполняет зарегистрированный запрос подготовленным оператором.
+
+    Оператор готовится (разбор и анализ запроса) один раз на каждом соединении
+    пула и дальше выполняется по имени; после нескольких выполнений сервер
+    переходит на кэшированный общий план. С драйвером psycopg 3 используется
+    его собственная подготовка операторов (prepare=True).
+
+    Returns:
+        list: Результат запроса
+    """
+    query = _statements[name]
+    driver = _driver()
+    connection = get_read_connection if _is_routable_read(query) else get_connection
+    for attempt in range(2):
+        try:
+            with connection() as conn:
+                try:
+                    cursor = _new_cursor(conn, record)
+                    stats = _prepared_stats[name]
+                    with _scoped(conn):
+                        if DB_BACKEND == 'psycopg3':
+                            started = time.perf_counter()
+                            cursor.execute(query, params, prepare=True)
+                        else:
+                            prepared = _prepared_on.setdefault(conn, set())
+                            if name not in prepared:
+                                started = time.perf_counter()
+                                cursor.execute(f"PREPARE {name} AS {_to_positional(query)}")
+                                prepared.add(name)
+                                with _prepared_lock:
+                                    stats["prepares"] += 1
+                                    stats["prepare_ms"] += (time.perf_counter() - started) * 1000
+                            started = time.perf_counter()
+                            placeholders = ", ".join(["%s"] * len(params))
+                            cursor.execute(f"EXECUTE {name}" + (f" ({placeholders})" if params else ""), params)
+                        result = cursor.fetchall()
+                    conn.commit()
+                    elapsed = time.perf_counter() - started
+                    with _prepared_lock:
+                        stats["executions"] += 1
+                        stats["execute_ms"] += elapsed * 1000
+                    query_stats.record(query, elapsed, len(result))
+                    return result
+                except driver.Error:
+                    if not conn.closed:
+                        conn.rollback()
+                    raise
+        except (driver.OperationalError, driver.InterfaceError) as e:
+            if attempt == 0 and not is_cancelled_error(e):
+                logger.warning(f"Соединение потеряно, повтор оператора {name}: {e}")
+                continue
+            logger.error(f"Ошибка выполнения оператора {name}: {e}")
+            raise
+        except driver.Error as e:
+            logger.error(f"Ошибка выполнения оператора {name}: {e}")
+            raise
+
+def get_prepared_stats():
+    """
+    Возвращает статистику подготовленных операторов.
+
+    Для каждого оператора: число подготовок (по одной на соединение) и выполнений,
+    суммарное время подготовки и выполнения, а также счётчики общих и частных
+    планов сервера (generic_plans/custom_plans, PostgreSQL 14+) на соединении
+    текущего потока.
+    """
+    with _prepared_lock:
+        result = {name: dict(stats) for name, stats in _prepared_stats.items()}
+
+    if DB_BACKEND != 'psycopg3':
+        try:
+            with get_connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute("SELECT * FROM pg_prepared_statements")
+                columns = [column[0] for column in cursor.description]
+                rows = [dict(zip(columns, row)) for row in cursor.fetchall()]
+                conn.rollback()
+        except _driver().Error as e:
+            logger.warning(f"Не удалось получить статистику планов: {e}")
+            rows = []
+        for row in rows:
+            if row["name"] in result:
+                result[row["name"]]["generic_plans"] = row.get("generic_plans")
+                result[row["name"]]["custom_plans"] = row.get("custom_plans")
+
+    for stats in result.values():
+        repeated = stats["executions"] - stats["prepares"]
+        if stats["prepares"] and repeated > 0:
+            # Разбор и анализ не повторяются при каждом выполнении
+            stats["saved_prepare_ms"] = round(stats["prepare_ms"] / stats["prepares"] * repeated, 2)
+    return result
+
+def cached_prepared(name, params=(), tables=(), record=None):
+    """Как cached_query, но промах кэша выполняется подготовленным оператором."""
+    key = query_cache.make_key(name, params)
+    found, result = query_cache.get(key)
+    if found:
         return result
-    except psycopg2.Error as e:
-        logger.error(f"Ошибка выполнения запроса: {e}")
-        if conn:
-            conn.rollback()
+    result = execute_prepared(name, params, record)
+    query_cache.put(key, result, tables)
+    return result
+
+def cached_query(query, params=None, tables=()):
+    """
+    Выполняет читающий запрос с кэшированием результата.
+
+    Args:
+        query (str): SQL-запрос
+        params (tuple, optional): Параметры запроса
+        tables (iterable): Таблицы, при изменении которых результат сбрасывается
+
+    Returns:
+        list: Результат запроса
+    """
+    key = query_cache.make_key(query, params)
+    found, result = query_cache.get(key)
+    if found:
+        return result
+    result = execute_query(query, params)
+    query_cache.put(key, result, tables)
+    return result
+
+def invalidate_cache(*tables):
+    """Сбрасывает кэш для указанных таблиц (вызывается путями записи)."""
+    return query_cache.invalidate(*tables)
+
+def get_cache_stats():
+    """Возвращает счётчики попаданий и промахов кэша запросов."""
+    return query_cache.stats()
+
+def get_ppe_list(gia_type=None):
+    """
+    Получает список ППЭ (id, ppe_address_fact), опционально по типу ГИА.
+    Порядок (ppe_number, id) общий для всех списков ППЭ, включая постраничный.
+    """
+    replica = get_replica()
+    if replica is not None:
+        return replica.get_ppe_list(gia_type)
+    if gia_type:
+        query = "SELECT id, ppe_address_fact FROM dat_ppe WHERE gia_type = %s ORDER BY ppe_number, id"
+        return cached_query(query, (gia_type,), tables=("dat_ppe",))
+    query = "SELECT id, ppe_address_fact FROM dat_ppe ORDER BY ppe_number, id"
+    return cached_query(query, tables=("dat_ppe",))
+
+def get_ppe_row(ppe_id):
+    """Получает строку списка ППЭ (id, ppe_address_fact, gia_type) или None."""
+    replica = get_replica()
+    if replica is not None:
+        return replica.get_ppe_row(ppe_id)
+    rows = execute_query("SELECT id, ppe_address_fact, gia_type FROM dat_ppe WHERE id = %s", (ppe_id,))
+    return rows[0] if rows else None
+
+@dataclass
+class PPEChanges:
+    """Изменения списка ППЭ с момента предыдущего токена."""
+    changed: list = field(default_factory=list)          # (id, ppe_address_fact, gia_type, ppe_number) новых и изменённых ППЭ
+    deleted: list = field(default_factory=list)          # id удалённых ППЭ
+    related_ppe_ids: list = field(default_factory=list)  # ППЭ с изменёнными реквизитами или ответственным
+    token: int = None                                    # передаётся в следующий вызов
+    full: bool = False                                   # changed содержит весь список
+
+def get_ppe_changes_since(token=None):
+    """
+    Возвращает изменения dat_ppe (и связанных dat_ppe_details, dat_responsible)
+    после token. Без token возвращается весь список (full=True).
+
+    Токен — xmin снимка: все транзакции с меньшим номером к моменту чтения
+    завершены, поэтому строки с row_version >= token покрывают все изменения,
+    которые ещё не были видны. Требует миграции 5.
+
+    Returns:
+        PPEChanges: Новые и изменённые строки, удалённые id и новый токен
+    """
+    driver = _driver()
+    try:
+        with get_connection() as conn:
+            try:
+                started = time.perf_counter()
+                cursor = conn.cursor()
+                # Все запросы читают один снимок
+                cursor.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ")
+                cursor.execute("SELECT txid_snapshot_xmin(txid_current_snapshot())")
+                new_token = cursor.fetchone()[0]
+                if token is not None:
+                    # Записи журнала удалений после token уже удалены (prune-deleted, миграция 11)
+                    cursor.execute("SELECT to_regclass('delete_log_horizon') IS NOT NULL")
+                    if cursor.fetchone()[0]:
+                        cursor.execute(
+                            "SELECT row_version >= %s FROM delete_log_horizon WHERE table_name = 'dat_ppe'",
+                            (token,)
+                        )
+                        pruned = cursor.fetchone()
+                        if pruned and pruned[0]:
+                            token = None
+                changes = PPEChanges(token=new_token, full=token is None)
+
+                if token is None:
+                    cursor.execute("SELECT id, ppe_address_fact, gia_type, ppe_number FROM dat_ppe")
+                    changes.changed = cursor.fetchall()
+                else:
+                    cursor.execute(
+                        "SELECT id, ppe_address_fact, gia_type, ppe_number FROM dat_ppe WHERE row_version >= %s",
+                        (token,)
+                    )
+                    changes.changed = cursor.fetchall()
+                    # Удалённый и заново созданный id удалённым не считается
+                    cursor.execute("""
+                        SELECT d.id FROM dat_ppe_deleted d
+                        WHERE d.row_version >= %s
+                        AND NOT EXISTS (SELECT 1 FROM dat_ppe p WHERE p.id = d.id)
+                    """, (token,))
+                    changes.deleted = [row[0] for row in cursor.fetchall()]
+                    cursor.execute("""
+                        SELECT DISTINCT p.id FROM dat_ppe p
+                        WHERE p.school_id IN (
+                            SELECT school_id FROM dat_ppe_details WHERE row_version >= %(token)s
+                            UNION
+                            SELECT school_id FROM dat_responsible WHERE row_version >= %(token)s
+                        )
+                    """, {"token": token})
+                    changes.related_ppe_ids = [row[0] for row in cursor.fetchall()]
+                conn.commit()
+                query_stats.record("get_ppe_changes_since", time.perf_counter() - started,
+                                   len(changes.changed) + len(changes.deleted))
+            except driver.Error:
+                if not conn.closed:
+                    conn.rollback()
+                raise
+    except driver.Error as e:
+        logger.error(f"Ошибка получения изменений списка ППЭ: {e}")
         raise
-    finally:
-        if conn:
-            conn.close()
 
-def get_ppe_list():
-    """Получает список всех ППЭ из базы данных."""
-    query = "SELECT id, ppe_address_fact FROM dat_ppe ORDER BY ppe_number"
-    return execute_query(query)
+    if changes.changed or changes.deleted:
+        query_cache.invalidate("dat_ppe")
+    if changes.related_ppe_ids:
+        query_cache.invalidate("dat_ppe_details", "dat_responsible")
+    return changes
+
+def _batches(rows, batch_size):
+    for start in range(0, len(rows), batch_size):
+        yield rows[start:start + batch_size]
+
+def iter_ppe_list(gia_type=None, batch_size=STREAM_BATCH_SIZE):
+    """Потоково отдаёт пачки (id, ppe_address_fact) списка ППЭ, опционально по типу ГИА."""
+    replica = get_replica()
+    if replica is not None:
+        return _batches(replica.get_ppe_list(gia_type), batch_size)
+    if gia_type:
+        query = "SELECT id, ppe_address_fact FROM dat_ppe WHERE gia_type = %s ORDER BY ppe_number, id"
+        return stream_query_batches(query, (gia_type,), batch_size)
+    query = "SELECT id, ppe_address_fact FROM dat_ppe ORDER BY ppe_number, id"
+    return stream_query_batches(query, batch_size=batch_size)
+
+def iter_equip_data(ppe_id=None, batch_size=STREAM_BATCH_SIZE, record=None):
+    """
+    Потоково отдаёт пачки строк equip_data с данными оборудования для выгрузок
+    (кортежи или записи record, например repository.EquipDataRecord).
+    """
+    query = """
+        SELECT ed.ppe_id, de.equip_type, de.equip_mark, de.equip_mod, de.release_year,
+               de."name_in_1C", ed.inv_number, de.equip_price, ed.amount,
+               ed.agreement, ed.contract_id
+        FROM equip_data ed
+        JOIN dat_equip de ON ed.equip_id = de.id::INTEGER
+        WHERE ed.exam_year = %s
+    """
+    if ppe_id is not None:
+        return stream_query_batches(
+            query + " AND ed.ppe_id = %s ORDER BY ed.id", (EXAM_YEAR, ppe_id), batch_size, record)
+    return stream_query_batches(query + " ORDER BY ed.ppe_id, ed.id", (EXAM_YEAR,), batch_size, record)
+
+def _page(rows, limit, key):
+    """
+    Отрезает строку-признак следующей страницы (запрашивается limit + 1 строк).
+
+    Returns:
+        tuple: (строки страницы, ключ следующей страницы или None)
+    """
+    if len(rows) > limit:
+        rows = rows[:limit]
+        return rows, key(rows[-1])
+    return rows, None
+
+PPE_PAGE_QUERY = """
+    SELECT id, ppe_address_fact, ppe_number
+    FROM dat_ppe
+    WHERE {where}
+    ORDER BY ppe_number, id
+    LIMIT %s
+"""
+
+def get_ppe_page(after=None, gia_type=None, limit=PAGE_SIZE):
+    """
+    Страница списка ППЭ в порядке (ppe_number, id), начиная после ключа after.
+
+    Args:
+        after (tuple, optional): Ключ (ppe_number, id) последней строки предыдущей страницы
+        gia_type (int, optional): Фильтр по типу ГИА
+
+    Returns:
+        tuple: (строки (id, ppe_address_fact, ppe_number), ключ следующей страницы или None)
+    """
+    replica = get_replica()
+    if replica is not None:
+        rows = replica.get_ppe_page(after, gia_type, limit + 1)
+    else:
+        conditions, params = ["TRUE"], []
+        if gia_type:
+            conditions.append("gia_type = %s")
+            params.append(gia_type)
+        if after is not None:
+            # ППЭ без номера идут последними; сравнение кортежей с NULL их не находит
+            if after[0] is None:
+                conditions.append("ppe_number IS NULL AND id > %s")
+                params.append(after[1])
+            else:
+                conditions.append("((ppe_number, id) > (%s, %s) OR ppe_number IS NULL)")
+                params.extend(after)
+        query = PPE_PAGE_QUERY.format(where=" AND ".join(conditions))
+        rows = execute_query(query, tuple(params) + (limit + 1,))
+    return _page(rows, limit, lambda row: (row[2], row[0]))
+
+def count_ppe(gia_type=None):
+    """Количество ППЭ, опционально по типу ГИА (для заголовка постраничного списка)."""
+    replica = get_replica()
+    if replica is not None:
+        return replica.count_ppe(gia_type)
+    if gia_type:
+        rows = cached_query("SELECT COUNT(*) FROM dat_ppe WHERE gia_type = %s", (gia_type,), tables=("dat_ppe",))
+    else:
+        rows = cached_query("SELECT COUNT(*) FROM dat_ppe", tables=("dat_ppe",))
+    return rows[0][0]
+
+EQUIPMENT_PAGE_QUERY = """
+    SELECT de.equip_type, de.equip_mark, de.equip_mod, de.release_year, ed.amount, ed.id
+    FROM equip_data ed
+    JOIN dat_equip de ON ed.equip_id = de.id::INTEGER
+    WHERE ed.exam_year = %s AND ed.ppe_id = %s AND ed.id > %s
+    ORDER BY ed.id
+    LIMIT %s
+"""
+
+def get_equipment_page(ppe_id, after=None, limit=PAGE_SIZE):
+    """
+    Страница оборудования ППЭ в порядке equip_data.id.
+
+    Returns:
+        tuple: (строки (equip_type, equip_mark, equip_mod, release_year, amount, id),
+                ключ следующей страницы или None)
+    """
+    replica = get_replica()
+    if replica is not None:
+        rows = replica.get_equipment_page(ppe_id, after, limit + 1)
+    else:
+        rows = execute_query(EQUIPMENT_PAGE_QUERY, (EXAM_YEAR, ppe_id, after or 0, limit + 1))
+    return _page(rows, limit, lambda row: row[5])
+
+CONTRACTS_PAGE_QUERY = """
+    SELECT contract_date, contract_number, supplier, supplier_inn, contract_name, id
+    FROM dat_contract
+    WHERE exam_year = %s
+    AND id IN (SELECT contract_id FROM equip_data WHERE exam_year = %s AND ppe_id = %s)
+    AND id > %s
+    ORDER BY id
+    LIMIT %s
+"""
+
+def get_contracts_page(ppe_id, after=None, limit=PAGE_SIZE):
+    """
+    Страница контрактов ППЭ в порядке dat_contract.id (порядке регистрации).
+
+    Returns:
+        tuple: (строки (contract_date, contract_number, supplier, supplier_inn, contract_name, id),
+                ключ следующей страницы или None)
+    """
+    replica = get_replica()
+    if replica is not None:
+        rows = [(_parse_json_date(row[0]),) + tuple(row[1:])
+                for row in replica.get_contracts_page(ppe_id, after, limit + 1)]
+    else:
+        rows = execute_query(CONTRACTS_PAGE_QUERY, (EXAM_YEAR, EXAM_YEAR, ppe_id, after or 0, limit + 1))
+    return _page(rows, limit, lambda row: row[5])
+
+def get_exam_year():
+    """Год кампании, секции которого читают запросы оборудования и договоров."""
+    return EXAM_YEAR
+
+def set_exam_year(year):
+    """
+    Переключает год кампании. Кэш запросов не сбрасывается — год входит
+    в параметры запросов; локальная реплика перечитывает секции нового года.
+    """
+    global EXAM_YEAR
+    EXAM_YEAR = int(year)
+    logger.info(f"Год кампании: {EXAM_YEAR}")
+    if _replica is not None:
+        _replica.request_sync()
+
+def get_ppe_info(ppe_id):
+    """
+    Строка ППЭ по id.
+
+    Returns:
+        tuple: (id, ppe_number, ppe_address_fact, school_id, gia_type) или None
+    """
+    reference = get_reference_index()
+    if reference is not None:
+        ppe = reference.get_ppe(ppe_id)
+        if ppe is not None:
+            return ppe
+        # ППЭ мог появиться после последней загрузки индексов
+    query = "SELECT id, ppe_number, ppe_address_fact, school_id, gia_type FROM dat_ppe WHERE id = %s"
+    result = cached_query(query, (ppe_id,), tables=("dat_ppe",))
+    return result[0] if result else None
+
+def get_ppe_gia_type(ppe_id):
+    """Получает тип ГИА для ППЭ."""
+    reference = get_reference_index()
+    if reference is not None:
+        ppe = reference.get_ppe(ppe_id)
+        if ppe is not None:
+            return ppe[4]
+        # ППЭ мог появиться после последней загрузки индексов
+    query = "SELECT gia_type FROM dat_ppe WHERE id = %s"
+    result = cached_query(query, (ppe_id,), tables=("dat_ppe",))
+    return result[0][0] if result else None
+
+@dataclass
+class PPEBundle:
+    """Все данные для вкладок карточки одного ППЭ."""
+    ppe_id: int
+    ppe_number: object = None
+    address: str = None
+    school_id: object = None
+    gia_type: object = None
+    details: tuple = None       # (fullname, address, inn, kpp, okpo, ogrn)
+    responsible: tuple = None   # (position, surname, first_name, second_name)
+    equipment: list = field(default_factory=list)  # (equip_type, equip_mark, equip_mod, release_year, amount)
+    contracts: list = field(default_factory=list)  # (contract_date, contract_number, supplier, supplier_inn, contract_name)
+    # Карточка содержит первые страницы оборудования и контрактов;
+    # продолжение — get_equipment_page / get_contracts_page с этими ключами
+    equipment_next: int = None
+    contracts_next: int = None
+
+_BUNDLE_DETAILS_FIELDS = ("fullname", "address", "inn", "kpp", "okpo", "ogrn")
+_BUNDLE_RESPONSIBLE_FIELDS = ("position", "surname", "first_name", "second_name")
+_BUNDLE_EQUIPMENT_FIELDS = ("equip_type", "equip_mark", "equip_mod", "release_year", "amount")
+_BUNDLE_CONTRACT_FIELDS = ("contract_date", "contract_number", "supplier", "supplier_inn", "contract_name")
+
+PPE_BUNDLE_QUERY = """
+    WITH p AS (
+        SELECT id, ppe_number, ppe_address_fact, school_id, gia_type
+        FROM dat_ppe
+        WHERE id = %(ppe_id)s
+    )
+    SELECT
+        (SELECT row_to_json(p) FROM p) AS ppe,
+        (SELECT row_to_json(d) FROM (
+            SELECT pd.fullname, pd.address, pd.inn, pd.kpp, pd.okpo, pd.ogrn
+            FROM dat_ppe_details pd
+            JOIN p ON pd.school_id = p.school_id
+            LIMIT 1
+        ) d) AS details,
+        (SELECT row_to_json(r) FROM (
+            SELECT dr.position, dr.surname, dr.first_name, dr.second_name
+            FROM dat_responsible dr
+            JOIN p ON dr.school_id = p.school_id
+            LIMIT 1
+        ) r) AS responsible,
+        (SELECT COALESCE(json_agg(e ORDER BY e.id), '[]'::json) FROM (
+            SELECT ed.id, de.equip_type, de.equip_mark, de.equip_mod, de.release_year, ed.amount
+            FROM equip_data ed
+            JOIN dat_equip de ON ed.equip_id = de.id::INTEGER
+            WHERE ed.exam_year = %(exam_year)s AND ed.ppe_id = %(ppe_id)s
+            ORDER BY ed.id
+            LIMIT %(limit)s
+        ) e) AS equipment,
+        (SELECT COALESCE(json_agg(c ORDER BY c.id), '[]'::json) FROM (
+            SELECT dc.id, dc.contract_date, dc.contract_number, dc.supplier, dc.supplier_inn, dc.contract_name
+            FROM dat_contract dc
+            WHERE dc.exam_year = %(exam_year)s
+            AND dc.id IN (SELECT contract_id FROM equip_data WHERE exam_year = %(exam_year)s AND ppe_id = %(ppe_id)s)
+            ORDER BY dc.id
+            LIMIT %(limit)s
+        ) c) AS contracts
+"""
+
+# Только списки карточки: ППЭ, реквизиты и ответственное лицо берутся из индексов справочников
+PPE_LISTS_QUERY = """
+    SELECT
+        (SELECT COALESCE(json_agg(e ORDER BY e.id), '[]'::json) FROM (
+            SELECT ed.id, de.equip_type, de.equip_mark, de.equip_mod, de.release_year, ed.amount
+            FROM equip_data ed
+            JOIN dat_equip de ON ed.equip_id = de.id::INTEGER
+            WHERE ed.exam_year = %(exam_year)s AND ed.ppe_id = %(ppe_id)s
+            ORDER BY ed.id
+            LIMIT %(limit)s
+        ) e) AS equipment,
+        (SELECT COALESCE(json_agg(c ORDER BY c.id), '[]'::json) FROM (
+            SELECT dc.id, dc.contract_date, dc.contract_number, dc.supplier, dc.supplier_inn, dc.contract_name
+            FROM dat_contract dc
+            WHERE dc.exam_year = %(exam_year)s
+            AND dc.id IN (SELECT contract_id FROM equip_data WHERE exam_year = %(exam_year)s AND ppe_id = %(ppe_id)s)
+            ORDER BY dc.id
+            LIMIT %(limit)s
+        ) c) AS contracts
+"""
+
+def _json_row(obj, fields):
+    return tuple(obj.get(name) for name in fields) if obj else None
+
+def _parse_json_date(value):
+    # json_agg отдаёт даты строкой ISO 8601
+    if isinstance(value, str):
+        return datetime.strptime(value[:10], "%Y-%m-%d").date()
+    return value
+
+def get_ppe_bundle(ppe_id):
+    """
+    Получает все данные карточки ППЭ одним запросом.
+    Если загружены индексы справочников, с сервера читаются только списки
+    оборудования и контрактов.
+
+    Returns:
+        PPEBundle: Данные ППЭ, реквизиты, ответственное лицо, оборудование и контракты
+    """
+    replica = get_replica()
+    if replica is not None:
+        return _get_replica_bundle(replica, ppe_id)
+
+    params = {"ppe_id": ppe_id, "exam_year": EXAM_YEAR, "limit": PAGE_SIZE + 1}
+    reference = get_reference_index()
+    ppe = reference.get_ppe(ppe_id) if reference is not None else None
+    if ppe is not None:
+        equipment, contracts = execute_query(PPE_LISTS_QUERY, params)[0]
+        bundle = PPEBundle(ppe_id=ppe_id)
+        _, bundle.ppe_number, bundle.address, bundle.school_id, bundle.gia_type = ppe
+        bundle.details = reference.get_details(bundle.school_id)
+        bundle.responsible = reference.get_responsible(bundle.school_id)
+        _fill_bundle_lists(bundle, equipment, contracts)
+        return bundle
+
+    rows = execute_query(PPE_BUNDLE_QUERY, params)
+    ppe, details, responsible, equipment, contracts = rows[0]
+    bundle = PPEBundle(ppe_id=ppe_id)
+    if ppe:
+        bundle.ppe_number = ppe.get("ppe_number")
+        bundle.address = ppe.get("ppe_address_fact")
+        bundle.school_id = ppe.get("school_id")
+        bundle.gia_type = ppe.get("gia_type")
+    bundle.details = _json_row(details, _BUNDLE_DETAILS_FIELDS)
+    bundle.responsible = _json_row(responsible, _BUNDLE_RESPONSIBLE_FIELDS)
+    _fill_bundle_lists(bundle, equipment, contracts)
+    return bundle
+
+def _fill_bundle_lists(bundle, equipment, contracts):
+    """Первые страницы оборудования и контрактов карточки из json_agg."""
+    equipment, bundle.equipment_next = _page(equipment, PAGE_SIZE, lambda row: row["id"])
+    contracts, bundle.contracts_next = _page(contracts, PAGE_SIZE, lambda row: row["id"])
+    bundle.equipment = [_json_row(row, _BUNDLE_EQUIPMENT_FIELDS) for row in equipment]
+    bundle.contracts = []
+    for row in contracts:
+        contract = list(_json_row(row, _BUNDLE_CONTRACT_FIELDS))
+        contract[0] = _parse_json_date(contract[0])
+        bundle.contracts.append(tuple(contract))
+
+def _get_replica_bundle(replica, ppe_id):
+    """Собирает PPEBundle из локальной реплики."""
+    ppe, details, responsible, equipment, contracts = replica.get_bundle_parts(ppe_id, PAGE_SIZE + 1)
+    equipment, equipment_next = _page(equipment, PAGE_SIZE, lambda row: row[5])
+    contracts, contracts_next = _page(contracts, PAGE_SIZE, lambda row: row[5])
+    bundle = PPEBundle(
+        ppe_id=ppe_id, details=details, responsible=responsible,
+        equipment=[tuple(row[:5]) for row in equipment],
+        equipment_next=equipment_next, contracts_next=contracts_next,
+    )
+    if ppe:
+        bundle.ppe_number, bundle.address, bundle.school_id, bundle.gia_type = ppe
+    # Даты в реплике хранятся строкой ISO 8601, как и в json_agg
+    bundle.contracts = [(_parse_json_date(row[0]),) + tuple(row[1:5]) for row in contracts]
+    return bundle
+
+register_statement("ppe_contracts", """
+    SELECT contract_date, contract_number, supplier, supplier_inn, contract_name
+    FROM dat_contract
+    WHERE exam_year = %s
+    AND id IN (SELECT contract_id FROM equip_data WHERE exam_year = %s AND ppe_id = %s)
+""")
+register_statement("ppe_equipment", """
+    SELECT de.equip_type, de.equip_mark, de.equip_mod, de.release_year, ed.amount
+    FROM equip_data ed
+    JOIN dat_equip de ON ed.equip_id = de.id::INTEGER
+    WHERE ed.exam_year = %s AND ed.ppe_id = %s
+""")
+register_statement("ppe_details", """
+    SELECT pd.fullname, pd.address, pd.inn, pd.kpp, pd.okpo, pd.ogrn
+    FROM dat_ppe p
+    LEFT JOIN dat_ppe_details pd ON p.school_id = pd.school_id
+    WHERE p.school_id = %s
+""")
+register_statement("responsible_person", """
+    SELECT position, surname, first_name, second_name
+    FROM dat_responsible
+    WHERE school_id = %s
+""")
 
 def show_contracts(app, ppe_number):
     """Отображение контрактов для указанного ППЭ."""
@@ -87,15 +1312,8 @@ def show_contracts(app, ppe_number):
 
 def _fetch_contracts(app, ppe_number):
     """Получение данных контрактов из базы данных."""
-    query = """
-        SELECT contract_date, contract_number, supplier, supplier_inn, contract_name 
-        FROM dat_contract 
-        WHERE id IN (SELECT contract_id FROM equip_data WHERE ppe_id = %s)
-    """
     try:
-        cursor = app.connection.cursor()
-        cursor.execute(query, (ppe_number,))
-        rows = cursor.fetchall()
+        rows = execute_prepared("ppe_contracts", (EXAM_YEAR, EXAM_YEAR, ppe_number))
         logger.info(f"Контракты для ППЭ {ppe_number}: {len(rows)} записей")
         return rows
     except Exception as e:
@@ -138,17 +1356,8 @@ def _fetch_equipment(app, ppe_number):
     Получение данных об оборудовании для указанного ППЭ.
     Возвращает список кортежей (equip_type, equip_mark, equip_mod, release_year, amount).
     """
-    query = """
-        SELECT de.equip_type, de.equip_mark, de.equip_mod, de.release_year, ed.amount
-        FROM equip_data ed
-        JOIN dat_equip de ON ed.equip_id = de.id::INTEGER
-        WHERE ed.ppe_id = %s;
-    """
     try:
-        cursor = app.connection.cursor()
-        cursor.execute(query, (ppe_number,))
-        rows = cursor.fetchall()
-        return rows
+        return execute_prepared("ppe_equipment", (EXAM_YEAR, ppe_number))
     except Exception as e:
         logger.error(f"Ошибка при получении оборудования: {e}")
         return []
@@ -200,100 +1409,229 @@ def show_equipment(app, ppe_number):
 
     _display_equipment(app, rows)
 
+def _write_or_queue(operation, *args):
+    """
+    Выполняет команду записи на сервере. Если сервер недоступен и включена
+    локальная реплика, команда откладывается в её очередь и возвращается None.
+
+    Отложенные ранее команды отправляются первыми: иначе после восстановления
+    связи они перезаписали бы более новую запись устаревшими значениями.
+    """
+    try:
+        if _replica is not None and _replica.pending_count():
+            _replica.flush_pending_writes()
+        result = _WRITE_OPERATIONS[operation](*args)
+    except Exception as e:
+        if _replica is None or not _is_connection_error(e):
+            raise
+        _replica.queue_write(operation, list(args))
+        return None
+    _note_write()
+    if _replica is not None:
+        _replica.request_sync()
+    return result
+
+def apply_queued_write(operation, args):
+    """
+    Отправляет на сервер отложенную команду записи (вызывается репликой).
+    Ошибка связи пробрасывается, чтобы команда осталась в очереди;
+    команда, отклонённая сервером по другой причине, отбрасывается.
+    """
+    try:
+        _WRITE_OPERATIONS[operation](*args)
+    except Exception as e:
+        if _is_connection_error(e):
+            raise
+        logger.error(f"Отложенная запись {operation}{tuple(args)} отклонена сервером: {e}")
+
 def update_equipment_agreement(ppe_id, contract_number, contract_date):
     """
     Обновляет поле agreement в таблице equip_data для указанного ППЭ.
     Формат agreement: "<номер договора>/<год заключения договора>"
     
     Returns:
-        int: Количество обновленных записей
+        int: Количество обновленных записей (None, если запись отложена до связи с сервером)
     """
+    return _write_or_queue("update_equipment_agreement", ppe_id, contract_number, contract_date, EXAM_YEAR)
+
+# exam_year передаётся в отложенные команды записи, чтобы они применялись к году,
+# в котором были сделаны; у команд из очереди прежних версий года нет
+def _update_equipment_agreement(ppe_id, contract_number, contract_date, exam_year=None):
     agreement_value = f"{contract_number}/{contract_date}"
     
     query = """
         UPDATE equip_data
         SET agreement = %s
-        WHERE ppe_id = %s AND (agreement IS NULL OR agreement = '')
+        WHERE exam_year = %s AND ppe_id = %s AND (agreement IS NULL OR agreement = '')
     """
     
-    return execute_query(query, (agreement_value, ppe_id), fetch=False)
+    return execute_query(query, (agreement_value, exam_year or EXAM_YEAR, ppe_id), fetch=False)
+
+def update_equipment_agreements_bulk(assignments):
+    """
+    Проставляет agreement для многих ППЭ одной командой в одной транзакции.
+
+    Args:
+        assignments (iterable): Кортежи (ppe_id, contract_number, contract_date)
+
+    Returns:
+        dict: ppe_id -> количество обновленных записей оборудования
+              (None, если запись отложена до связи с сервером)
+    """
+    return _write_or_queue("update_equipment_agreements_bulk", [list(a) for a in assignments], EXAM_YEAR)
+
+def _update_equipment_agreements_bulk(assignments, exam_year=None):
+    # Как и при последовательных вызовах update_equipment_agreement,
+    # для повторяющегося ppe_id действует первое назначение.
+    values = {}
+    for ppe_id, contract_number, contract_date in assignments:
+        values.setdefault(int(ppe_id), f"{contract_number}/{contract_date}")
+    if not values:
+        return {}
 
-def get_ppe_details(school_id):
-    """Получает детальную информацию о ППЭ."""
     query = """
-        SELECT pd.fullname, pd.address, pd.inn, pd.kpp, pd.okpo, pd.ogrn
-        FROM dat_ppe p
-        LEFT JOIN dat_ppe_details pd ON p.school_id = pd.school_id
-        WHERE p.school_id = %s
+        WITH v AS (
+            SELECT * FROM unnest(%s::integer[], %s::text[]) AS t(ppe_id, agreement)
+        ),
+        upd AS (
+            UPDATE equip_data ed
+            SET agreement = v.agreement
+            FROM v
+            WHERE ed.exam_year = %s AND ed.ppe_id = v.ppe_id
+            AND (ed.agreement IS NULL OR ed.agreement = '')
+            RETURNING ed.ppe_id
+        )
+        SELECT v.ppe_id, COUNT(upd.ppe_id)
+        FROM v
+        LEFT JOIN upd ON upd.ppe_id = v.ppe_id
+        GROUP BY v.ppe_id
     """
-    
-    result = execute_query(query, (school_id,))
+    driver = _driver()
+    try:
+        with get_connection() as conn:
+            try:
+                started = time.perf_counter()
+                cursor = conn.cursor()
+                cursor.execute(query, (list(values.keys()), list(values.values()), exam_year or EXAM_YEAR))
+                rows = cursor.fetchall()
+                conn.commit()
+                query_stats.record(query, time.perf_counter() - started, len(rows))
+            except driver.Error:
+                if not conn.closed:
+                    conn.rollback()
+                raise
+    except driver.Error as e:
+        logger.error(f"Ошибка массового обновления agreement: {e}")
+        raise
+
+    query_cache.invalidate("equip_data")
+    counts = {ppe_id: count for ppe_id, count in rows}
+    logger.info(f"Массовое обновление agreement: {len(counts)} ППЭ, {sum(counts.values())} записей")
+    return counts
+
+def get_ppe_details(school_id):
+    """Получает детальную информацию о ППЭ."""
+    reference = get_reference_index()
+    if reference is not None:
+        details = reference.get_details(school_id)
+        if details is not None:
+            return details
+        # Реквизиты могли появиться после последней загрузки индексов
+    replica = get_replica()
+    if replica is not None:
+        return replica.get_ppe_details(school_id)
+
+    result = cached_prepared("ppe_details", (school_id,), tables=("dat_ppe", "dat_ppe_details"))
     return result[0] if result else None
 
 def get_responsible_person(school_id):
     """Получает информацию об ответственном лице ППЭ."""
-    query = """
-        SELECT position, surname, first_name, second_name
-        FROM dat_responsible
-        WHERE school_id = %s
-    """
-    
-    result = execute_query(query, (school_id,))
+    reference = get_reference_index()
+    if reference is not None:
+        responsible = reference.get_responsible(school_id)
+        if responsible is not None:
+            return responsible
+        # Ответственный мог появиться после последней загрузки индексов
+    replica = get_replica()
+    if replica is not None:
+        return replica.get_responsible_person(school_id)
+
+    result = cached_prepared("responsible_person", (school_id,), tables=("dat_responsible",))
     return result[0] if result else None
 
 def save_contract_data(ppe_id, contract_number, contract_date, contract_name=None):
-    """Сохраняет информацию о договоре в базу данных."""
+    """
+    Сохраняет информацию о договоре в базу данных и связывает его с ППЭ.
+
+    Договор создаётся или обновляется по номеру (INSERT ... ON CONFLICT),
+    а оборудование ППЭ связывается с ним той же командой, поэтому сохранение
+    атомарно и не конфликтует с одновременным сохранением с другого рабочего места.
+    Требует уникального индекса по (exam_year, contract_number) (миграции 1 и 9):
+    номера договоров уникальны в пределах года кампании.
+
+    Returns:
+        int: id договора (None, если запись отложена до связи с сервером)
+    """
+    return _write_or_queue("save_contract_data", ppe_id, contract_number, contract_date, contract_name, EXAM_YEAR)
+
+def _save_contract_data(ppe_id, contract_number, contract_date, contract_name=None, exam_year=None):
     if not contract_name:
         contract_name = f"Договор {contract_number} от {contract_date}"
-    
-    # Проверяем, существует ли уже договор для этого ППЭ
-    check_query = """
-        SELECT id FROM dat_contract
-        WHERE contract_number = %s
-    """
-    existing_contract = execute_query(check_query, (contract_number,))
-    
-    if existing_contract:
-        # Обновляем существующий договор
-        update_query = """
-            UPDATE dat_contract
-            SET contract_date = %s, contract_name = %s
-            WHERE id = %s
-            RETURNING id
-        """
-        result = execute_query(update_query, (
-            datetime.strptime(contract_date, "%d.%m.%Y"),
-            contract_name,
-            existing_contract[0][0]
-        ))
-        contract_id = result[0][0]
-    else:
-        # Создаем новый договор
-        insert_query = """
-            INSERT INTO dat_contract (contract_number, contract_date, contract_name)
-            VALUES (%s, %s, %s)
+
+    query = """
+        WITH contract AS (
+            INSERT INTO dat_contract (exam_year, contract_number, contract_date, contract_name)
+            VALUES (%(exam_year)s, %(number)s, %(date)s, %(name)s)
+            ON CONFLICT (exam_year, contract_number) DO UPDATE
+            SET contract_date = EXCLUDED.contract_date,
+                contract_name = EXCLUDED.contract_name
             RETURNING id
-        """
-        result = execute_query(insert_query, (
-            contract_number,
-            datetime.strptime(contract_date, "%d.%m.%Y"),
-            contract_name
-        ))
-        contract_id = result[0][0]
-    
-    # Связываем договор с ППЭ
-    try:
-        link_query = """
+        ),
+        link AS (
             UPDATE equip_data
-            SET contract_id = %s
-            WHERE ppe_id = %s
-        """
-        execute_query(link_query, (contract_id, ppe_id), fetch=False)
-    except Exception as e:
-        logger.error(f"Ошибка при связывании договора с ППЭ: {e}")
-    
+            SET contract_id = (SELECT id FROM contract)
+            WHERE exam_year = %(exam_year)s AND ppe_id = %(ppe_id)s
+            RETURNING 1
+        )
+        SELECT (SELECT id FROM contract), (SELECT COUNT(*) FROM link)
+    """
+    params = {
+        "number": contract_number,
+        "date": datetime.strptime(contract_date, "%d.%m.%Y"),
+        "name": contract_name,
+        "ppe_id": ppe_id,
+        "exam_year": exam_year or EXAM_YEAR,
+    }
+
+    driver = _driver()
+    try:
+        with get_connection() as conn:
+            try:
+                started = time.perf_counter()
+                cursor = conn.cursor()
+                cursor.execute(query, params)
+                contract_id, linked = cursor.fetchone()
+                conn.commit()
+                query_stats.record(query, time.perf_counter() - started, linked)
+            except driver.Error:
+                if not conn.closed:
+                    conn.rollback()
+                raise
+    except driver.Error as e:
+        logger.error(f"Ошибка при сохранении договора {contract_number}: {e}")
+        raise
+
+    query_cache.invalidate("dat_contract", "equip_data")
+    logger.info(f"Договор {contract_number} (id={contract_id}) связан с {linked} записями оборудования ППЭ {ppe_id}")
     return contract_id
 
+# Команды записи, которые могут быть отложены в очередь локальной реплики
+_WRITE_OPERATIONS = {
+    "update_equipment_agreement": _update_equipment_agreement,
+    "update_equipment_agreements_bulk": _update_equipment_agreements_bulk,
+    "save_contract_data": _save_contract_data,
+}
+
 
 def check_agreement_exists(ppe_id):
     """
@@ -303,12 +1641,12 @@ def check_agreement_exists(ppe_id):
     query = """
         SELECT agreement 
         FROM equip_data
-        WHERE ppe_id = %s
+        WHERE exam_year = %s AND ppe_id = %s
         AND (agreement IS NOT NULL AND agreement != '')
         LIMIT 1
     """
     
-    rows = execute_query(query, (ppe_id,))
+    rows = execute_query(query, (EXAM_YEAR, ppe_id))
     return bool(rows)
 
 def get_contract_data_for_ppe(ppe_id):
@@ -320,12 +1658,12 @@ def get_contract_data_for_ppe(ppe_id):
     query = """
         SELECT agreement
         FROM equip_data
-        WHERE ppe_id = %s
+        WHERE exam_year = %s AND ppe_id = %s
         AND (agreement IS NOT NULL AND agreement != '')
         LIMIT 1
     """
     
-    rows = execute_query(query, (ppe_id,))
+    rows = execute_query(query, (EXAM_YEAR, ppe_id))
     
     if rows:
         # Делаем парсинг значения из столбца agreement
@@ -343,9 +1681,10 @@ def get_contract_data_for_ppe(ppe_id):
 def get_contract_data_by_id(contract_id):
     """Получает данные о контракте по contract_id."""
     query = """
-        SELECT contract_number, contract_date, contract_name FROM dat_contract WHERE id = %s LIMIT 1
+        SELECT contract_number, contract_date, contract_name FROM dat_contract
+        WHERE exam_year = %s AND id = %s LIMIT 1
     """
-    result = execute_query(query, (contract_id,))
+    result = execute_query(query, (EXAM_YEAR, contract_id))
     if result:
         return {
             "num_contract": result[0][0],
@@ -357,21 +1696,7 @@ def get_contract_data_by_id(contract_id):
 def get_contracts_for_ppe(ppe_id):
     """
     Получает список всех контрактов, связанных с указанным ППЭ.
-    Возвращает список словарей с contract_id, num_contract, date_contract, name_contract.
+    Возвращает записи repository.ContractRecord (id, num_contract, date_contract, name_contract).
     """
-    query = """
-        SELECT DISTINCT c.id, c.contract_number, c.contract_date, c.contract_name
-        FROM equip_data ed
-        JOIN dat_contract c ON ed.contract_id = c.id
-        WHERE ed.ppe_id = %s
-    """
-    rows = execute_query(query, (ppe_id,))
-    return [
-        {
-            "id": row[0],
-            "num_contract": row[1],
-            "date_contract": row[2].strftime("%d.%m.%Y") if row[2] else "",
-            "name_contract": row[3]
-        }
-        for row in rows
-    ] if rows else []
+    from repository import get_ppe_contracts
+    return get_ppe_contracts(ppe_id)
@@ -1,53 +1,165 @@
-import os
-from docxtpl import DocxTemplate
-from datetime import datetime
-import locale
-import psycopg2
-
-conn = psycopg2.connect(
-    host='192.168.1.239',
-    user='postgres',
-    password='AXD54^sa',
-    database='equipment_ppe'
-)
-cursor = conn.cursor()
-
-# 1) Получаем данные из dat_ppe
-query = """
-    SELECT ppe_number, ppe_address, school_inn 
-    FROM public.dat_ppe
-    ORDER BY id ASC
 """
-cursor.execute(query)
-rows = cursor.fetchall()
-cursor.close()
+Массовая загрузка данных между таблицами.
+Строки переносятся командой INSERT ... SELECT на сервере порциями по ключу,
+повторный запуск безопасен (ON CONFLICT), каждая порция фиксируется отдельно.
 
-print("Всего строк из dat_ppe:", len(rows))
+Пример запуска:
+    python db.py ppe-details
+    python db.py ppe-details --chunk-size 5000
+"""
+
+import argparse
+import logging
+import time
+
+from database import get_connection, close_pool, database_error, invalidate_cache
+from progress import print_progress
+
+logger = logging.getLogger('database')
+
+DEFAULT_CHUNK_SIZE = 2000
+
+# dat_ppe -> dat_ppe_details: номер ППЭ, адрес и ИНН организации.
+# Требует уникального индекса по dat_ppe_details.ppe_number (миграция 7).
+PPE_DETAILS_CHUNK_QUERY = """
+    WITH src AS (
+        SELECT id, ppe_number, ppe_address, school_inn
+        FROM dat_ppe
+        WHERE id > %(after)s
+        ORDER BY id
+        LIMIT %(chunk)s
+    ),
+    ins AS (
+        INSERT INTO dat_ppe_details (ppe_number, address, inn)
+        SELECT DISTINCT ON (ppe_number) ppe_number, ppe_address, school_inn
+        FROM src
+        ORDER BY ppe_number, id DESC
+        ON CONFLICT (ppe_number) DO UPDATE
+        SET address = EXCLUDED.address,
+            inn = EXCLUDED.inn
+        WHERE (dat_ppe_details.address, dat_ppe_details.inn)
+              IS DISTINCT FROM (EXCLUDED.address, EXCLUDED.inn)
+        RETURNING (xmax = 0) AS inserted
+    )
+    SELECT
+        (SELECT max(id) FROM src),
+        (SELECT count(*) FROM src),
+        (SELECT count(*) FROM ins WHERE inserted),
+        (SELECT count(*) FROM ins WHERE NOT inserted)
+"""
+
+
+class LoadError(RuntimeError):
+    """
+    Ошибка сервера во время загрузки. Порции до неё уже зафиксированы:
+    summary — их счётчики, after — последний загруженный ключ.
+    """
+
+    def __init__(self, error, summary, after):
+        super().__init__(str(error))
+        self.summary = summary
+        self.after = after
+
+
+def load_ppe_details(chunk_size=DEFAULT_CHUNK_SIZE, progress=None):
+    """
+    Переносит ППЭ из dat_ppe в dat_ppe_details.
 
-# 2) Переносим данные в dat_responsible
-for row in rows:
+    Новые номера ППЭ добавляются, у существующих обновляются адрес и ИНН,
+    если они изменились; неизменные строки не перезаписываются.
+
+    Args:
+        progress (callable, optional): Вызывается после каждой порции как progress(read, total)
+
+    Returns:
+        dict: Счётчики read, inserted, updated, unchanged и время elapsed, с
+
+    Raises:
+        LoadError: Ошибка сервера; счётчики зафиксированных порций в LoadError.summary
+    """
+    db_error = database_error()
+    summary = {"read": 0, "inserted": 0, "updated": 0, "unchanged": 0}
+    started = time.perf_counter()
+
+    def finish():
+        summary["unchanged"] = summary["read"] - summary["inserted"] - summary["updated"]
+        summary["elapsed"] = round(time.perf_counter() - started, 2)
+
+    after = 0
+    with get_connection() as conn:
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT count(*) FROM dat_ppe")
+                total = cursor.fetchone()[0]
+            conn.commit()
+
+            while True:
+                with conn.cursor() as cursor:
+                    cursor.execute(PPE_DETAILS_CHUNK_QUERY, {"after": after, "chunk": chunk_size})
+                    last_id, read, inserted, updated = cursor.fetchone()
+                conn.commit()
+                if not read:
+                    break
+                after = last_id
+                summary["read"] += read
+                summary["inserted"] += inserted
+                summary["updated"] += updated
+                if progress:
+                    progress(summary["read"], total)
+        except db_error as e:
+            conn.rollback()
+            finish()
+            logger.error(
+                f"Загрузка dat_ppe_details прервана после ППЭ id {after}: прочитано {summary['read']}, "
+                f"добавлено {summary['inserted']}, обновлено {summary['updated']}: {e}"
+            )
+            if summary["read"]:
+                invalidate_cache("dat_ppe_details")
+            raise LoadError(e, summary, after) from e
+
+    finish()
+    invalidate_cache("dat_ppe_details")
+    return summary
+
+# Команды загрузчика: имя -> функция(chunk_size, progress)
+LOADERS = {
+    "ppe-details": load_ppe_details,
+}
+
+def main():
+    parser = argparse.ArgumentParser(description="Массовая загрузка данных")
+    parser.add_argument("loader", choices=sorted(LOADERS))
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+    parser.add_argument("--quiet", action="store_true", help="Не выводить ход загрузки")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    progress = None if args.quiet else lambda done, total: print_progress(done, total, started)
     try:
-        # row: (ppe_number, ppe_address, school_inn)
-        number = row[0]
-        add = row[1]
-        inn = row[2]
-
-        # Если какие-то поля int или text, будьте внимательны.
-        # Допустим, ppe_number - int, ppe_address - text, school_inn - text.
-
-        cursor_insert = conn.cursor()
-        insert_query = """
-            INSERT INTO dat_ppe_details (ppe_number, address, inn)
-            VALUES (%s, %s, %s)
-        """
-        cursor_insert.execute(insert_query, (number, add, inn))
-        cursor_insert.close()
-
-        print(f"Добавлен ppe_number={number} inn={inn}")
-
-    except Exception as e:
-        print("Ошибка при вставке:", e)
-
-# 3) Подтверждаем изменения
-conn.commit()
-conn.close()
+        summary = LOADERS[args.loader](chunk_size=args.chunk_size, progress=progress)
+    except LoadError as e:
+        if progress:
+            print()
+        print(f"Ошибка загрузки: {e}")
+        print(
+            f"Загружено до ошибки (до id {e.after}): прочитано {e.summary['read']}, "
+            f"добавлено {e.summary['inserted']}, обновлено {e.summary['updated']}; "
+            f"повторный запуск продолжит загрузку без дубликатов"
+        )
+        raise SystemExit(1)
+    except database_error() as e:
+        print(f"Ошибка загрузки: {e}")
+        raise SystemExit(1)
+    finally:
+        close_pool()
+
+    if progress:
+        print()
+    print(
+        f"Прочитано: {summary['read']}, добавлено: {summary['inserted']}, "
+        f"обновлено: {summary['updated']}, без изменений: {summary['unchanged']}, "
+        f"время: {summary['elapsed']} с"
+    )
+
+if __name__ == "__main__":
+    main()
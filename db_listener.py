@@ -0,0 +1,118 @@
+"""
+Модуль получения уведомлений об изменениях данных через LISTEN/NOTIFY.
+Триггеры (миграция 4) отправляют в канал ppe_changes ключи изменённых строк,
+а фоновый поток приложения ждёт их на отдельном соединении без опроса сервера.
+"""
+
+import json
+import select
+import logging
+import threading
+from dataclasses import dataclass
+
+import psycopg2
+import psycopg2.extensions
+
+import db_psycopg3
+
+logger = logging.getLogger('database')
+
+NOTIFY_CHANNEL = 'ppe_changes'
+
+
+@dataclass
+class ChangeEvent:
+    """Изменение строк одной таблицы одной командой."""
+    table: str            # None — уведомления могли быть пропущены, нужна полная перезагрузка
+    op: str = None        # INSERT, UPDATE или DELETE
+    ids: list = None      # ключи строк; None, если их слишком много для уведомления
+    ppe_ids: list = None  # затронутые ППЭ; None — неизвестно или любые
+
+
+class ChangeListener:
+    """
+    Фоновый поток, слушающий канал уведомлений на выделенном соединении.
+
+    callback(events) вызывается из фонового потока со списком ChangeEvent,
+    пришедших одной пачкой. После переподключения передаётся ChangeEvent(None),
+    так как уведомления за время разрыва потеряны.
+    """
+
+    def __init__(self, conn_config, callback, channel=NOTIFY_CHANNEL, reconnect_delay=5, backend='psycopg2'):
+        self.conn_config = conn_config
+        self.callback = callback
+        self.channel = channel
+        self.reconnect_delay = reconnect_delay
+        self.backend = backend          # DB_BACKEND: 'psycopg2' или 'psycopg3'
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="change-listener", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        connected_before = False
+        while not self._stop.is_set():
+            conn = None
+            try:
+                conn = self._connect()
+                logger.info(f"Подписка на канал уведомлений {self.channel}")
+                if connected_before:
+                    self.callback([ChangeEvent(table=None)])
+                connected_before = True
+                self._listen(conn)
+            except self._driver_errors() as e:
+                logger.warning(f"Соединение для уведомлений потеряно: {e}")
+            except Exception as e:
+                logger.error(f"Ошибка обработки уведомлений: {e}")
+            finally:
+                if conn is not None and not conn.closed:
+                    conn.close()
+            self._stop.wait(self.reconnect_delay)
+
+    def _connect(self):
+        if self.backend == 'psycopg3':
+            conn = db_psycopg3.connect(**self.conn_config, autocommit=True)
+        else:
+            conn = psycopg2.connect(**self.conn_config)
+            conn.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+        conn.cursor().execute(f"LISTEN {self.channel}")
+        return conn
+
+    def _driver_errors(self):
+        if self.backend == 'psycopg3' and db_psycopg3.psycopg is not None:
+            return (psycopg2.Error, db_psycopg3.psycopg.Error)
+        return psycopg2.Error
+
+    def _wait(self, conn, timeout=5.0):
+        """Полезные нагрузки пришедших уведомлений; таймаут нужен только для проверки остановки."""
+        if self.backend == 'psycopg3':
+            return db_psycopg3.wait_notifies(conn, timeout)
+        # select ждёт данных на сокете
+        if select.select([conn], [], [], timeout) == ([], [], []):
+            return []
+        conn.poll()
+        payloads = []
+        while conn.notifies:
+            payloads.append(conn.notifies.pop(0).payload)
+        return payloads
+
+    def _listen(self, conn):
+        while not self._stop.is_set():
+            events = [event for event in map(self._parse, self._wait(conn)) if event is not None]
+            if events:
+                self.callback(events)
+
+    @staticmethod
+    def _parse(payload):
+        try:
+            data = json.loads(payload)
+        except ValueError:
+            logger.warning(f"Некорректное уведомление: {payload}")
+            return None
+        return ChangeEvent(table=data.get("table"), op=data.get("op"), ids=data.get("ids"))
@@ -0,0 +1,207 @@
+"""
+Модуль пула соединений с базой данных PostgreSQL.
+Хранит ограниченное число открытых соединений и выдаёт их потокам по запросу,
+проверяя работоспособность соединения перед выдачей.
+"""
+
+import time
+import logging
+import threading
+from collections import deque
+from contextlib import contextmanager
+
+import psycopg2
+from psycopg2.pool import PoolError
+
+logger = logging.getLogger('database')
+
+
+def _in_transaction(conn):
+    """Проверяет, открыта ли на соединении транзакция (psycopg2 и psycopg 3)."""
+    if hasattr(conn, "get_transaction_status"):
+        status = conn.get_transaction_status()
+    else:
+        status = conn.info.transaction_status
+    # Код состояния IDLE равен 0 в обоих драйверах
+    return status != 0
+
+
+class ConnectionPool:
+    """
+    Потокобезопасный пул соединений ограниченного размера.
+
+    Каждый поток получает собственное соединение; повторный запрос из того же
+    потока (например, вложенный вызов execute_query) возвращает то же соединение.
+    Перед выдачей простаивавшее соединение проверяется запросом SELECT 1,
+    а разорванное (например, после перезапуска сервера) заменяется новым.
+    """
+
+    def __init__(self, minconn, maxconn, checkout_timeout=10.0,
+                 health_check_interval=30.0, connect=None, errors=(psycopg2.Error,),
+                 **conn_kwargs):
+        if maxconn < 1 or minconn > maxconn:
+            raise ValueError("Некорректные границы размера пула")
+
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.checkout_timeout = checkout_timeout
+        self.health_check_interval = health_check_interval
+        self._connect = connect or psycopg2.connect
+        self._errors = errors         # исключения драйвера (psycopg2 или psycopg 3)
+        self._conn_kwargs = conn_kwargs
+
+        self._idle = deque()          # (соединение, время возврата в пул)
+        self._size = 0                # открытые соединения: свободные + выданные
+        self._cond = threading.Condition()
+        self._local = threading.local()
+        self._closed = False
+
+        for _ in range(minconn):
+            self._idle.append((self._new_connection(), time.monotonic()))
+
+    def _new_connection(self):
+        conn = self._connect(**self._conn_kwargs)
+        self._size += 1
+        return conn
+
+    def _close(self, conn):
+        try:
+            conn.close()
+        except self._errors:
+            pass
+
+    def _discard(self, conn):
+        """Закрывает соединение и освобождает его место (вызывается под self._cond)."""
+        self._size -= 1
+        self._close(conn)
+
+    def _release_slot(self):
+        """Освобождает место закрытого или не открывшегося соединения."""
+        with self._cond:
+            self._size -= 1
+            self._cond.notify()
+
+    def _is_healthy(self, conn, idle_since):
+        """Проверяет соединение перед выдачей."""
+        if conn.closed:
+            return False
+        if time.monotonic() - idle_since < self.health_check_interval:
+            return True
+        try:
+            cursor = conn.cursor()
+            cursor.execute("SELECT 1")
+            cursor.close()
+            conn.rollback()
+            return True
+        except self._errors as e:
+            logger.warning(f"Соединение из пула не прошло проверку: {e}")
+            return False
+
+    def getconn(self, shared=True):
+        """
+        Выдаёт соединение текущему потоку, ожидая освобождения при заполненном пуле.
+
+        При shared=False выдаётся отдельное соединение, не разделяемое с другими
+        вызовами того же потока (нужно для серверных курсоров, живущих долго).
+        """
+        held = getattr(self._local, 'conn', None)
+        if shared and held is not None and not held.closed:
+            self._local.depth += 1
+            return held
+
+        deadline = time.monotonic() + self.checkout_timeout
+        while True:
+            with self._cond:
+                while True:
+                    if self._closed:
+                        raise PoolError("Пул соединений закрыт")
+                    if self._idle:
+                        conn, idle_since = self._idle.pop()
+                        break
+                    if self._size < self.maxconn:
+                        # Место занимается до подключения, чтобы не превысить maxconn
+                        self._size += 1
+                        conn = None
+                        break
+
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise PoolError(
+                            f"Нет свободных соединений в пуле за {self.checkout_timeout} с"
+                        )
+                    self._cond.wait(remaining)
+
+            # Проверка и подключение идут по сети, поэтому выполняются без блокировки:
+            # остальные потоки тем временем получают и возвращают соединения
+            if conn is None:
+                try:
+                    conn = self._connect(**self._conn_kwargs)
+                except BaseException:
+                    self._release_slot()
+                    raise
+                break
+            if self._is_healthy(conn, idle_since):
+                break
+            self._close(conn)
+            self._release_slot()
+
+        if shared:
+            self._local.conn = conn
+            self._local.depth = 1
+        return conn
+
+    def putconn(self, conn, discard=False):
+        """Возвращает соединение в пул; при discard=True соединение закрывается."""
+        if getattr(self._local, 'conn', None) is conn:
+            self._local.depth -= 1
+            if self._local.depth > 0 and not discard:
+                return
+            self._local.conn = None
+            self._local.depth = 0
+
+        if not discard and not conn.closed:
+            try:
+                if _in_transaction(conn):
+                    conn.rollback()
+            except self._errors:
+                discard = True
+
+        with self._cond:
+            if discard or conn.closed or self._closed:
+                self._discard(conn)
+            else:
+                self._idle.append((conn, time.monotonic()))
+            self._cond.notify()
+
+    @contextmanager
+    def connection(self, shared=True):
+        """Контекстный менеджер: выдаёт соединение и возвращает его в пул по выходу."""
+        conn = self.getconn(shared=shared)
+        discard = False
+        try:
+            yield conn
+        except Exception:
+            # Разорванное соединение в пул не возвращается
+            discard = bool(conn.closed)
+            raise
+        finally:
+            self.putconn(conn, discard=discard)
+
+    def closeall(self):
+        """Закрывает все свободные соединения и запрещает выдачу новых."""
+        with self._cond:
+            self._closed = True
+            while self._idle:
+                conn, _ = self._idle.pop()
+                self._discard(conn)
+            self._cond.notify_all()
+
+    def stats(self):
+        """Возвращает текущее состояние пула."""
+        with self._cond:
+            return {
+                "size": self._size,
+                "idle": len(self._idle),
+                "in_use": self._size - len(self._idle),
+                "maxconn": self.maxconn,
+            }
@@ -0,0 +1,76 @@
+"""
+Модуль поддержки драйвера psycopg 3.
+Включается параметром DB_BACKEND = 'psycopg3' в database.py.
+Результаты запросов передаются в бинарном формате, а независимые запросы
+могут отправляться пакетом в режиме pipeline без ожидания ответа на каждый.
+"""
+
+try:
+    import psycopg
+except ImportError:
+    psycopg = None
+
+
+def _require_driver():
+    if psycopg is None:
+        raise RuntimeError(
+            "Для DB_BACKEND = 'psycopg3' требуется пакет psycopg: pip install \"psycopg[binary]\""
+        )
+
+def connect(**config):
+    """Открывает соединение psycopg 3 по параметрам в формате DB_CONFIG."""
+    _require_driver()
+    params = dict(config)
+    if 'database' in params:
+        params['dbname'] = params.pop('database')
+    return psycopg.connect(**params)
+
+def wait_notifies(conn, timeout):
+    """
+    Полезные нагрузки уведомлений LISTEN, пришедших на соединение в autocommit;
+    ждёт первое не дольше timeout секунд (psycopg 3.2+).
+    """
+    return [notify.payload for notify in conn.notifies(timeout=timeout, stop_after=1)]
+
+def record_factory(record):
+    """Фабрика строк: каждая строка результата сразу создаётся записью record(*values)."""
+    def make_row(cursor):
+        return lambda values: record(*values)
+    return make_row
+
+def new_cursor(conn, record=None, name=None):
+    """
+    Курсор с бинарной передачей результатов (числа и даты без разбора текста).
+    С record строки создаются записями этого класса, с name курсор серверный.
+    """
+    kwargs = {"binary": True}
+    if record is not None:
+        kwargs["row_factory"] = record_factory(record)
+    if name:
+        return conn.cursor(name, **kwargs)
+    return conn.cursor(**kwargs)
+
+def execute_pipeline(conn, queries):
+    """
+    Выполняет запросы в режиме pipeline: все команды отправляются сразу,
+    а ответы читаются после одной синхронизации с сервером.
+
+    Args:
+        queries (list): Кортежи (запрос, параметры)
+
+    Returns:
+        list: Для каждого запроса список строк или число затронутых строк
+    """
+    cursors = []
+    with conn.pipeline():
+        for query, params in queries:
+            cursor = new_cursor(conn)
+            cursor.execute(query, params or ())
+            cursors.append(cursor)
+    return [cursor.fetchall() if cursor.description else cursor.rowcount for cursor in cursors]
+
+def copy_rows(cursor, statement, rows):
+    """Передаёт строки командой COPY ... FROM STDIN построчно, без промежуточного файла."""
+    with cursor.copy(statement) as copy:
+        for row in rows:
+            copy.write_row(row)
@@ -0,0 +1,179 @@
+"""
+Выгрузка ППЭ с оборудованием, согласованиями и контрактами для отчётности.
+Соединённый набор читается именованным серверным курсором пачками и сразу
+записывается в CSV или Parquet, поэтому в памяти находится не больше одной пачки.
+
+Пример запуска:
+    python export_data.py выгрузка.csv
+    python export_data.py выгрузка.parquet --batch-size 20000
+"""
+
+import argparse
+import contextlib
+import csv
+import os
+import time
+
+from database import stream_query_batches, execute_query, close_pool, database_error, get_exam_year
+from progress import print_progress
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+DEFAULT_BATCH_SIZE = 10000
+
+# Столбцы выгрузки: имя, выражение SQL, тип Parquet.
+# Значения приводятся к типу на сервере, чтобы схема файла не зависела от первой пачки.
+EXPORT_COLUMNS = [
+    ("ppe_id",          "p.id::bigint",                 "int64"),
+    ("ppe_number",      "p.ppe_number::text",           "string"),
+    ("gia_type",        "p.gia_type::text",             "string"),
+    ("ppe_address",     "p.ppe_address_fact::text",     "string"),
+    ("equip_type",      "de.equip_type::text",          "string"),
+    ("equip_mark",      "de.equip_mark::text",          "string"),
+    ("equip_mod",       "de.equip_mod::text",           "string"),
+    ("release_year",    "de.release_year::text",        "string"),
+    ("name_in_1C",      'de."name_in_1C"::text',        "string"),
+    ("inv_number",      "ed.inv_number::text",          "string"),
+    ("equip_price",     "de.equip_price::float8",       "float64"),
+    ("amount",          "ed.amount::bigint",            "int64"),
+    ("agreement",       "ed.agreement::text",           "string"),
+    ("contract_number", "dc.contract_number::text",     "string"),
+    ("contract_date",   "dc.contract_date::date",       "date32"),
+    ("contract_name",   "dc.contract_name::text",       "string"),
+    ("supplier",        "dc.supplier::text",            "string"),
+    ("supplier_inn",    "dc.supplier_inn::text",        "string"),
+]
+
+# Одна строка на единицу оборудования; ППЭ без оборудования выгружаются одной строкой
+_FROM_CLAUSE = """
+    FROM dat_ppe p
+    LEFT JOIN equip_data ed ON ed.ppe_id = p.id AND ed.exam_year = %(exam_year)s
+    LEFT JOIN dat_equip de ON ed.equip_id = de.id::INTEGER
+    LEFT JOIN dat_contract dc ON dc.id = ed.contract_id AND dc.exam_year = %(exam_year)s
+"""
+EXPORT_QUERY = (
+    "SELECT " + ", ".join(expr for _, expr, _ in EXPORT_COLUMNS)
+    + _FROM_CLAUSE
+    + " ORDER BY p.id, ed.id"
+)
+EXPORT_COUNT_QUERY = "SELECT count(*)" + _FROM_CLAUSE
+
+
+def _format_of(path):
+    ext = os.path.splitext(path)[1].lower()
+    if ext in (".parquet", ".pq"):
+        return "parquet"
+    if ext in (".csv", ".txt"):
+        return "csv"
+    raise ValueError(f"Неизвестный формат выгрузки {ext or path}: ожидается .csv или .parquet")
+
+
+class _CsvWriter:
+    """CSV в UTF-8 с BOM и разделителем ';' — файл сразу открывается в Excel."""
+
+    def __init__(self, path):
+        self._file = open(path, "w", newline="", encoding="utf-8-sig")
+        self._writer = csv.writer(self._file, delimiter=";")
+        self._writer.writerow([name for name, _, _ in EXPORT_COLUMNS])
+
+    def write(self, rows):
+        self._writer.writerows(rows)
+
+    def close(self):
+        self._file.close()
+
+
+class _ParquetWriter:
+    """Parquet: каждая пачка записывается отдельной группой строк."""
+
+    def __init__(self, path):
+        if pyarrow is None:
+            raise RuntimeError("Для выгрузки в Parquet требуется пакет pyarrow: pip install pyarrow")
+        self._schema = pyarrow.schema(
+            [(name, getattr(pyarrow, arrow_type)()) for name, _, arrow_type in EXPORT_COLUMNS]
+        )
+        self._writer = pyarrow.parquet.ParquetWriter(path, self._schema, compression="snappy")
+
+    def write(self, rows):
+        columns = [
+            pyarrow.array([row[i] for row in rows], type=self._schema.field(i).type)
+            for i in range(len(EXPORT_COLUMNS))
+        ]
+        self._writer.write_table(pyarrow.Table.from_arrays(columns, schema=self._schema))
+
+    def close(self):
+        self._writer.close()
+
+WRITERS = {
+    "csv": _CsvWriter,
+    "parquet": _ParquetWriter,
+}
+
+def export_dataset(path, fmt=None, batch_size=DEFAULT_BATCH_SIZE, progress=None, exam_year=None):
+    """
+    Выгружает ППЭ с оборудованием и контрактами в файл.
+
+    Args:
+        path (str): Путь к файлу выгрузки
+        fmt (str, optional): "csv" или "parquet"; по умолчанию по расширению файла
+        batch_size (int): Размер пачки серверного курсора
+        progress (callable, optional): progress(done, total) после каждой пачки
+        exam_year (int, optional): Год кампании (по умолчанию текущий, database.EXAM_YEAR)
+
+    Returns:
+        dict: Число строк rows, формат format и время elapsed, с
+    """
+    fmt = fmt or _format_of(path)
+    started = time.perf_counter()
+    params = {"exam_year": exam_year or get_exam_year()}
+    # Число строк нужно только для хода выгрузки и может слегка разойтись с курсором
+    total = execute_query(EXPORT_COUNT_QUERY, params)[0][0] if progress else None
+
+    writer = WRITERS[fmt](path)
+    done = 0
+    try:
+        for rows in stream_query_batches(EXPORT_QUERY, params, batch_size):
+            writer.write(rows)
+            done += len(rows)
+            if progress:
+                progress(done, total)
+    except BaseException:
+        # Ошибка при удалении неполного файла не должна заменить исходную ошибку
+        with contextlib.suppress(Exception):
+            writer.close()
+        with contextlib.suppress(OSError):
+            os.remove(path)
+        raise
+    writer.close()
+
+    return {"rows": done, "format": fmt, "elapsed": round(time.perf_counter() - started, 2)}
+
+def main():
+    parser = argparse.ArgumentParser(description="Выгрузка ППЭ с оборудованием и контрактами")
+    parser.add_argument("path", help="Файл .csv или .parquet")
+    parser.add_argument("--format", choices=sorted(WRITERS), help="Формат (по умолчанию по расширению)")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument("--quiet", action="store_true", help="Не выводить ход выгрузки")
+    parser.add_argument("--year", type=int, help="Год кампании (по умолчанию текущий)")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    progress = None if args.quiet else lambda done, total: print_progress(done, total, started)
+    try:
+        summary = export_dataset(args.path, args.format, args.batch_size, progress, args.year)
+    except (ValueError, RuntimeError, OSError, database_error()) as e:
+        print(f"\nОшибка выгрузки: {e}")
+        raise SystemExit(1)
+    finally:
+        close_pool()
+
+    if not args.quiet:
+        print()
+    print(f"Выгружено строк: {summary['rows']} ({summary['format']}), время: {summary['elapsed']} с")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,273 @@
+"""
+Импорт оборудования из выгрузки 1С (CSV или XLSX).
+Файл читается построчно и передаётся на сервер командой COPY во временную
+таблицу, после чего оборудование объединяется с dat_equip и equip_data
+несколькими командами над всем набором. Память не зависит от размера файла.
+Цена хранится у модели: импорт обновляет dat_equip.equip_price, у единиц
+оборудования в equip_data обновляются ППЭ и модель.
+
+Пример запуска:
+    python import_1c.py export.xlsx
+    python import_1c.py export.csv --encoding cp1251
+"""
+
+import argparse
+import csv
+import io
+import time
+
+import db_psycopg3
+import database
+from database import get_connection, close_pool, database_error, invalidate_cache
+
+try:
+    import openpyxl
+except ImportError:
+    openpyxl = None
+
+# Заголовки столбцов выгрузки 1С (в нижнем регистре) для каждого поля импорта
+HEADER_ALIASES = {
+    "ppe_id":      ("ppe_id", "ппэ", "номер ппэ", "код ппэ"),
+    "name_in_1C":  ("name_in_1c", "наименование", "номенклатура", "основное средство"),
+    "inv_number":  ("inv_number", "инвентарный номер", "инв. номер", "инв. №"),
+    "equip_price": ("equip_price", "цена", "стоимость", "балансовая стоимость"),
+}
+IMPORT_FIELDS = list(HEADER_ALIASES)
+
+# Типы столбцов временной таблицы берутся из целевых таблиц,
+# поэтому значения разбираются сервером при COPY так же, как при вставке
+_CREATE_STAGING = """
+    CREATE TEMP TABLE import_1c_staging ON COMMIT DROP AS
+    SELECT ed.ppe_id, de."name_in_1C", ed.inv_number, de.equip_price, 0::bigint AS line_no
+    FROM equip_data ed CROSS JOIN dat_equip de
+    WITH NO DATA
+"""
+_COPY_STAGING = (
+    'COPY import_1c_staging (ppe_id, "name_in_1C", inv_number, equip_price, line_no) '
+    "FROM STDIN WITH (FORMAT csv)"
+)
+
+# Одновременные импорты выполняются по очереди: сопоставление единиц оборудования
+# по инвентарному номеру (NOT EXISTS) не защищено уникальным индексом
+_IMPORT_LOCK = "SELECT pg_advisory_xact_lock(hashtext('import_1c'))"
+
+# Объединение: при повторах в файле действует последняя строка (line_no).
+# id моделей назначается по умолчанию столбца, "name_in_1C" уникально (миграция 8)
+_MERGE_STATEMENTS = [
+    ("models_inserted", """
+        INSERT INTO dat_equip ("name_in_1C", equip_price)
+        SELECT DISTINCT ON (s."name_in_1C") s."name_in_1C", s.equip_price
+        FROM import_1c_staging s
+        WHERE NOT EXISTS (SELECT 1 FROM dat_equip de WHERE de."name_in_1C" = s."name_in_1C")
+        ORDER BY s."name_in_1C", s.line_no DESC
+        ON CONFLICT ("name_in_1C") DO NOTHING
+    """),
+    ("models_updated", """
+        UPDATE dat_equip de
+        SET equip_price = s.equip_price
+        FROM (
+            SELECT DISTINCT ON ("name_in_1C") "name_in_1C", equip_price
+            FROM import_1c_staging
+            WHERE equip_price IS NOT NULL
+            ORDER BY "name_in_1C", line_no DESC
+        ) s
+        WHERE de."name_in_1C" = s."name_in_1C"
+        AND de.equip_price IS DISTINCT FROM s.equip_price
+    """),
+    (None, """
+        CREATE TEMP TABLE import_1c_items ON COMMIT DROP AS
+        SELECT DISTINCT ON (s.inv_number)
+               s.inv_number,
+               s.ppe_id,
+               (SELECT min(de.id::INTEGER) FROM dat_equip de WHERE de."name_in_1C" = s."name_in_1C") AS equip_id
+        FROM import_1c_staging s
+        ORDER BY s.inv_number, s.line_no DESC
+    """),
+    ("items_updated", """
+        UPDATE equip_data ed
+        SET ppe_id = i.ppe_id, equip_id = i.equip_id
+        FROM import_1c_items i
+        WHERE ed.exam_year = %(exam_year)s AND ed.inv_number = i.inv_number
+        AND (ed.ppe_id, ed.equip_id) IS DISTINCT FROM (i.ppe_id, i.equip_id)
+    """),
+    ("items_inserted", """
+        INSERT INTO equip_data (exam_year, ppe_id, equip_id, inv_number, amount)
+        SELECT %(exam_year)s, i.ppe_id, i.equip_id, i.inv_number, 1
+        FROM import_1c_items i
+        WHERE NOT EXISTS (
+            SELECT 1 FROM equip_data ed WHERE ed.exam_year = %(exam_year)s AND ed.inv_number = i.inv_number
+        )
+    """),
+]
+
+
+def _detect_encoding(path):
+    with open(path, "rb") as f:
+        sample = f.read(65536)
+    try:
+        sample.decode("utf-8")
+        return "utf-8-sig"
+    except UnicodeDecodeError as e:
+        # Обрезанный по границе буфера многобайтовый символ не означает другую кодировку
+        if e.start >= len(sample) - 3:
+            return "utf-8-sig"
+        return "cp1251"
+
+def _read_csv(path, encoding=None):
+    encoding = encoding or _detect_encoding(path)
+    with open(path, newline="", encoding=encoding) as f:
+        dialect = csv.Sniffer().sniff(f.read(8192), delimiters=";,\t")
+        f.seek(0)
+        yield from csv.reader(f, dialect)
+
+def _read_xlsx(path, sheet=None):
+    if openpyxl is None:
+        raise RuntimeError("Для импорта XLSX требуется пакет openpyxl: pip install openpyxl")
+    workbook = openpyxl.load_workbook(path, read_only=True, data_only=True)
+    try:
+        worksheet = workbook[sheet] if sheet else workbook.active
+        yield from worksheet.iter_rows(values_only=True)
+    finally:
+        workbook.close()
+
+def _map_header(header):
+    """Возвращает индексы столбцов файла для полей IMPORT_FIELDS."""
+    names = [str(value).strip().lower() if value is not None else "" for value in header]
+    positions = {}
+    for field, aliases in HEADER_ALIASES.items():
+        for alias in aliases:
+            if alias in names:
+                positions[field] = names.index(alias)
+                break
+        else:
+            raise ValueError(f"В файле нет столбца для поля {field} (ожидается одно из: {', '.join(aliases)})")
+    return [positions[field] for field in IMPORT_FIELDS]
+
+def _normalize_price(value):
+    # 1С выгружает суммы с пробелами-разделителями разрядов и десятичной запятой
+    if value is None or isinstance(value, (int, float)):
+        return value
+    text = str(value).replace("\xa0", "").replace(" ", "").replace(",", ".")
+    return text or None
+
+def _staging_rows(rows, stats):
+    """Приводит строки файла к столбцам временной таблицы, пропуская неполные."""
+    header = next(rows, None)
+    if header is None:
+        return
+    positions = _map_header(header)
+    for line_no, row in enumerate(rows, start=2):
+        values = [row[i] if i < len(row) else None for i in positions]
+        values = [None if v is None or str(v).strip() == "" else v for v in values]
+        ppe_id, name, inv_number, price = values
+        if ppe_id is None or name is None or inv_number is None:
+            stats["skipped"] += 1
+            continue
+        if isinstance(inv_number, float) and inv_number.is_integer():
+            inv_number = int(inv_number)
+        if isinstance(ppe_id, float) and ppe_id.is_integer():
+            ppe_id = int(ppe_id)
+        stats["read"] += 1
+        yield (ppe_id, str(name).strip(), inv_number, _normalize_price(price), line_no)
+
+
+class _CsvStream(io.RawIOBase):
+    """Файловый объект для copy_expert: отдаёт строки в формате CSV по мере чтения."""
+
+    def __init__(self, rows):
+        self._rows = rows
+        self._buffer = bytearray()
+        self._text = io.StringIO()
+        self._writer = csv.writer(self._text)
+
+    def readable(self):
+        return True
+
+    def read(self, size=-1):
+        while size < 0 or len(self._buffer) < size:
+            row = next(self._rows, None)
+            if row is None:
+                break
+            self._writer.writerow(row)
+            self._buffer += self._text.getvalue().encode("utf-8")
+            self._text.seek(0)
+            self._text.truncate()
+        if size < 0:
+            size = len(self._buffer)
+        chunk = bytes(self._buffer[:size])
+        del self._buffer[:size]
+        return chunk
+
+def _copy_rows(cursor, rows):
+    if database.DB_BACKEND == 'psycopg3':
+        db_psycopg3.copy_rows(cursor, _COPY_STAGING, rows)
+    else:
+        cursor.copy_expert(_COPY_STAGING, _CsvStream(rows), size=65536)
+
+def import_equipment(path, encoding=None, sheet=None, exam_year=None):
+    """
+    Импортирует оборудование из выгрузки 1С одной транзакцией.
+
+    Модели (dat_equip) сопоставляются по "name_in_1C", единицы оборудования
+    (equip_data) — по инвентарному номеру в пределах года кампании exam_year
+    (по умолчанию текущего): новые добавляются, у существующих обновляются ППЭ
+    и модель. Цена из файла записывается в модель (dat_equip.equip_price).
+
+    Returns:
+        dict: Счётчики строк файла и изменений, время elapsed, с
+    """
+    if path.lower().endswith((".xlsx", ".xlsm")):
+        rows = _read_xlsx(path, sheet)
+    else:
+        rows = _read_csv(path, encoding)
+
+    stats = {"read": 0, "skipped": 0}
+    params = {"exam_year": exam_year or database.get_exam_year()}
+    db_error = database_error()
+    started = time.perf_counter()
+    with get_connection(shared=False) as conn:
+        cursor = conn.cursor()
+        try:
+            cursor.execute(_IMPORT_LOCK)
+            cursor.execute(_CREATE_STAGING)
+            _copy_rows(cursor, _staging_rows(iter(rows), stats))
+            stats["copy_seconds"] = round(time.perf_counter() - started, 2)
+            cursor.execute("ANALYZE import_1c_staging")
+            for name, statement in _MERGE_STATEMENTS:
+                cursor.execute(statement, params)
+                if name:
+                    stats[name] = cursor.rowcount
+            conn.commit()
+        except db_error:
+            conn.rollback()
+            raise
+
+    invalidate_cache("dat_equip", "equip_data")
+    stats["elapsed"] = round(time.perf_counter() - started, 2)
+    return stats
+
+def main():
+    parser = argparse.ArgumentParser(description="Импорт оборудования из выгрузки 1С")
+    parser.add_argument("path", help="Файл CSV или XLSX")
+    parser.add_argument("--encoding", help="Кодировка CSV (по умолчанию определяется: UTF-8 или cp1251)")
+    parser.add_argument("--sheet", help="Лист XLSX (по умолчанию активный)")
+    parser.add_argument("--year", type=int, help="Год кампании (по умолчанию текущий)")
+    args = parser.parse_args()
+
+    try:
+        stats = import_equipment(args.path, args.encoding, args.sheet, args.year)
+    except (ValueError, RuntimeError, database_error()) as e:
+        print(f"Ошибка импорта: {e}")
+        raise SystemExit(1)
+    finally:
+        close_pool()
+
+    print(
+        f"Строк: {stats['read']}, пропущено: {stats['skipped']}; "
+        f"модели: +{stats['models_inserted']}, изменено {stats['models_updated']}; "
+        f"оборудование: +{stats['items_inserted']}, изменено {stats['items_updated']}; "
+        f"COPY {stats['copy_seconds']} с, всего {stats['elapsed']} с"
+    )
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,449 @@
+"""
+Модуль локальной реплики базы данных в SQLite.
+Хранит копию справочных таблиц и оборудования, чтобы список ППЭ и карточки
+открывались сразу и без связи с сервером. Реплика догоняет сервер в фоновом
+потоке по изменениям (по системному столбцу xmin), а команды записи,
+не дошедшие до сервера, складываются в очередь и отправляются позже.
+"""
+
+import os
+import json
+import sqlite3
+import logging
+import threading
+from datetime import date, datetime
+from decimal import Decimal
+
+logger = logging.getLogger('database')
+
+# Реплицируемые таблицы и их ключ; для таблиц без ключа копия обновляется целиком
+REPLICA_TABLES = {
+    'dat_ppe': 'id',
+    'dat_ppe_details': None,
+    'dat_responsible': None,
+    'dat_equip': 'id',
+    'equip_data': 'id',
+    'dat_contract': 'id',
+}
+
+DEFAULT_REPLICA_PATH = os.path.join(os.path.expanduser("~"), "Documents", "PPE_Manager", "replica.sqlite3")
+
+_XID_MODULO = 2 ** 32
+
+# Строк полной копии таблицы за одну транзакцию записи в реплику
+STAGING_CHUNK_SIZE = 5000
+
+
+def _to_sqlite(value):
+    """Приводит значения PostgreSQL к типам, которые хранит SQLite."""
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, ensure_ascii=False)
+    return value
+
+def _quote(name):
+    return '"' + name.replace('"', '""') + '"'
+
+
+class LocalReplica:
+    """Локальная копия таблиц с фоновой синхронизацией и очередью записи."""
+
+    def __init__(self, path=DEFAULT_REPLICA_PATH, sync_interval=60):
+        self.path = path
+        self.sync_interval = sync_interval
+        self.online = False
+        self._lock = threading.RLock()
+        self._sync_lock = threading.Lock()   # sync вызывается и фоновым потоком, и по уведомлениям
+        self._flush_lock = threading.Lock()  # очередь записи отправляется одним потоком
+        self._stop = threading.Event()
+        self._wakeup = threading.Event()
+        self._thread = None
+        self._listeners = []
+
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript("""
+            CREATE TABLE IF NOT EXISTS replica_meta (
+                table_name TEXT PRIMARY KEY,
+                columns    TEXT NOT NULL,
+                watermark  INTEGER,
+                synced_at  TEXT
+            );
+            CREATE TABLE IF NOT EXISTS pending_writes (
+                id         INTEGER PRIMARY KEY AUTOINCREMENT,
+                operation  TEXT NOT NULL,
+                args       TEXT NOT NULL,
+                created_at TEXT NOT NULL
+            );
+        """)
+        self._db.commit()
+
+    # ---------- Фоновая синхронизация ----------
+
+    def start(self):
+        """Запускает фоновый поток синхронизации."""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="replica-sync", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._wakeup.set()
+
+    def request_sync(self):
+        """Просит фоновый поток синхронизироваться, не дожидаясь интервала."""
+        self._wakeup.set()
+
+    def add_listener(self, callback):
+        """Регистрирует вызов callback(changed_tables) после каждой синхронизации (из фонового потока)."""
+        self._listeners.append(callback)
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.flush_pending_writes()
+                changed = self.sync()
+                if not self.online:
+                    logger.info("Связь с сервером установлена, реплика синхронизирована")
+                self.online = True
+                if changed:
+                    for callback in self._listeners:
+                        callback(changed)
+            except Exception as e:
+                if self.online:
+                    logger.warning(f"Нет связи с сервером, работа с локальной репликой: {e}")
+                self.online = False
+            self._wakeup.wait(self.sync_interval)
+            self._wakeup.clear()
+
+    def is_ready(self):
+        """Реплика готова к чтению, если все таблицы хотя бы раз синхронизированы."""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT COUNT(*) FROM replica_meta WHERE synced_at IS NOT NULL"
+            ).fetchone()
+        return rows[0] == len(REPLICA_TABLES)
+
+    def sync(self):
+        """
+        Догоняет сервер по всем таблицам.
+
+        Returns:
+            list: Таблицы, в которых были изменения
+        """
+        changed = []
+        with self._sync_lock:
+            for table, key in REPLICA_TABLES.items():
+                if self._sync_table(table, key):
+                    changed.append(table)
+        return changed
+
+    def _sync_table(self, table, key):
+        from database import get_connection, get_exam_year, EXAM_YEAR_TABLES
+
+        # Секционированные по году таблицы реплицируются только за текущий год кампании
+        scope, scope_params = "", ()
+        if table in EXAM_YEAR_TABLES:
+            scope, scope_params = "exam_year = %s", (get_exam_year(),)
+
+        with self._lock:
+            meta = self._db.execute(
+                "SELECT columns, watermark FROM replica_meta WHERE table_name = ?", (table,)
+            ).fetchone()
+            # После смены года в копии остаются строки другого года — копия перечитывается целиком
+            if scope and meta is not None and "exam_year" in json.loads(meta[0]):
+                if self._db.execute(
+                    f"SELECT 1 FROM {_quote(table)} WHERE exam_year <> ? LIMIT 1", scope_params
+                ).fetchone():
+                    meta = None
+
+        with get_connection(shared=False) as conn:
+            cursor = conn.cursor()
+            # Все транзакции с номером меньше xmin снимка уже завершены,
+            # поэтому при следующей синхронизации достаточно строк с xmin >= этого значения
+            cursor.execute("SELECT txid_snapshot_xmin(txid_current_snapshot()) %% %s", (_XID_MODULO,))
+            watermark = cursor.fetchone()[0]
+
+            full = meta is None or meta[1] is None or watermark < meta[1]
+            if not full and key is None:
+                # Таблицу без ключа нельзя обновить по строкам: она перечитывается целиком,
+                # но только если после прошлой синхронизации на сервере что-то изменилось
+                if self._keyless_unchanged(cursor, table, meta[1]):
+                    conn.rollback()
+                    with self._lock, self._db:
+                        self._save_meta(table, json.loads(meta[0]), watermark)
+                    return False
+                full = True
+            deleted_keys = []
+            if not full:
+                cursor.execute(
+                    f"SELECT * FROM {table} WHERE xmin::text::bigint >= %s" + (f" AND {scope}" if scope else ""),
+                    (meta[1],) + scope_params
+                )
+                columns = [column[0] for column in cursor.description]
+                if json.loads(meta[0]) != columns:
+                    full = True  # схема на сервере изменилась — таблица копируется заново
+                else:
+                    rows = cursor.fetchall()
+                    deleted_keys = self._deleted_keys(cursor, table, key, meta[1], scope, scope_params)
+                    if deleted_keys is None:
+                        full = True  # журнал удалений обрезан после прошлой синхронизации
+            if full:
+                cursor.execute(f"SELECT * FROM {table}" + (f" WHERE {scope}" if scope else ""), scope_params)
+                columns = [column[0] for column in cursor.description]
+                rows = cursor.fetchall()
+            conn.rollback()
+
+        rows = [tuple(_to_sqlite(v) for v in row) for row in rows]
+        if key is None and meta is not None and json.loads(meta[0]) == columns:
+            with self._lock:
+                # Таблица без ключа копируется целиком; изменением считается только отличие содержимого
+                local_rows = self._db.execute(f"SELECT * FROM {_quote(table)}").fetchall()
+                if sorted(local_rows, key=repr) == sorted(rows, key=repr):
+                    self._db.execute(
+                        "UPDATE replica_meta SET watermark = ?, synced_at = ? WHERE table_name = ?",
+                        (watermark, datetime.now().isoformat(), table)
+                    )
+                    self._db.commit()
+                    return False
+
+        deleted = 0
+        if full:
+            self._replace_table(table, key, columns, rows, watermark)
+        else:
+            placeholders = ", ".join("?" for _ in columns)
+            column_list = ", ".join(_quote(c) for c in columns)
+            with self._lock, self._db:
+                # Сначала удаления: удалённый и заново созданный ключ есть в обоих списках
+                deleted = self._db.executemany(
+                    f"DELETE FROM {_quote(table)} WHERE {_quote(key)} = ?", [(k,) for k in deleted_keys]
+                ).rowcount
+                self._db.executemany(
+                    f"INSERT OR REPLACE INTO {_quote(table)} ({column_list}) VALUES ({placeholders})",
+                    rows
+                )
+                self._save_meta(table, columns, watermark)
+
+        if rows or deleted or full:
+            logger.info(f"Реплика {table}: {'полная копия' if full else 'изменения'}, "
+                        f"строк {len(rows)}, удалено {deleted}")
+        return bool(rows or deleted)
+
+    def _keyless_unchanged(self, cursor, table, watermark):
+        """
+        На сервере нет строк, добавленных или изменённых начиная с watermark,
+        и строк столько же, сколько в копии (удалений не было).
+        """
+        cursor.execute(
+            f"SELECT count(*), count(*) FILTER (WHERE xmin::text::bigint >= %s) FROM {table}", (watermark,)
+        )
+        server_count, changed = cursor.fetchone()
+        with self._lock:
+            local_count = self._db.execute(f"SELECT COUNT(*) FROM {_quote(table)}").fetchone()[0]
+        return not changed and server_count == local_count
+
+    def _deleted_keys(self, cursor, table, key, watermark, scope, scope_params):
+        """
+        Ключи строк, удалённых на сервере начиная с watermark, по журналу удалений
+        {table}_deleted (миграции 5 и 10). Если журнала на сервере нет, удалённые
+        строки находятся сравнением со всеми ключами таблицы. None — записи журнала
+        после watermark уже удалены (migrations.py prune-deleted), нужна полная копия.
+        """
+        cursor.execute(
+            "SELECT to_regclass(%s) IS NOT NULL, to_regclass('delete_log_horizon') IS NOT NULL",
+            (f"{table}_deleted",)
+        )
+        has_log, has_horizon = cursor.fetchone()
+        if has_log:
+            if has_horizon:
+                cursor.execute(
+                    "SELECT row_version %% %s >= %s FROM delete_log_horizon WHERE table_name = %s",
+                    (_XID_MODULO, watermark, table)
+                )
+                pruned = cursor.fetchone()
+                if pruned and pruned[0]:
+                    return None
+            cursor.execute(
+                f"SELECT id FROM {table}_deleted WHERE row_version %% %s >= %s", (_XID_MODULO, watermark)
+            )
+            return [row[0] for row in cursor.fetchall()]
+
+        cursor.execute(f"SELECT {key} FROM {table}" + (f" WHERE {scope}" if scope else ""), scope_params)
+        server_keys = {row[0] for row in cursor.fetchall()}
+        with self._lock:
+            local_keys = [r[0] for r in self._db.execute(f"SELECT {_quote(key)} FROM {_quote(table)}")]
+        return [k for k in local_keys if k not in server_keys]
+
+    def _replace_table(self, table, key, columns, rows, watermark):
+        """
+        Заменяет копию таблицы целиком. Новая копия собирается в промежуточной
+        таблице порциями (между ними чтение из реплики не ждёт) и подменяет
+        прежнюю одной короткой транзакцией.
+        """
+        staging = _quote(f"{table}_staging")
+        definitions = ", ".join(_quote(c) + (" PRIMARY KEY" if c == key else "") for c in columns)
+        placeholders = ", ".join("?" for _ in columns)
+        column_list = ", ".join(_quote(c) for c in columns)
+
+        with self._lock, self._db:
+            self._db.execute(f"DROP TABLE IF EXISTS {staging}")
+            self._db.execute(f"CREATE TABLE {staging} ({definitions})")
+        for start in range(0, len(rows), STAGING_CHUNK_SIZE):
+            with self._lock, self._db:
+                self._db.executemany(
+                    f"INSERT OR REPLACE INTO {staging} ({column_list}) VALUES ({placeholders})",
+                    rows[start:start + STAGING_CHUNK_SIZE]
+                )
+        with self._lock, self._db:
+            self._db.execute("BEGIN")
+            self._db.execute(f"DROP TABLE IF EXISTS {_quote(table)}")
+            self._db.execute(f"ALTER TABLE {staging} RENAME TO {_quote(table)}")
+            self._save_meta(table, columns, watermark)
+
+    def _save_meta(self, table, columns, watermark):
+        self._db.execute(
+            "INSERT OR REPLACE INTO replica_meta (table_name, columns, watermark, synced_at) "
+            "VALUES (?, ?, ?, ?)",
+            (table, json.dumps(columns), watermark, datetime.now().isoformat())
+        )
+
+    # ---------- Очередь записи ----------
+
+    def queue_write(self, operation, args):
+        """Откладывает команду записи до восстановления связи с сервером."""
+        with self._lock:
+            self._db.execute(
+                "INSERT INTO pending_writes (operation, args, created_at) VALUES (?, ?, ?)",
+                (operation, json.dumps(args, ensure_ascii=False, default=str), datetime.now().isoformat())
+            )
+            self._db.commit()
+        logger.warning(f"Сервер недоступен, запись {operation} поставлена в очередь")
+
+    def pending_count(self):
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM pending_writes").fetchone()[0]
+
+    def flush_pending_writes(self):
+        """Отправляет отложенные команды на сервер по порядку."""
+        from database import apply_queued_write
+
+        with self._flush_lock:
+            while True:
+                with self._lock:
+                    row = self._db.execute(
+                        "SELECT id, operation, args FROM pending_writes ORDER BY id LIMIT 1"
+                    ).fetchone()
+                if row is None:
+                    return
+                write_id, operation, args = row
+                # Ошибка связи прерывает отправку: команда останется в очереди
+                apply_queued_write(operation, json.loads(args))
+                with self._lock:
+                    self._db.execute("DELETE FROM pending_writes WHERE id = ?", (write_id,))
+                    self._db.commit()
+                logger.info(f"Отложенная запись {operation} отправлена на сервер")
+
+    # ---------- Чтение ----------
+
+    def _query(self, query, params=()):
+        with self._lock:
+            return self._db.execute(query, params).fetchall()
+
+    def get_ppe_list(self, gia_type=None):
+        if gia_type:
+            return self._query(
+                "SELECT id, ppe_address_fact FROM dat_ppe WHERE gia_type = ? ORDER BY ppe_number NULLS LAST, id", (int(gia_type),)
+            )
+        return self._query("SELECT id, ppe_address_fact FROM dat_ppe ORDER BY ppe_number NULLS LAST, id")
+
+    def get_ppe_row(self, ppe_id):
+        rows = self._query(
+            "SELECT id, ppe_address_fact, gia_type FROM dat_ppe WHERE id = ?", (int(ppe_id),)
+        )
+        return rows[0] if rows else None
+
+    def get_ppe_details(self, school_id):
+        rows = self._query(
+            "SELECT fullname, address, inn, kpp, okpo, ogrn FROM dat_ppe_details WHERE school_id = ? LIMIT 1",
+            (school_id,)
+        )
+        return rows[0] if rows else None
+
+    def get_responsible_person(self, school_id):
+        rows = self._query(
+            "SELECT position, surname, first_name, second_name FROM dat_responsible WHERE school_id = ? LIMIT 1",
+            (school_id,)
+        )
+        return rows[0] if rows else None
+
+    def count_ppe(self, gia_type=None):
+        if gia_type:
+            return self._query("SELECT COUNT(*) FROM dat_ppe WHERE gia_type = ?", (int(gia_type),))[0][0]
+        return self._query("SELECT COUNT(*) FROM dat_ppe")[0][0]
+
+    def get_ppe_page(self, after, gia_type, limit):
+        conditions, params = ["1"], []
+        if gia_type:
+            conditions.append("gia_type = ?")
+            params.append(int(gia_type))
+        if after is not None:
+            # Порядок как на сервере: ППЭ без номера последними
+            if after[0] is None:
+                conditions.append("ppe_number IS NULL AND id > ?")
+                params.append(after[1])
+            else:
+                conditions.append("((ppe_number, id) > (?, ?) OR ppe_number IS NULL)")
+                params.extend(after)
+        return self._query(
+            f"SELECT id, ppe_address_fact, ppe_number FROM dat_ppe WHERE {' AND '.join(conditions)} "
+            "ORDER BY ppe_number NULLS LAST, id LIMIT ?",
+            tuple(params) + (limit,)
+        )
+
+    def get_equipment_page(self, ppe_id, after, limit):
+        return self._query("""
+            SELECT de.equip_type, de.equip_mark, de.equip_mod, de.release_year, ed.amount, ed.id
+            FROM equip_data ed
+            JOIN dat_equip de ON CAST(de.id AS INTEGER) = ed.equip_id
+            WHERE ed.ppe_id = ? AND ed.id > ?
+            ORDER BY ed.id
+            LIMIT ?
+        """, (int(ppe_id), after or 0, limit))
+
+    def get_contracts_page(self, ppe_id, after, limit):
+        return self._query("""
+            SELECT contract_date, contract_number, supplier, supplier_inn, contract_name, id
+            FROM dat_contract
+            WHERE id IN (SELECT contract_id FROM equip_data WHERE ppe_id = ?)
+            AND id > ?
+            ORDER BY id
+            LIMIT ?
+        """, (int(ppe_id), after or 0, limit))
+
+    def get_bundle_parts(self, ppe_id, limit):
+        """
+        Возвращает данные карточки ППЭ в том же составе, что и PPE_BUNDLE_QUERY;
+        оборудование и контракты — первыми страницами по limit строк.
+
+        Returns:
+            tuple: (строка ППЭ, реквизиты, ответственный, оборудование, контракты)
+        """
+        ppe_id = int(ppe_id)
+        rows = self._query(
+            "SELECT ppe_number, ppe_address_fact, school_id, gia_type FROM dat_ppe WHERE id = ?", (ppe_id,)
+        )
+        ppe = rows[0] if rows else None
+        school_id = ppe[2] if ppe else None
+        return (
+            ppe,
+            self.get_ppe_details(school_id) if ppe else None,
+            self.get_responsible_person(school_id) if ppe else None,
+            self.get_equipment_page(ppe_id, None, limit),
+            self.get_contracts_page(ppe_id, None, limit),
+        )
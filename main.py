@@ -1,5 +1,5 @@
 from ui import create_ui
-from database import connect_to_database
+from database import get_pool, SchemaVersionError
 import tkinter as tk
 from tkinter import messagebox
 
@@ -7,7 +7,7 @@ class PPEApp:
     def __init__(self, root):
         self.root = root
         self._initialize_window()
-        self.connection = connect_to_database()
+        self.connection = get_pool()
         self._initialize_variables()
 
         # Заглушки для операций с ППЭ:
@@ -35,7 +35,12 @@ class PPEApp:
 
 if __name__ == "__main__":
     app_root = tk.Tk()
-    app = PPEApp(app_root)
+    try:
+        app = PPEApp(app_root)
+    except SchemaVersionError as e:
+        messagebox.showerror("База данных не обновлена", str(e))
+        app_root.destroy()
+        raise SystemExit(1)
     # Создаем UI после инициализации app
     create_ui(app)
     app_root.iconbitmap("icon.ico")
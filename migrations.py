@@ -0,0 +1,1048 @@
+"""
+Модуль версионных миграций схемы базы данных.
+Применённые версии хранятся в таблице schema_migrations.
+
+Пример запуска:
+    python migrations.py migrate
+    python migrations.py status
+    python migrations.py verify
+    python migrations.py partition --year 2026
+    python migrations.py prune-deleted --days 30
+    python migrations.py drop-unpartitioned
+"""
+
+import argparse
+import ast
+import json
+import logging
+import os
+import re
+
+import database
+from database import get_connection, close_pool, database_error, EXAM_YEAR, EXAM_YEAR_TABLES
+
+logger = logging.getLogger('database')
+
+def _notify_triggers(table, key):
+    """Команды создания триггеров уведомлений для таблицы (миграция 4)."""
+    statements = []
+    for op, referencing in (
+        ("INSERT", "NEW TABLE AS changed_rows"),
+        ("UPDATE", "OLD TABLE AS old_rows NEW TABLE AS changed_rows"),
+        ("DELETE", "OLD TABLE AS changed_rows"),
+    ):
+        name = f"{table}_notify_{op.lower()[:3]}"
+        statements.append(f"DROP TRIGGER IF EXISTS {name} ON {table}")
+        statements.append(f"""
+        CREATE TRIGGER {name} AFTER {op} ON {table}
+        REFERENCING {referencing}
+        FOR EACH STATEMENT EXECUTE PROCEDURE notify_ppe_changes('{key}')
+        """)
+    return statements
+
+def _equip_agg_triggers():
+    """Триггеры пересчёта агрегатов оборудования на equip_data (миграции 3 и 9)."""
+    return [
+        "DROP TRIGGER IF EXISTS equip_data_agg_ins ON equip_data",
+        "DROP TRIGGER IF EXISTS equip_data_agg_upd ON equip_data",
+        "DROP TRIGGER IF EXISTS equip_data_agg_del ON equip_data",
+        """
+        CREATE TRIGGER equip_data_agg_ins AFTER INSERT ON equip_data
+        REFERENCING NEW TABLE AS new_rows
+        FOR EACH STATEMENT EXECUTE PROCEDURE equip_data_refresh_aggregates()
+        """,
+        """
+        CREATE TRIGGER equip_data_agg_upd AFTER UPDATE ON equip_data
+        REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+        FOR EACH STATEMENT EXECUTE PROCEDURE equip_data_refresh_aggregates()
+        """,
+        """
+        CREATE TRIGGER equip_data_agg_del AFTER DELETE ON equip_data
+        REFERENCING OLD TABLE AS old_rows
+        FOR EACH STATEMENT EXECUTE PROCEDURE equip_data_refresh_aggregates()
+        """,
+    ]
+
+def _delete_log(table):
+    """
+    Журнал удалений таблицы {table}_deleted, как dat_ppe_deleted в миграции 5 (миграция 10).
+    Тип id журнала повторяет тип ключа таблицы.
+    """
+    return [
+        f"""
+        CREATE TABLE {table}_deleted AS
+        SELECT id, 0::bigint AS row_version, now() AS deleted_at FROM {table} WITH NO DATA
+        """,
+        f"ALTER TABLE {table}_deleted ADD PRIMARY KEY (id)",
+        f"ALTER TABLE {table}_deleted ALTER COLUMN row_version SET NOT NULL",
+        f"ALTER TABLE {table}_deleted ALTER COLUMN deleted_at SET NOT NULL",
+        f"ALTER TABLE {table}_deleted ALTER COLUMN deleted_at SET DEFAULT now()",
+        f"CREATE INDEX {table}_deleted_row_version_idx ON {table}_deleted (row_version)",
+        f"""
+        CREATE OR REPLACE FUNCTION {table}_track_delete()
+        RETURNS trigger LANGUAGE plpgsql AS $$
+        BEGIN
+            INSERT INTO {table}_deleted (id, row_version)
+            SELECT DISTINCT id, txid_current() FROM old_rows
+            ON CONFLICT (id) DO UPDATE
+            SET row_version = EXCLUDED.row_version, deleted_at = now();
+            RETURN NULL;
+        END
+        $$
+        """,
+        f"DROP TRIGGER IF EXISTS {table}_track_delete ON {table}",
+        f"""
+        CREATE TRIGGER {table}_track_delete AFTER DELETE ON {table}
+        REFERENCING OLD TABLE AS old_rows
+        FOR EACH STATEMENT EXECUTE PROCEDURE {table}_track_delete()
+        """,
+    ]
+
+# Таблицы с журналом удалений {table}_deleted (миграции 5 и 10)
+DELETE_LOG_TABLES = ("dat_ppe", "dat_equip", "equip_data", "dat_contract")
+
+# Сколько дней хранятся записи журналов удалений (команда prune-deleted)
+DELETE_LOG_RETENTION_DAYS = 30
+
+# Год кампании строк, загруженных до секционирования, если его нельзя определить
+# по дате договора (оборудование без договора, договор без даты) (Z:\_ГИА_2025)
+LEGACY_EXAM_YEAR = 2025
+
+# Год кампании договора при переносе в секции (миграция 9)
+_CONTRACT_EXAM_YEAR = f"COALESCE(EXTRACT(YEAR FROM contract_date)::integer, {LEGACY_EXAM_YEAR})"
+
+def _partition_by_exam_year(table):
+    """
+    Команды переноса таблицы в секционированную по exam_year (миграция 9).
+    Последовательность id сохраняется: она переходит к новой таблице.
+    Секционированные таблицы до PostgreSQL 17 не поддерживают столбцы
+    идентичности, поэтому столбец идентичности заменяется последовательностью.
+    """
+    return [
+        f"ALTER TABLE {table} RENAME TO {table}_unpartitioned",
+        f"ALTER INDEX IF EXISTS {table}_pkey RENAME TO {table}_unpartitioned_pkey",
+        # Прежняя таблица остаётся до проверки переноса (команда drop-unpartitioned);
+        # её вторичные индексы удаляются, чтобы новая таблица получила те же имена
+        f"""
+        DO $$
+        DECLARE
+            idx text;
+        BEGIN
+            FOR idx IN
+                SELECT i.indexrelid::regclass::text FROM pg_index i
+                WHERE i.indrelid = '{table}_unpartitioned'::regclass AND NOT i.indisprimary
+                AND NOT EXISTS (SELECT 1 FROM pg_constraint c WHERE c.conindid = i.indexrelid)
+            LOOP
+                EXECUTE format('DROP INDEX %s', idx);
+            END LOOP;
+        END
+        $$
+        """,
+        f"""
+        DO $$
+        DECLARE
+            seq text := pg_get_serial_sequence('{table}_unpartitioned', 'id');
+            next_id bigint;
+        BEGIN
+            IF EXISTS (
+                SELECT 1 FROM pg_attribute
+                WHERE attrelid = '{table}_unpartitioned'::regclass AND attname = 'id' AND attidentity <> ''
+            ) THEN
+                SELECT COALESCE(max(id), 0) + 1 INTO next_id FROM {table}_unpartitioned;
+                ALTER TABLE {table}_unpartitioned ALTER COLUMN id DROP IDENTITY;
+                CREATE SEQUENCE {table}_id_seq;
+                PERFORM setval('{table}_id_seq', next_id, false);
+                ALTER TABLE {table}_unpartitioned ALTER COLUMN id SET DEFAULT nextval('{table}_id_seq');
+                seq := '{table}_id_seq';
+            ELSIF seq IS NOT NULL THEN
+                EXECUTE format('ALTER SEQUENCE %s OWNED BY NONE', seq);
+            END IF;
+
+            CREATE TABLE {table} (
+                LIKE {table}_unpartitioned INCLUDING DEFAULTS INCLUDING CONSTRAINTS,
+                exam_year smallint NOT NULL,
+                PRIMARY KEY (exam_year, id)
+            ) PARTITION BY LIST (exam_year);
+
+            IF seq IS NOT NULL THEN
+                EXECUTE format('ALTER SEQUENCE %s OWNED BY {table}.id', seq);
+            END IF;
+        END
+        $$
+        """,
+    ]
+
+# Внешние ключи секционируемых таблиц и ссылки на них: CREATE TABLE ... LIKE их не
+# переносит, а ссылки других таблиц остаются на переименованных таблицах
+_CAPTURE_FOREIGN_KEYS = [
+    """
+    CREATE TEMP TABLE exam_year_fkeys ON COMMIT DROP AS
+    SELECT c.conname::text AS conname,
+           c.conrelid::regclass::text AS src,
+           c.confrelid::regclass::text AS ref,
+           ARRAY(SELECT a.attname::text
+                 FROM unnest(c.conkey) WITH ORDINALITY k(attnum, n)
+                 JOIN pg_attribute a ON a.attrelid = c.conrelid AND a.attnum = k.attnum
+                 ORDER BY k.n) AS cols,
+           ARRAY(SELECT a.attname::text
+                 FROM unnest(c.confkey) WITH ORDINALITY k(attnum, n)
+                 JOIN pg_attribute a ON a.attrelid = c.confrelid AND a.attnum = k.attnum
+                 ORDER BY k.n) AS ref_cols,
+           c.confupdtype::text AS on_update,
+           c.confdeltype::text AS on_delete
+    FROM pg_constraint c
+    WHERE c.contype = 'f'
+    AND (c.conrelid IN ('equip_data'::regclass, 'dat_contract'::regclass)
+         OR c.confrelid IN ('equip_data'::regclass, 'dat_contract'::regclass))
+    """,
+    """
+    DO $$
+    DECLARE
+        fk record;
+    BEGIN
+        FOR fk IN SELECT * FROM exam_year_fkeys LOOP
+            EXECUTE format('ALTER TABLE %s DROP CONSTRAINT %I', fk.src, fk.conname);
+        END LOOP;
+    END
+    $$
+    """,
+]
+
+# Ключ секционированной таблицы включает exam_year, поэтому ссылка на неё
+# дополняется годом: equip_data (exam_year, contract_id) -> dat_contract (exam_year, id).
+# ON DELETE SET NULL обнуляет только исходные столбцы (PostgreSQL 15+), а не год
+_RESTORE_FOREIGN_KEYS = """
+    DO $$
+    DECLARE
+        fk record;
+        cols text;
+        ref_cols text;
+        on_update text;
+        on_delete text;
+    BEGIN
+        FOR fk IN SELECT * FROM exam_year_fkeys LOOP
+            cols := array_to_string(ARRAY(SELECT quote_ident(c) FROM unnest(fk.cols) c), ', ');
+            ref_cols := array_to_string(ARRAY(SELECT quote_ident(c) FROM unnest(fk.ref_cols) c), ', ');
+            on_update := CASE fk.on_update WHEN 'r' THEN 'RESTRICT' WHEN 'c' THEN 'CASCADE'
+                         WHEN 'n' THEN 'SET NULL' WHEN 'd' THEN 'SET DEFAULT' ELSE 'NO ACTION' END;
+            on_delete := CASE fk.on_delete WHEN 'r' THEN 'RESTRICT' WHEN 'c' THEN 'CASCADE'
+                         WHEN 'n' THEN 'SET NULL' WHEN 'd' THEN 'SET DEFAULT' ELSE 'NO ACTION' END;
+            IF fk.ref IN ('equip_data', 'dat_contract') THEN
+                IF NOT EXISTS (
+                    SELECT 1 FROM pg_attribute
+                    WHERE attrelid = fk.src::regclass AND attname = 'exam_year' AND NOT attisdropped
+                ) THEN
+                    RAISE EXCEPTION 'Внешний ключ % таблицы % ссылается на секционированную %, но в % нет столбца exam_year',
+                        fk.conname, fk.src, fk.ref, fk.src;
+                END IF;
+                IF fk.on_delete IN ('n', 'd') THEN
+                    on_delete := on_delete || ' (' || cols || ')';
+                END IF;
+                cols := 'exam_year, ' || cols;
+                ref_cols := 'exam_year, ' || ref_cols;
+            END IF;
+            EXECUTE format('ALTER TABLE %s ADD CONSTRAINT %I FOREIGN KEY (%s) REFERENCES %s (%s) ON UPDATE %s ON DELETE %s',
+                           fk.src, fk.conname, cols, fk.ref, ref_cols, on_update, on_delete);
+        END LOOP;
+    END
+    $$
+"""
+
+# (версия, описание, список SQL-команд)
+MIGRATIONS = [
+    (1, "Уникальный номер договора для INSERT ... ON CONFLICT", [
+        # Одновременное сохранение договора могло добавить номер дважды. Из повторов
+        # остаётся договор с меньшим id, оборудование переносится на него
+        """
+        UPDATE equip_data ed
+        SET contract_id = d.keep_id
+        FROM (
+            SELECT id AS dup_id,
+                   min(id) OVER (PARTITION BY contract_number) AS keep_id
+            FROM dat_contract
+            WHERE contract_number IS NOT NULL
+        ) d
+        WHERE ed.contract_id = d.dup_id AND d.dup_id <> d.keep_id
+        """,
+        """
+        DELETE FROM dat_contract dc
+        USING (
+            SELECT contract_number, min(id) AS keep_id
+            FROM dat_contract
+            WHERE contract_number IS NOT NULL
+            GROUP BY contract_number
+            HAVING count(*) > 1
+        ) k
+        WHERE dc.contract_number = k.contract_number AND dc.id <> k.keep_id
+        """,
+        """
+        CREATE UNIQUE INDEX IF NOT EXISTS dat_contract_contract_number_key
+        ON dat_contract (contract_number)
+        """,
+    ]),
+    (2, "Индексы по горячим условиям выборок", [
+        "CREATE INDEX IF NOT EXISTS equip_data_ppe_id_idx ON equip_data (ppe_id)",
+        "CREATE INDEX IF NOT EXISTS equip_data_contract_id_idx ON equip_data (contract_id)",
+        "CREATE INDEX IF NOT EXISTS dat_ppe_school_id_idx ON dat_ppe (school_id)",
+        "CREATE INDEX IF NOT EXISTS dat_ppe_gia_type_idx ON dat_ppe (gia_type, id)",
+        "CREATE INDEX IF NOT EXISTS dat_ppe_ppe_number_idx ON dat_ppe (ppe_number)",
+        "CREATE INDEX IF NOT EXISTS dat_responsible_school_id_idx ON dat_responsible (school_id)",
+        "CREATE INDEX IF NOT EXISTS dat_ppe_details_school_id_idx ON dat_ppe_details (school_id)",
+        # Оборудование без договора: условие agreement IS NULL OR agreement = ''
+        """
+        CREATE INDEX IF NOT EXISTS equip_data_ppe_id_no_agreement_idx
+        ON equip_data (ppe_id)
+        WHERE agreement IS NULL OR agreement = ''
+        """,
+        "ANALYZE equip_data",
+        "ANALYZE dat_ppe",
+        "ANALYZE dat_responsible",
+        "ANALYZE dat_ppe_details",
+    ]),
+    (3, "Агрегаты оборудования для договоров с поддержкой триггерами", [
+        # Всё оборудование ППЭ (contracts.get_equipment_list)
+        """
+        CREATE TABLE IF NOT EXISTS equip_agg_ppe AS
+        SELECT equip_data.ppe_id,
+               "name_in_1C"                                   AS equip_name,
+               equip_price,
+               COUNT(*)                                       AS equip_count,
+               string_agg(DISTINCT inv_number::text, E'\\n ')  AS inv_numbers
+        FROM equip_data
+        JOIN "dat_equip" ON "dat_equip"."id" = equip_data.equip_id
+        GROUP BY equip_data.ppe_id, "name_in_1C", equip_price
+        """,
+        "CREATE INDEX IF NOT EXISTS equip_agg_ppe_ppe_id_idx ON equip_agg_ppe (ppe_id)",
+        # Оборудование без договора по организации (contracts.get_equipment_list_by_school_id)
+        """
+        CREATE TABLE IF NOT EXISTS equip_agg_school AS
+        SELECT dat_ppe.school_id,
+               "name_in_1C"                                   AS equip_name,
+               equip_price,
+               COUNT(*)                                       AS equip_count,
+               string_agg(DISTINCT inv_number::text, E'\\n ')  AS inv_numbers
+        FROM equip_data
+        JOIN "dat_equip" ON "dat_equip"."id" = equip_data.equip_id
+        JOIN dat_ppe ON dat_ppe.id = equip_data.ppe_id
+        WHERE agreement IS NULL OR agreement = ''
+        GROUP BY dat_ppe.school_id, "name_in_1C", equip_price
+        """,
+        "CREATE INDEX IF NOT EXISTS equip_agg_school_school_id_idx ON equip_agg_school (school_id)",
+        # Пересчёт агрегатов для набора ППЭ и их организаций
+        """
+        CREATE OR REPLACE FUNCTION refresh_equip_aggregates(p_ppe_ids integer[])
+        RETURNS void LANGUAGE plpgsql AS $$
+        BEGIN
+            IF p_ppe_ids IS NULL OR cardinality(p_ppe_ids) = 0 THEN
+                RETURN;
+            END IF;
+
+            DELETE FROM equip_agg_ppe WHERE ppe_id = ANY (p_ppe_ids);
+            INSERT INTO equip_agg_ppe
+            SELECT equip_data.ppe_id, "name_in_1C", equip_price, COUNT(*),
+                   string_agg(DISTINCT inv_number::text, E'\\n ')
+            FROM equip_data
+            JOIN "dat_equip" ON "dat_equip"."id" = equip_data.equip_id
+            WHERE equip_data.ppe_id = ANY (p_ppe_ids)
+            GROUP BY equip_data.ppe_id, "name_in_1C", equip_price;
+
+            DELETE FROM equip_agg_school
+            WHERE school_id IN (SELECT school_id FROM dat_ppe WHERE id = ANY (p_ppe_ids));
+            INSERT INTO equip_agg_school
+            SELECT dat_ppe.school_id, "name_in_1C", equip_price, COUNT(*),
+                   string_agg(DISTINCT inv_number::text, E'\\n ')
+            FROM equip_data
+            JOIN "dat_equip" ON "dat_equip"."id" = equip_data.equip_id
+            JOIN dat_ppe ON dat_ppe.id = equip_data.ppe_id
+            WHERE dat_ppe.school_id IN (SELECT school_id FROM dat_ppe WHERE id = ANY (p_ppe_ids))
+            AND (agreement IS NULL OR agreement = '')
+            GROUP BY dat_ppe.school_id, "name_in_1C", equip_price;
+        END
+        $$
+        """,
+        # Триггеры уровня команды: пересчёт один раз на затронутые ППЭ
+        """
+        CREATE OR REPLACE FUNCTION equip_data_refresh_aggregates()
+        RETURNS trigger LANGUAGE plpgsql AS $$
+        BEGIN
+            IF TG_OP = 'INSERT' THEN
+                PERFORM refresh_equip_aggregates(ARRAY(
+                    SELECT DISTINCT ppe_id::integer FROM new_rows WHERE ppe_id IS NOT NULL));
+            ELSIF TG_OP = 'DELETE' THEN
+                PERFORM refresh_equip_aggregates(ARRAY(
+                    SELECT DISTINCT ppe_id::integer FROM old_rows WHERE ppe_id IS NOT NULL));
+            ELSE
+                PERFORM refresh_equip_aggregates(ARRAY(
+                    SELECT ppe_id::integer FROM new_rows WHERE ppe_id IS NOT NULL
+                    UNION
+                    SELECT ppe_id::integer FROM old_rows WHERE ppe_id IS NOT NULL));
+            END IF;
+            RETURN NULL;
+        END
+        $$
+        """,
+        *_equip_agg_triggers(),
+        # Смена наименования или цены в справочнике оборудования
+        """
+        CREATE OR REPLACE FUNCTION dat_equip_refresh_aggregates()
+        RETURNS trigger LANGUAGE plpgsql AS $$
+        BEGIN
+            PERFORM refresh_equip_aggregates(ARRAY(
+                SELECT DISTINCT ed.ppe_id::integer
+                FROM equip_data ed
+                JOIN new_rows n ON n.id = ed.equip_id
+                WHERE ed.ppe_id IS NOT NULL));
+            RETURN NULL;
+        END
+        $$
+        """,
+        "DROP TRIGGER IF EXISTS dat_equip_agg_upd ON dat_equip",
+        """
+        CREATE TRIGGER dat_equip_agg_upd AFTER UPDATE ON dat_equip
+        REFERENCING NEW TABLE AS new_rows
+        FOR EACH STATEMENT EXECUTE PROCEDURE dat_equip_refresh_aggregates()
+        """,
+        # Перенос ППЭ в другую организацию
+        """
+        CREATE OR REPLACE FUNCTION dat_ppe_refresh_aggregates()
+        RETURNS trigger LANGUAGE plpgsql AS $$
+        BEGIN
+            -- Пересчитываются только организации, у которых сменился состав ППЭ
+            DELETE FROM equip_agg_school WHERE school_id IN (
+                SELECT o.school_id FROM old_rows o JOIN new_rows n ON n.id = o.id
+                WHERE o.school_id IS DISTINCT FROM n.school_id);
+            PERFORM refresh_equip_aggregates(ARRAY(
+                SELECT p.id::integer FROM dat_ppe p
+                WHERE p.school_id IN (
+                    SELECT o.school_id FROM old_rows o JOIN new_rows n ON n.id = o.id
+                    WHERE o.school_id IS DISTINCT FROM n.school_id
+                    UNION
+                    SELECT n.school_id FROM old_rows o JOIN new_rows n ON n.id = o.id
+                    WHERE o.school_id IS DISTINCT FROM n.school_id)));
+            RETURN NULL;
+        END
+        $$
+        """,
+        "DROP TRIGGER IF EXISTS dat_ppe_agg_upd ON dat_ppe",
+        """
+        CREATE TRIGGER dat_ppe_agg_upd AFTER UPDATE ON dat_ppe
+        REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+        FOR EACH STATEMENT EXECUTE PROCEDURE dat_ppe_refresh_aggregates()
+        """,
+        "ANALYZE equip_agg_ppe",
+        "ANALYZE equip_agg_school",
+    ]),
+    (4, "Уведомления об изменениях ППЭ, оборудования и договоров (LISTEN/NOTIFY)", [
+        # Одно уведомление на команду с ключами изменённых строк (TG_ARGV[0] — столбец ключа).
+        # Полезная нагрузка NOTIFY ограничена 8000 байт, поэтому при большом
+        # числе строк ключи не передаются и клиент перечитывает данные целиком.
+        """
+        CREATE OR REPLACE FUNCTION notify_ppe_changes()
+        RETURNS trigger LANGUAGE plpgsql AS $$
+        DECLARE
+            ids integer[];
+        BEGIN
+            IF TG_OP = 'UPDATE' THEN
+                EXECUTE format(
+                    'SELECT array_agg(DISTINCT k) FROM ('
+                    ' SELECT %1$I::integer AS k FROM changed_rows'
+                    ' UNION SELECT %1$I::integer FROM old_rows) s WHERE k IS NOT NULL',
+                    TG_ARGV[0]) INTO ids;
+            ELSE
+                EXECUTE format(
+                    'SELECT array_agg(DISTINCT %1$I::integer) FROM changed_rows WHERE %1$I IS NOT NULL',
+                    TG_ARGV[0]) INTO ids;
+            END IF;
+            IF ids IS NOT NULL THEN
+                PERFORM pg_notify('ppe_changes', json_build_object(
+                    'table', TG_TABLE_NAME,
+                    'op', TG_OP,
+                    'ids', CASE WHEN cardinality(ids) <= 500 THEN ids END)::text);
+            END IF;
+            RETURN NULL;
+        END
+        $$
+        """,
+        *_notify_triggers("dat_ppe", "id"),
+        *_notify_triggers("equip_data", "ppe_id"),
+        *_notify_triggers("dat_contract", "id"),
+        *_notify_triggers("dat_equip", "id"),
+    ]),
+    (5, "Отслеживание изменений ППЭ: версия строки и журнал удалений", [
+        # Версия строки — номер транзакции, изменившей её (txid_current, без переполнения).
+        # Клиент запоминает xmin снимка и в следующий раз запрашивает row_version >= него.
+        """
+        CREATE OR REPLACE FUNCTION set_row_version()
+        RETURNS trigger LANGUAGE plpgsql AS $$
+        BEGIN
+            NEW.row_version := txid_current();
+            RETURN NEW;
+        END
+        $$
+        """,
+        *[statement
+          for table in ("dat_ppe", "dat_ppe_details", "dat_responsible")
+          for statement in (
+              f"ALTER TABLE {table} ADD COLUMN IF NOT EXISTS row_version bigint NOT NULL DEFAULT 0",
+              f"CREATE INDEX IF NOT EXISTS {table}_row_version_idx ON {table} (row_version)",
+              f"DROP TRIGGER IF EXISTS {table}_row_version ON {table}",
+              f"""
+              CREATE TRIGGER {table}_row_version BEFORE INSERT OR UPDATE ON {table}
+              FOR EACH ROW EXECUTE PROCEDURE set_row_version()
+              """,
+          )],
+        """
+        CREATE TABLE IF NOT EXISTS dat_ppe_deleted (
+            id          integer PRIMARY KEY,
+            row_version bigint NOT NULL,
+            deleted_at  timestamptz NOT NULL DEFAULT now()
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS dat_ppe_deleted_row_version_idx ON dat_ppe_deleted (row_version)",
+        """
+        CREATE OR REPLACE FUNCTION dat_ppe_track_delete()
+        RETURNS trigger LANGUAGE plpgsql AS $$
+        BEGIN
+            INSERT INTO dat_ppe_deleted (id, row_version)
+            SELECT id, txid_current() FROM old_rows
+            ON CONFLICT (id) DO UPDATE
+            SET row_version = EXCLUDED.row_version, deleted_at = now();
+            RETURN NULL;
+        END
+        $$
+        """,
+        "DROP TRIGGER IF EXISTS dat_ppe_track_delete ON dat_ppe",
+        """
+        CREATE TRIGGER dat_ppe_track_delete AFTER DELETE ON dat_ppe
+        REFERENCING OLD TABLE AS old_rows
+        FOR EACH STATEMENT EXECUTE PROCEDURE dat_ppe_track_delete()
+        """,
+    ]),
+    (6, "Индексы для постраничной выборки по ключу", [
+        # get_ppe_page: ORDER BY ppe_number, id с фильтром по gia_type и без него
+        "CREATE INDEX IF NOT EXISTS dat_ppe_ppe_number_id_idx ON dat_ppe (ppe_number, id)",
+        "CREATE INDEX IF NOT EXISTS dat_ppe_gia_type_ppe_number_id_idx ON dat_ppe (gia_type, ppe_number, id)",
+        # get_equipment_page: WHERE ppe_id = ... AND id > ... ORDER BY id
+        "CREATE INDEX IF NOT EXISTS equip_data_ppe_id_id_idx ON equip_data (ppe_id, id)",
+        "ANALYZE dat_ppe",
+        "ANALYZE equip_data",
+    ]),
+    (7, "Уникальный номер ППЭ в dat_ppe_details для повторяемой загрузки (db.py)", [
+        # Прежний db.py при каждом запуске добавлял номера заново. Из дубликатов остаётся
+        # строка с заполненными реквизитами организации, при равенстве — добавленная первой
+        """
+        DELETE FROM dat_ppe_details d
+        USING (
+            SELECT ctid, row_number() OVER (
+                PARTITION BY ppe_number
+                ORDER BY school_id IS NULL, fullname IS NULL, ctid
+            ) AS n
+            FROM dat_ppe_details
+            WHERE ppe_number IS NOT NULL
+        ) dup
+        WHERE d.ctid = dup.ctid AND dup.n > 1
+        """,
+        """
+        CREATE UNIQUE INDEX IF NOT EXISTS dat_ppe_details_ppe_number_key
+        ON dat_ppe_details (ppe_number)
+        """,
+    ]),
+    (8, "Индексы сопоставления при импорте из 1С (import_1c.py)", [
+        # Импорт сопоставляет модели по "name_in_1C" (при повторах — с меньшим id);
+        # повторяющиеся модели объединяются в неё же, чтобы имя стало уникальным
+        """
+        UPDATE equip_data ed
+        SET equip_id = d.keep_id
+        FROM (
+            SELECT id::INTEGER AS dup_id,
+                   min(id::INTEGER) OVER (PARTITION BY "name_in_1C") AS keep_id
+            FROM dat_equip
+            WHERE "name_in_1C" IS NOT NULL
+        ) d
+        WHERE ed.equip_id = d.dup_id AND d.dup_id <> d.keep_id
+        """,
+        """
+        DELETE FROM dat_equip de
+        USING (
+            SELECT "name_in_1C", min(id::INTEGER) AS keep_id
+            FROM dat_equip
+            WHERE "name_in_1C" IS NOT NULL
+            GROUP BY "name_in_1C"
+            HAVING count(*) > 1
+        ) k
+        WHERE de."name_in_1C" = k."name_in_1C" AND de.id::INTEGER <> k.keep_id
+        """,
+        "DROP INDEX IF EXISTS dat_equip_name_in_1c_idx",
+        'CREATE UNIQUE INDEX IF NOT EXISTS dat_equip_name_in_1c_key ON dat_equip ("name_in_1C")',
+        # Импорт добавляет модели без id: если у столбца нет значения по умолчанию,
+        # оно берётся из последовательности, продолжающей существующие номера
+        """
+        DO $$
+        BEGIN
+            IF NOT EXISTS (
+                SELECT 1 FROM pg_attribute
+                WHERE attrelid = 'dat_equip'::regclass AND attname = 'id'
+                AND (atthasdef OR attidentity <> '')
+            ) THEN
+                CREATE SEQUENCE IF NOT EXISTS dat_equip_id_seq;
+                PERFORM setval('dat_equip_id_seq',
+                               COALESCE((SELECT max(id::bigint) FROM dat_equip), 0) + 1, false);
+                ALTER TABLE dat_equip ALTER COLUMN id SET DEFAULT nextval('dat_equip_id_seq');
+                ALTER SEQUENCE dat_equip_id_seq OWNED BY dat_equip.id;
+            END IF;
+        END
+        $$
+        """,
+        "CREATE INDEX IF NOT EXISTS equip_data_inv_number_idx ON equip_data (inv_number)",
+    ]),
+    (9, "Секционирование equip_data и dat_contract по году экзаменов", [
+        # Секции года создаются функцией (см. команду partition). Секции по умолчанию
+        # нет: строка года без секции отклоняется, а не смешивается с другими годами.
+        # Секции новой кампании администратор создаёт до её начала командой
+        # python migrations.py partition --year N; у приложения прав на DDL нет
+        """
+        CREATE OR REPLACE FUNCTION create_exam_year_partitions(p_year integer)
+        RETURNS void LANGUAGE plpgsql AS $$
+        DECLARE
+            t text;
+        BEGIN
+            FOREACH t IN ARRAY ARRAY['equip_data', 'dat_contract'] LOOP
+                IF to_regclass(t || '_y' || p_year) IS NULL THEN
+                    EXECUTE format(
+                        'CREATE TABLE IF NOT EXISTS %I PARTITION OF %I FOR VALUES IN (%s)',
+                        t || '_y' || p_year, t, p_year);
+                END IF;
+            END LOOP;
+        END
+        $$
+        """,
+        *_CAPTURE_FOREIGN_KEYS,
+        *_partition_by_exam_year("dat_contract"),
+        *_partition_by_exam_year("equip_data"),
+        # Год договора берётся из его даты, оборудование попадает в год своего договора.
+        # Секции создаются для всех найденных лет, прежнего и следующего года кампании
+        f"""
+        DO $$
+        DECLARE
+            y integer;
+        BEGIN
+            FOR y IN
+                SELECT DISTINCT {_CONTRACT_EXAM_YEAR} FROM dat_contract_unpartitioned
+                UNION SELECT {LEGACY_EXAM_YEAR}
+                UNION SELECT {LEGACY_EXAM_YEAR + 1}
+            LOOP
+                PERFORM create_exam_year_partitions(y);
+            END LOOP;
+        END
+        $$
+        """,
+        f"INSERT INTO dat_contract SELECT *, {_CONTRACT_EXAM_YEAR} FROM dat_contract_unpartitioned",
+        f"""
+        INSERT INTO equip_data
+        SELECT e.*, COALESCE(c.exam_year, {LEGACY_EXAM_YEAR})
+        FROM equip_data_unpartitioned e
+        LEFT JOIN dat_contract c ON c.id = e.contract_id
+        """,
+
+        # Индексы миграций 1, 2, 6 и 8; номер договора уникален в пределах года
+        """
+        CREATE UNIQUE INDEX dat_contract_contract_number_key
+        ON dat_contract (exam_year, contract_number)
+        """,
+        "CREATE INDEX equip_data_ppe_id_idx ON equip_data (ppe_id)",
+        "CREATE INDEX equip_data_contract_id_idx ON equip_data (contract_id)",
+        """
+        CREATE INDEX equip_data_ppe_id_no_agreement_idx
+        ON equip_data (ppe_id)
+        WHERE agreement IS NULL OR agreement = ''
+        """,
+        "CREATE INDEX equip_data_ppe_id_id_idx ON equip_data (ppe_id, id)",
+        "CREATE INDEX equip_data_inv_number_idx ON equip_data (inv_number)",
+        _RESTORE_FOREIGN_KEYS,
+
+        # Агрегаты для договоров считаются по годам
+        "TRUNCATE equip_agg_ppe, equip_agg_school",
+        "ALTER TABLE equip_agg_ppe ADD COLUMN exam_year smallint NOT NULL",
+        "ALTER TABLE equip_agg_school ADD COLUMN exam_year smallint NOT NULL",
+        "DROP INDEX IF EXISTS equip_agg_ppe_ppe_id_idx",
+        "DROP INDEX IF EXISTS equip_agg_school_school_id_idx",
+        "CREATE INDEX equip_agg_ppe_ppe_id_idx ON equip_agg_ppe (exam_year, ppe_id)",
+        "CREATE INDEX equip_agg_school_school_id_idx ON equip_agg_school (exam_year, school_id)",
+        """
+        CREATE OR REPLACE FUNCTION refresh_equip_aggregates(p_ppe_ids integer[])
+        RETURNS void LANGUAGE plpgsql AS $$
+        BEGIN
+            IF p_ppe_ids IS NULL OR cardinality(p_ppe_ids) = 0 THEN
+                RETURN;
+            END IF;
+
+            DELETE FROM equip_agg_ppe WHERE ppe_id = ANY (p_ppe_ids);
+            INSERT INTO equip_agg_ppe (ppe_id, equip_name, equip_price, equip_count, inv_numbers, exam_year)
+            SELECT equip_data.ppe_id, "name_in_1C", equip_price, COUNT(*),
+                   string_agg(DISTINCT inv_number::text, E'\\n '), equip_data.exam_year
+            FROM equip_data
+            JOIN "dat_equip" ON "dat_equip"."id" = equip_data.equip_id
+            WHERE equip_data.ppe_id = ANY (p_ppe_ids)
+            GROUP BY equip_data.exam_year, equip_data.ppe_id, "name_in_1C", equip_price;
+
+            DELETE FROM equip_agg_school
+            WHERE school_id IN (SELECT school_id FROM dat_ppe WHERE id = ANY (p_ppe_ids));
+            INSERT INTO equip_agg_school (school_id, equip_name, equip_price, equip_count, inv_numbers, exam_year)
+            SELECT dat_ppe.school_id, "name_in_1C", equip_price, COUNT(*),
+                   string_agg(DISTINCT inv_number::text, E'\\n '), equip_data.exam_year
+            FROM equip_data
+            JOIN "dat_equip" ON "dat_equip"."id" = equip_data.equip_id
+            JOIN dat_ppe ON dat_ppe.id = equip_data.ppe_id
+            WHERE dat_ppe.school_id IN (SELECT school_id FROM dat_ppe WHERE id = ANY (p_ppe_ids))
+            AND (agreement IS NULL OR agreement = '')
+            GROUP BY equip_data.exam_year, dat_ppe.school_id, "name_in_1C", equip_price;
+        END
+        $$
+        """,
+        "SELECT refresh_equip_aggregates(ARRAY(SELECT DISTINCT ppe_id::integer FROM equip_data WHERE ppe_id IS NOT NULL))",
+
+        # Триггеры удалённых таблиц (миграции 3 и 4)
+        *_equip_agg_triggers(),
+        *_notify_triggers("equip_data", "ppe_id"),
+        *_notify_triggers("dat_contract", "id"),
+        "ANALYZE equip_data",
+        "ANALYZE dat_contract",
+        "ANALYZE equip_agg_ppe",
+        "ANALYZE equip_agg_school",
+    ]),
+    (10, "Журнал удалений оборудования и договоров для синхронизации локальной реплики", [
+        # Реплика получает удалённые ключи из журнала, а не сравнением всех ключей таблицы
+        *_delete_log("dat_equip"),
+        *_delete_log("equip_data"),
+        *_delete_log("dat_contract"),
+    ]),
+    (11, "Срок хранения журналов удалений", [
+        # prune_delete_logs удаляет старые записи журналов и запоминает в delete_log_horizon
+        # последнюю удалённую версию: клиент, синхронизированный раньше неё, читает таблицу целиком
+        """
+        CREATE TABLE IF NOT EXISTS delete_log_horizon (
+            table_name  text PRIMARY KEY,
+            row_version bigint NOT NULL
+        )
+        """,
+        *[f"CREATE INDEX IF NOT EXISTS {table}_deleted_deleted_at_idx ON {table}_deleted (deleted_at)"
+          for table in DELETE_LOG_TABLES],
+        f"""
+        CREATE OR REPLACE FUNCTION prune_delete_logs(p_keep interval)
+        RETURNS bigint LANGUAGE plpgsql AS $$
+        DECLARE
+            t text;
+            pruned bigint;
+            horizon bigint;
+            total bigint := 0;
+        BEGIN
+            FOREACH t IN ARRAY ARRAY[{", ".join(f"'{table}'" for table in DELETE_LOG_TABLES)}] LOOP
+                EXECUTE format(
+                    'WITH d AS (DELETE FROM %I WHERE deleted_at < now() - $1 RETURNING row_version) '
+                    'SELECT count(*), max(row_version) FROM d', t || '_deleted')
+                INTO pruned, horizon USING p_keep;
+                IF horizon IS NOT NULL THEN
+                    INSERT INTO delete_log_horizon (table_name, row_version) VALUES (t, horizon)
+                    ON CONFLICT (table_name) DO UPDATE
+                    SET row_version = GREATEST(delete_log_horizon.row_version, EXCLUDED.row_version);
+                END IF;
+                total := total + pruned;
+            END LOOP;
+            RETURN total;
+        END
+        $$
+        """,
+    ]),
+    (12, "Уведомления об изменениях реквизитов организаций и ответственных (LISTEN/NOTIFY)", [
+        # Ключ уведомления — school_id: клиент обновляет карточки ППЭ этой организации
+        *_notify_triggers("dat_ppe_details", "school_id"),
+        *_notify_triggers("dat_responsible", "school_id"),
+    ]),
+]
+
+# Модули, запросы которых проверяются командой verify
+VERIFY_MODULES = ["database.py", "contracts.py", "repository.py", "modern_ui.py"]
+
+_PLACEHOLDER_RE = re.compile(r'%\((\w+)\)s|%s')
+_TEMPLATE_FIELD_RE = re.compile(r'\{\w+\}')
+_COLUMN_BEFORE_RE = re.compile(r'(?:\w+\.)?"?(\w+)"?\s*(?:=|<>|!=|>=|<=|>|<)\s*$')
+
+_CREATE_VERSIONS_TABLE = """
+    CREATE TABLE IF NOT EXISTS schema_migrations (
+        version     integer PRIMARY KEY,
+        description text NOT NULL,
+        applied_at  timestamptz NOT NULL DEFAULT now()
+    )
+"""
+
+
+def get_applied_versions():
+    """Возвращает множество уже применённых версий."""
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(_CREATE_VERSIONS_TABLE)
+        cursor.execute("SELECT version FROM schema_migrations")
+        versions = {row[0] for row in cursor.fetchall()}
+        conn.commit()
+        return versions
+
+def apply_migrations(target=None):
+    """
+    Применяет непримененные миграции по порядку, каждую в своей транзакции.
+
+    Returns:
+        list: Номера применённых версий
+    """
+    applied = get_applied_versions()
+    done = []
+    for version, description, statements in MIGRATIONS:
+        if version in applied or (target is not None and version > target):
+            continue
+        with get_connection() as conn:
+            try:
+                cursor = conn.cursor()
+                for statement in statements:
+                    cursor.execute(statement)
+                cursor.execute(
+                    "INSERT INTO schema_migrations (version, description) VALUES (%s, %s)",
+                    (version, description)
+                )
+                conn.commit()
+            except database_error() as e:
+                conn.rollback()
+                logger.error(f"Ошибка применения миграции {version}: {e}")
+                raise
+        logger.info(f"Применена миграция {version}: {description}")
+        done.append(version)
+    return done
+
+def create_year_partitions(year):
+    """Создаёт секции equip_data и dat_contract для года кампании (после миграции 9)."""
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT create_exam_year_partitions(%s)", (year,))
+        conn.commit()
+    logger.info(f"Созданы секции {', '.join(EXAM_YEAR_TABLES)} за {year} год")
+
+def drop_unpartitioned_tables(force=False):
+    """
+    Удаляет таблицы, оставшиеся после секционирования (миграция 9), если все их
+    строки есть в секционированных таблицах или записаны в журнал удалений.
+
+    Args:
+        force (bool): Удалить, даже если часть строк не найдена
+
+    Returns:
+        dict: Число ненайденных строк по таблицам; таблицы с ненулевым числом
+              без force не удаляются
+    """
+    missing = {}
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        try:
+            for table in EXAM_YEAR_TABLES:
+                cursor.execute(
+                    "SELECT to_regclass(%s) IS NOT NULL, to_regclass(%s) IS NOT NULL",
+                    (f"{table}_unpartitioned", f"{table}_deleted")
+                )
+                exists, has_log = cursor.fetchone()
+                if not exists:
+                    continue
+                deleted = (f" AND NOT EXISTS (SELECT 1 FROM {table}_deleted d WHERE d.id = o.id)"
+                           if has_log else "")
+                cursor.execute(
+                    f"SELECT count(*) FROM {table}_unpartitioned o "
+                    f"WHERE NOT EXISTS (SELECT 1 FROM {table} n WHERE n.id = o.id){deleted}"
+                )
+                missing[table] = cursor.fetchone()[0]
+                if missing[table] and not force:
+                    logger.warning(f"{table}_unpartitioned не удалена: строк без переноса {missing[table]}")
+                    continue
+                cursor.execute(f"DROP TABLE {table}_unpartitioned")
+                logger.info(f"Удалена таблица {table}_unpartitioned")
+            conn.commit()
+        except database_error():
+            conn.rollback()
+            raise
+    return missing
+
+def prune_delete_logs(days=DELETE_LOG_RETENTION_DAYS):
+    """
+    Удаляет записи журналов удалений старше days дней (после миграции 11).
+    Клиенты, не синхронизировавшиеся дольше, при следующей синхронизации
+    перечитывают таблицы целиком.
+
+    Returns:
+        int: Число удалённых записей
+    """
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT prune_delete_logs(make_interval(days => %s))", (days,))
+        pruned = cursor.fetchone()[0]
+        conn.commit()
+    logger.info(f"Из журналов удалений удалено записей старше {days} дн.: {pruned}")
+    return pruned
+
+def collect_queries(paths=VERIFY_MODULES):
+    """
+    Извлекает SQL-запросы из строковых констант модулей.
+
+    Returns:
+        list: Кортежи (файл, строка, текст запроса)
+    """
+    base_dir = os.path.dirname(os.path.abspath(__file__))
+    queries = []
+    for path in paths:
+        with open(os.path.join(base_dir, path), encoding="utf-8") as f:
+            tree = ast.parse(f.read(), filename=path)
+        for node in ast.walk(tree):
+            if not (isinstance(node, ast.Constant) and isinstance(node.value, str)):
+                continue
+            text = node.value.strip()
+            normalized = " ".join(text.upper().split())
+            if not normalized.startswith(("SELECT ", "WITH ", "UPDATE ", "DELETE ")):
+                continue
+            # Вставки и execute_values (VALUES %s) не проверяются
+            if "INSERT " in normalized or "VALUES %S" in normalized:
+                continue
+            # В шаблонах запросов ({where}) подставляется условие без ограничений
+            text = _TEMPLATE_FIELD_RE.sub("TRUE", text)
+            queries.append((path, node.lineno, text.rstrip(";")))
+    return queries
+
+def _load_samples(cursor):
+    """Подбирает реальные значения параметров для EXPLAIN ANALYZE."""
+    samples = {"agreement": "", "limit": 201, "exam_year": EXAM_YEAR}
+    cursor.execute("""
+        SELECT p.id, p.ppe_number, p.school_id, p.gia_type
+        FROM dat_ppe p
+        JOIN equip_data ed ON ed.ppe_id = p.id
+        LIMIT 1
+    """)
+    row = cursor.fetchone()
+    if row:
+        samples.update(id=row[0], ppe_id=row[0], ppe_number=row[1], school_id=row[2], gia_type=row[3])
+    cursor.execute("SELECT id, contract_number FROM dat_contract LIMIT 1")
+    row = cursor.fetchone()
+    if row:
+        samples.update(contract_id=row[0], contract_number=row[1])
+    return samples
+
+def _bind_params(query, samples):
+    """
+    Подставляет значения параметров по имени столбца, с которым сравнивается
+    плейсхолдер; по умолчанию используется id ППЭ.
+    """
+    default = samples.get("ppe_id")
+    named = {}
+    positional = []
+    for match in _PLACEHOLDER_RE.finditer(query):
+        if match.group(1):
+            name = match.group(1)
+            named[name] = samples.get(name, default)
+        else:
+            column = _COLUMN_BEFORE_RE.search(query[:match.start()])
+            positional.append(samples.get(column.group(1).lower(), default) if column else default)
+    return named if named else tuple(positional)
+
+def _seq_scans(plan):
+    """Возвращает таблицы, читаемые последовательным сканированием."""
+    found = []
+    if plan.get("Node Type") == "Seq Scan":
+        found.append(plan.get("Relation Name"))
+    for child in plan.get("Plans", []):
+        found.extend(_seq_scans(child))
+    return found
+
+def verify_query_plans(allow_seqscan=False):
+    """
+    Выполняет EXPLAIN (ANALYZE) для каждого запроса модулей из VERIFY_MODULES
+    и отмечает планы с последовательным сканированием.
+
+    По умолчанию enable_seqscan отключается: на таблицах в несколько тысяч
+    строк планировщик и так предпочтёт полный просмотр, а проверить нужно,
+    что для запроса существует индексный путь. Каждый запрос выполняется
+    в транзакции, которая откатывается.
+
+    Returns:
+        list: Кортежи (файл, строка, таблицы с Seq Scan, есть ли WHERE)
+    """
+    flagged = []
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        samples = _load_samples(cursor)
+        conn.rollback()
+        for path, lineno, query in collect_queries():
+            try:
+                if not allow_seqscan:
+                    cursor.execute("SET LOCAL enable_seqscan = off")
+                cursor.execute("EXPLAIN (ANALYZE, FORMAT JSON) " + query, _bind_params(query, samples))
+                plan = cursor.fetchone()[0]
+                if isinstance(plan, str):
+                    plan = json.loads(plan)
+                scans = _seq_scans(plan[0]["Plan"])
+                if scans:
+                    has_where = " WHERE " in " ".join(query.upper().split())
+                    flagged.append((path, lineno, scans, has_where))
+                    logger.warning(f"Seq Scan в {path}:{lineno}: {scans}")
+            except database_error() as e:
+                logger.error(f"Не удалось получить план {path}:{lineno}: {e}")
+                flagged.append((path, lineno, [f"ошибка: {e.pgerror or e}".strip()], True))
+            finally:
+                conn.rollback()
+    return flagged
+
+def main():
+    parser = argparse.ArgumentParser(description="Миграции схемы базы данных")
+    parser.add_argument("command", choices=["migrate", "status", "verify", "partition", "prune-deleted",
+                                            "drop-unpartitioned"])
+    parser.add_argument("--allow-seqscan", action="store_true",
+                        help="Не отключать enable_seqscan при проверке планов")
+    parser.add_argument("--target", type=int, default=None, help="Применить миграции до указанной версии")
+    parser.add_argument("--year", type=int, default=EXAM_YEAR, help="Год кампании для команды partition")
+    parser.add_argument("--force", action="store_true",
+                        help="drop-unpartitioned: удалить прежние таблицы без полной проверки переноса")
+    parser.add_argument("--days", type=int, default=DELETE_LOG_RETENTION_DAYS,
+                        help="Срок хранения журналов удалений для команды prune-deleted, дн.")
+    args = parser.parse_args()
+
+    # Миграции выполняются на схеме, которую приложение ещё не принимает
+    database.CHECK_SCHEMA_VERSION = False
+    try:
+        if args.command == "migrate":
+            done = apply_migrations(args.target)
+            print(f"Применено миграций: {len(done)} {done if done else ''}")
+        elif args.command == "partition":
+            create_year_partitions(args.year)
+            print(f"Секции за {args.year} год созданы")
+        elif args.command == "drop-unpartitioned":
+            missing = drop_unpartitioned_tables(args.force)
+            for table, count in missing.items():
+                state = "удалена" if not count or args.force else "оставлена"
+                print(f"{table}_unpartitioned: строк без переноса {count}, {state}")
+            if not missing:
+                print("Прежних таблиц нет")
+            if any(missing.values()) and not args.force:
+                raise SystemExit(1)
+        elif args.command == "prune-deleted":
+            pruned = prune_delete_logs(args.days)
+            print(f"Удалено записей журналов удалений: {pruned}")
+        elif args.command == "verify":
+            total = len(collect_queries())
+            flagged = verify_query_plans(args.allow_seqscan)
+            for path, lineno, scans, has_where in flagged:
+                note = "" if has_where else " (запрос без WHERE, полный просмотр ожидаем)"
+                print(f"SEQ SCAN  {path}:{lineno}  {', '.join(map(str, scans))}{note}")
+            print(f"Проверено запросов: {total}, с последовательным сканированием: {len(flagged)}")
+            if any(has_where for _, _, _, has_where in flagged):
+                raise SystemExit(1)
+        else:
+            applied = get_applied_versions()
+            for version, description, _ in MIGRATIONS:
+                mark = "x" if version in applied else " "
+                print(f"[{mark}] {version:>3}  {description}")
+    finally:
+        close_pool()
+
+if __name__ == "__main__":
+    main()
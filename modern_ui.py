@@ -10,7 +10,15 @@ from tkinter import ttk, filedialog, messagebox
 import ttkthemes
 from PIL import Image, ImageTk
 import os
-from database import connect_to_database, get_ppe_list, show_equipment, show_contracts
+import queue
+import threading
+from database import get_pool, show_equipment, show_contracts, start_local_replica, get_replica
+from database import start_change_listener, get_ppe_row, get_ppe_changes_since
+from database import get_ppe_page, get_equipment_page, get_contracts_page, count_ppe
+from database import get_ppe_bundle, query_scope, cancel_queries, is_cancelled_error, TIMEOUT_CONFIG
+from database import PREFETCH_CONFIG, start_reference_index, get_ppe_info, get_exam_year
+from database import SchemaVersionError
+from prefetch import BundlePrefetcher
 from contracts import generate_contract, get_contract_data_from_db
 from tkinter import messagebox, filedialog
 from tkinter import ttk
@@ -30,10 +38,20 @@ class ModernPPEApp:
     def __init__(self, root):
         self.root = root
         self._initialize_window()
-        self.connection = connect_to_database()
+        # С синхронизированной локальной репликой окно открывается без ожидания сервера:
+        # пул соединений создаётся фоновой синхронизацией или при первой записи
+        self.replica = start_local_replica()
+        start_reference_index()
+        self.connection = get_pool() if get_replica() is None else None
         self._initialize_variables()
         self._create_ui()
 
+        # Изменения с других рабочих мест приходят через LISTEN/NOTIFY в фоновом потоке;
+        # виджеты Tk обновляются только из главного потока, поэтому события идут через очередь
+        self._change_queue = queue.Queue()
+        start_change_listener(self._change_queue.put)
+        self._process_changes()
+
     """Настройка параметров главного окна приложения."""        
     def _initialize_window(self):
         self.root.title("Система управления ППЭ")
@@ -66,20 +84,41 @@ class ModernPPEApp:
         self.main_paned.add(self.content_frame, weight=3)
         
         # Создаем компоненты интерфейса
+        self._create_menu()
         self._create_sidebar()
         self._create_content_area()
 
     def _initialize_variables(self):
-        self.pdf_directory = "Z:\\_ГИА_2025\\Планы БТИ\\Планы"
+        self.pdf_directory = f"Z:\\_ГИА_{get_exam_year()}\\Планы БТИ\\Планы"
         self.pdf_document = None
         self.current_pdf_path = ""
         self.current_ppe = None
+        self._ppe_token = None  # токен get_ppe_changes_since для кнопки "Обновить"
+        self._pagers = {}       # Treeview -> состояние постраничной догрузки
+        self._select_group = None  # группа запросов (query_scope) загрузки выбранного ППЭ
+        self._select_seq = 0
+        self._bundle_queue = queue.Queue()  # результаты фоновой загрузки карточек
+        self._bundle_polling = False
+        self.prefetcher = None
+        if PREFETCH_CONFIG['enabled']:
+            self.prefetcher = BundlePrefetcher(
+                get_ppe_bundle, depth=PREFETCH_CONFIG['depth'], ttl=PREFETCH_CONFIG['ttl'])
+            self.prefetcher.start()
         self.search_var = tk.StringVar()
         self.search_var.trace("w", self._filter_ppe_list)
         
         # Добавляем переменную для фильтра по типу ГИА
         self.gia_filter = tk.IntVar(value=0)  # 0 - все, 1 - ЕГЭ, 3 - ОГЭ, 2 - ГВЭ (в разработке)
 
+    """Создание главного меню."""
+    def _create_menu(self):
+        menubar = tk.Menu(self.root)
+        file_menu = tk.Menu(menubar, tearoff=0)
+        file_menu.add_command(label="Экспорт данных...", command=self._export_data)
+        file_menu.add_command(label="Пакетная генерация договоров...", command=self._generate_contracts_batch)
+        menubar.add_cascade(label="Файл", menu=file_menu)
+        self.root.config(menu=menubar)
+
     """Создание боковой панели с поиском и списком ППЭ."""
     def _create_sidebar(self):
         # Заголовок
@@ -95,7 +134,7 @@ class ModernPPEApp:
             text="Все ППЭ", 
             variable=self.gia_filter, 
             value=0,
-            command=self._refresh_ppe_list
+            command=self._reload_ppe_list
         ).pack(anchor="w", padx=10, pady=2)
         
         ttk.Radiobutton(
@@ -103,7 +142,7 @@ class ModernPPEApp:
             text="Только ЕГЭ", 
             variable=self.gia_filter, 
             value=1,
-            command=self._refresh_ppe_list
+            command=self._reload_ppe_list
         ).pack(anchor="w", padx=10, pady=2)
         
         ttk.Radiobutton(
@@ -111,7 +150,7 @@ class ModernPPEApp:
             text="Только ОГЭ", 
             variable=self.gia_filter, 
             value=3,
-            command=self._refresh_ppe_list
+            command=self._reload_ppe_list
         ).pack(anchor="w", padx=10, pady=2)
         
         # Поле поиска
@@ -151,12 +190,12 @@ class ModernPPEApp:
         self.ppe_list.column("ppe_address", width=250, anchor="w")
         
         # Добавляем скроллбары
-        y_scrollbar = ttk.Scrollbar(list_frame, orient="vertical", command=self.ppe_list.yview)
-        self.ppe_list.configure(yscrollcommand=y_scrollbar.set)
+        self.ppe_scrollbar = ttk.Scrollbar(list_frame, orient="vertical", command=self.ppe_list.yview)
+        self.ppe_list.configure(yscrollcommand=self.ppe_scrollbar.set)
         
         # Размещаем элементы
         self.ppe_list.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
-        y_scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.ppe_scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
         
         # Привязываем обработчик выбора
         self.ppe_list.bind("<<TreeviewSelect>>", self._on_ppe_select)
@@ -171,40 +210,25 @@ class ModernPPEApp:
             self.ppe_list.delete(item)
             
         try:
-            # Получаем выбранный фильтр
-            gia_filter = self.gia_filter.get()
-            
-            if gia_filter == 0:  # Все ППЭ
-                # Используем стандартную функцию получения всех ППЭ
-                rows = get_ppe_list()
-            else:
-                # Запрос с фильтрацией по типу ГИА
-                query = """
-                    SELECT id, ppe_address_fact 
-                    FROM dat_ppe 
-                    WHERE gia_type = %s
-                    ORDER BY id
-                """
-                from database import execute_query
-                rows = execute_query(query, (gia_filter,))
-            
-            for row in rows:
-                self.ppe_list.insert("", tk.END, values=row)
-                
-            # Обновляем заголовок с количеством ППЭ
-            gia_type_text = "Все ППЭ"
-            if int(gia_filter) == 1:
-                gia_type_text = "ППЭ ЕГЭ"
-            elif int(gia_filter) == 3:
-                gia_type_text = "ППЭ ОГЭ"
-                
-            count = len(rows)
-            ttk.Label(self.sidebar, text=f"{gia_type_text}: {count}", 
-                    style="Subheader.TLabel").pack(pady=5, padx=10, before=self.ppe_list.master)
-                
+            # Все ППЭ (0) или фильтрация по типу ГИА; строки догружаются страницами при прокрутке
+            self._load_ppe_pages(self.gia_filter.get())
+            self._show_ppe_count()
         except Exception as e:
             messagebox.showerror("Ошибка", f"Не удалось загрузить список ППЭ: {str(e)}")
 
+    def _show_ppe_count(self):
+        # Обновляем заголовок с количеством ППЭ
+        gia_filter = self.gia_filter.get()
+        gia_type_text = "Все ППЭ"
+        if int(gia_filter) == 1:
+            gia_type_text = "ППЭ ЕГЭ"
+        elif int(gia_filter) == 3:
+            gia_type_text = "ППЭ ОГЭ"
+            
+        count = count_ppe(gia_filter or None)
+        ttk.Label(self.sidebar, text=f"{gia_type_text}: {count}", 
+                style="Subheader.TLabel").pack(pady=5, padx=10, before=self.ppe_list.master)
+
     """Фильтрация списка ППЭ по поисковому запросу с учетом типа ГИА."""
     def _filter_ppe_list(self, *args):
         search_term = self.search_var.get().lower()
@@ -213,48 +237,197 @@ class ModernPPEApp:
         # Очищаем текущий список
         for item in self.ppe_list.get_children():
             self.ppe_list.delete(item)
-            
+
         try:
-            if gia_filter == 0:
-                # Базовый запрос без фильтра по типу ГИА
-                base_query = """
-                    SELECT id, ppe_address_fact 
-                    FROM dat_ppe 
-                    ORDER BY id
-                """
-                from database import execute_query
-                rows = execute_query(base_query)
-            else:
-                # Запрос с фильтром по типу ГИА
-                filtered_query = """
-                    SELECT id, ppe_address_fact 
-                    FROM dat_ppe 
-                    WHERE gia_type = %s
-                    ORDER BY id
-                """
-                from database import execute_query
-                rows = execute_query(filtered_query, (gia_filter,))
-            
-            # Применяем поисковый фильтр
-            for row in rows:
-                # Проверяем, содержит ли номер или адрес ППЭ поисковый запрос
-                if (search_term in str(row[0]).lower() or 
-                    search_term in str(row[1]).lower()):
-                    self.ppe_list.insert("", tk.END, values=row)
+            if not search_term:
+                self._load_ppe_pages(gia_filter)
+                return
+            # Результат поиска выводится целиком, без постраничной догрузки
+            self._detach_pager(self.ppe_list, self.ppe_scrollbar)
+
+
+            # Строки читаются пачками серверным курсором, без загрузки всей таблицы
+            from database import iter_ppe_list
+            for rows in iter_ppe_list(gia_filter):
+                # Применяем поисковый фильтр
+                for row in rows:
+                    # Проверяем, содержит ли номер или адрес ППЭ поисковый запрос
+                    if (search_term in str(row[0]).lower() or 
+                        search_term in str(row[1]).lower()):
+                        self.ppe_list.insert("", tk.END, values=row)
         except Exception as e:
             messagebox.showerror("Ошибка", f"Ошибка при фильтрации списка: {str(e)}")
     
-    """Обновление списка ППЭ с учетом текущего фильтра."""
-    def _refresh_ppe_list(self):
+    def _load_ppe_pages(self, gia_filter):
+        """Выводит первую страницу списка ППЭ; следующие догружаются при прокрутке."""
+        self._attach_pager(
+            self.ppe_list, self.ppe_scrollbar,
+            lambda key: get_ppe_page(key, gia_filter or None),
+            lambda row: self.ppe_list.insert("", tk.END, values=row[:2])
+        )
+
+    """Полная перезагрузка списка ППЭ при смене фильтра по типу ГИА."""
+    def _reload_ppe_list(self):
+        self._remove_count_label()
+        # Список мог быть прочитан из реплики — следующее обновление начнётся с полного снимка
+        self._ppe_token = None
+        # Сброс поиска перезагружает список (см. _filter_ppe_list)
+        self.search_var.set("")
+        try:
+            self._show_ppe_count()
+        except Exception as e:
+            messagebox.showerror("Ошибка", f"Не удалось загрузить список ППЭ: {str(e)}")
+
+    def _attach_pager(self, tree, scrollbar, fetch_page, insert, rows=None, next_key=None):
+        """
+        Подключает к Treeview постраничную догрузку по ключу.
+
+        fetch_page(key) возвращает (строки, ключ следующей страницы или None).
+        Если первая страница уже получена (rows, next_key), она выводится без запроса.
+        Следующая страница запрашивается, когда прокрутка доходит до последних 10% списка.
+        """
+        state = {"key": next_key, "loading": False}
+        if str(tree) not in self._pagers:
+            tree.bind("<Destroy>", lambda event: self._pagers.pop(str(tree), None), add="+")
+        self._pagers[str(tree)] = state
+
+        def load_next():
+            # Пока ждали, список мог быть перезагружен с новым состоянием
+            if self._pagers.get(str(tree)) is not state or state["key"] is None:
+                return
+            try:
+                page, state["key"] = fetch_page(state["key"])
+                for row in page:
+                    insert(row)
+            except Exception as e:
+                logger.error(f"Ошибка загрузки следующей страницы: {e}")
+                state["key"] = None
+            finally:
+                state["loading"] = False
+
+        def on_scroll(first, last):
+            scrollbar.set(first, last)
+            if state["key"] is not None and not state["loading"] and float(last) >= 0.9:
+                state["loading"] = True
+                self.root.after_idle(load_next)
+
+        tree.configure(yscrollcommand=on_scroll)
+        if rows is None:
+            rows, state["key"] = fetch_page(None)
+        for row in rows:
+            insert(row)
+
+    def _detach_pager(self, tree, scrollbar):
+        """Отключает догрузку: список выводится целиком."""
+        self._pagers.pop(str(tree), None)
+        tree.configure(yscrollcommand=scrollbar.set)
+
+    def _is_fully_loaded(self, tree):
+        state = self._pagers.get(str(tree))
+        return state is None or state["key"] is None
+
+    def _remove_count_label(self):
         # Удаляем предыдущую метку с количеством ППЭ, если она есть
         for widget in self.sidebar.winfo_children():
             if isinstance(widget, ttk.Label) and widget.cget("text").startswith(("Все ППЭ:", "ППЭ ЕГЭ:", "ППЭ ОГЭ:")):
                 widget.destroy()
-        
-        self._load_ppe_list()
-    
-        # Сбрасываем поисковый запрос
-        self.search_var.set("")
+
+    """Обновление списка ППЭ: с сервера запрашиваются только изменения с прошлого обновления."""
+    def _refresh_ppe_list(self, show_errors=True):
+        try:
+            changes = get_ppe_changes_since(self._ppe_token)
+        except Exception as e:
+            logger.error(f"Ошибка обновления списка ППЭ: {e}")
+            if show_errors:
+                messagebox.showerror("Ошибка", f"Не удалось обновить список ППЭ: {str(e)}")
+            return
+        self._ppe_token = changes.token
+
+        if changes.full:
+            # Первое обновление: список заменяется снимком с сервера
+            # Порядок постраничной выборки (ORDER BY ppe_number, id): ППЭ без номера в конце
+            rows = sorted(changes.changed, key=lambda row: (row[3] is None, row[3] or "", row[0]))
+            for item in self.ppe_list.get_children():
+                self.ppe_list.delete(item)
+            self._detach_pager(self.ppe_list, self.ppe_scrollbar)
+            for row in rows:
+                if self._is_ppe_visible(row):
+                    self.ppe_list.insert("", tk.END, values=row[:2])
+            changed_ids = None
+        else:
+            for ppe_id in changes.deleted:
+                self._patch_ppe_row(ppe_id, None)
+            for row in changes.changed:
+                self._patch_ppe_row(row[0], row)
+            changed_ids = {row[0] for row in changes.changed} | set(changes.related_ppe_ids)
+
+        logger.info(f"Обновление списка ППЭ: изменено {len(changes.changed)}, удалено {len(changes.deleted)}")
+        if self.current_ppe is not None and self.ppe_list.selection() and (
+                changed_ids is None or int(self.current_ppe) in changed_ids):
+            self._on_ppe_select(None)
+
+    """Применение изменений, полученных через уведомления сервера."""
+    def _process_changes(self):
+        try:
+            while True:
+                self._apply_changes(self._change_queue.get_nowait())
+        except queue.Empty:
+            pass
+        except Exception as e:
+            logger.error(f"Ошибка применения изменений: {e}")
+        self.root.after(200, self._process_changes)
+
+    def _apply_changes(self, events):
+        reload_current = False
+        if self.prefetcher:
+            # Карточки изменённых ППЭ сбрасываются до перерисовки текущей
+            for event in events:
+                self.prefetcher.invalidate(None if event.table is None else event.ppe_ids)
+        for event in events:
+            if event.table is None or (event.table == "dat_ppe" and event.ids is None):
+                # Уведомления могли быть пропущены — догоняем список по токену изменений
+                self._refresh_ppe_list(show_errors=False)
+                reload_current = True
+                continue
+            if event.table == "dat_ppe":
+                for ppe_id in event.ids:
+                    self._patch_ppe_row(ppe_id)
+            if self.current_ppe is not None and (
+                    event.ppe_ids is None or int(self.current_ppe) in event.ppe_ids):
+                reload_current = True
+
+        if reload_current and self.ppe_list.selection():
+            self._on_ppe_select(None)
+
+    def _is_ppe_visible(self, row):
+        """Проходит ли строка (id, ppe_address_fact, gia_type, ...) текущие фильтр и поиск."""
+        gia_filter = self.gia_filter.get()
+        search_term = self.search_var.get().lower()
+        return (
+            row is not None
+            and (not gia_filter or row[2] == gia_filter)
+            and (search_term in str(row[0]).lower() or search_term in str(row[1]).lower())
+        )
+
+    def _patch_ppe_row(self, ppe_id, row=()):
+        """
+        Обновляет, добавляет или удаляет одну строку списка ППЭ.
+        row — (id, ppe_address_fact, gia_type, ...) или None для удалённого ППЭ;
+        если строка не передана, она читается через get_ppe_row.
+        """
+        item = next((i for i in self.ppe_list.get_children()
+                     if str(self.ppe_list.item(i, "values")[0]) == str(ppe_id)), None)
+        if row == ():
+            row = get_ppe_row(ppe_id)
+
+        if not self._is_ppe_visible(row):
+            if item is not None:
+                self.ppe_list.delete(item)
+        elif item is not None:
+            self.ppe_list.item(item, values=row[:2])
+        elif self._is_fully_loaded(self.ppe_list):
+            # Пока догрузка не завершена, новая строка придёт со своей страницей
+            self.ppe_list.insert("", tk.END, values=row[:2])
 
     """Создание основной области контента с вкладками."""
     def _create_content_area(self):
@@ -290,30 +463,94 @@ class ModernPPEApp:
         item = selected_items[0]
         ppe_number, ppe_address = self.ppe_list.item(item, "values")
         self.current_ppe = ppe_number
-        
-        # Получаем school_id для этого ППЭ
-        school_id = self._get_school_id_by_ppe_number(ppe_number)
-        
-        # Обновляем информацию на вкладках, передавая school_id
-        self._update_info_tab(ppe_number, ppe_address, school_id)
-        self._update_equipment_tab(ppe_number)
-        self._update_contracts_tab(ppe_number)
+
+        # Запросы карточки ранее выбранного ППЭ больше не нужны — прерываем, а не ждём
+        if self._select_group is not None:
+            cancel_queries(self._select_group)
+            self._select_group = None
+
+        bundle = self.prefetcher.get(ppe_number) if self.prefetcher else None
+        if bundle is not None:
+            self._show_ppe_bundle(ppe_number, ppe_address, bundle)
+            return
+
+        self._select_seq += 1
+        group = f"ppe-select-{self._select_seq}"
+        self._select_group = group
+
+        # Карточка загружается в фоне, чтобы медленный запрос не блокировал интерфейс
+        threading.Thread(
+            target=self._load_ppe_bundle, args=(group, ppe_number, ppe_address),
+            name="ppe-bundle", daemon=True
+        ).start()
+        if not self._bundle_polling:
+            self._bundle_polling = True
+            self.root.after(20, self._process_bundles)
+
+    def _load_ppe_bundle(self, group, ppe_number, ppe_address):
+        """Фоновый поток: все данные карточки ППЭ одним запросом в группе group."""
+        try:
+            generation = self.prefetcher.generation if self.prefetcher else None
+            with query_scope(group, TIMEOUT_CONFIG['interactive']):
+                bundle = get_ppe_bundle(ppe_number)
+            if self.prefetcher:
+                self.prefetcher.put(ppe_number, bundle, generation)
+            self._bundle_queue.put((group, ppe_number, ppe_address, bundle, None))
+        except Exception as e:
+            self._bundle_queue.put((group, ppe_number, ppe_address, None, e))
+
+    def _process_bundles(self):
+        try:
+            while True:
+                group, ppe_number, ppe_address, bundle, error = self._bundle_queue.get_nowait()
+                if group != self._select_group:
+                    continue  # ответ для ППЭ, который уже не выбран
+                self._select_group = None
+                if error is not None:
+                    logger.error(f"Ошибка при загрузке данных ППЭ {ppe_number}: {error}")
+                    if is_cancelled_error(error):
+                        message = (f"Сервер не ответил за {TIMEOUT_CONFIG['interactive'] // 1000} с, "
+                                   f"запрос прерван. Повторите выбор ППЭ.")
+                    else:
+                        message = f"Не удалось загрузить данные ППЭ: {str(error)}"
+                    messagebox.showerror("Ошибка", message)
+                else:
+                    self._show_ppe_bundle(ppe_number, ppe_address, bundle)
+        except queue.Empty:
+            pass
+        # Опрос очереди продолжается, пока ожидается карточка выбранного ППЭ
+        self._bundle_polling = self._select_group is not None
+        if self._bundle_polling:
+            self.root.after(20, self._process_bundles)
+
+    def _show_ppe_bundle(self, ppe_number, ppe_address, bundle):
+        # Обновляем информацию на вкладках
+        self._update_info_tab(ppe_number, ppe_address, bundle)
+        self._update_equipment_tab(ppe_number, bundle.equipment, bundle.equipment_next)
+        self._update_contracts_tab(ppe_number, bundle.contracts, bundle.contracts_next)
         self._update_plans_tab(ppe_number)
 
-    def _get_school_id_by_ppe_number(self, ppe_number):
-        """Получает school_id для выбранного ППЭ из базы данных."""
-        query = """
-            SELECT school_id 
-            FROM dat_ppe 
-            WHERE ppe_number = %s
+        # Пока оператор читает карточку, загружаем соседей в порядке списка
+        if self.prefetcher and self.ppe_list.selection():
+            self.prefetcher.schedule(self._neighbour_ppe_ids(self.ppe_list.selection()[0]))
+
+    def _neighbour_ppe_ids(self, item):
         """
-        from database import execute_query
-        result = execute_query(query, (ppe_number,))
-        
-        if result and len(result) > 0:
-            return result[0][0]  # Возвращаем school_id
-        else:
-            return None  # Если не найден, возвращаем None
+        id соседей строки списка ППЭ на глубину предзагрузки в порядке приоритета:
+        следующий, предыдущий, второй следующий и т. д.
+        """
+        result = []
+        below = above = item
+        for _ in range(self.prefetcher.depth):
+            below = self.ppe_list.next(below) if below else ""
+            above = self.ppe_list.prev(above) if above else ""
+            result.extend(self.ppe_list.item(i, "values")[0] for i in (below, above) if i)
+        return result
+
+    def _get_school_id(self, ppe_id):
+        """Получает school_id выбранного ППЭ (по id, из индекса справочников)."""
+        ppe = get_ppe_info(ppe_id)
+        return ppe[3] if ppe else None
 
     """Преобразует числовой код типа ГИА в текстовое представление."""
     def _get_gia_type_name(self, gia_type):
@@ -327,7 +564,7 @@ class ModernPPEApp:
             return f"Неизвестный тип ({gia_type})"
 
     """Обновление вкладки с общей информацией."""
-    def _update_info_tab(self, ppe_number, ppe_address, school_id):
+    def _update_info_tab(self, ppe_number, ppe_address, bundle):
         # Очищаем текущее содержимое
         for widget in self.info_frame.winfo_children():
             widget.destroy()
@@ -361,25 +598,16 @@ class ModernPPEApp:
             style="Subheader.TLabel"
         ).pack(anchor="w", padx=20, pady=(0, 20))
             
-        # Получаем дополнительную информацию из БД
+        # Дополнительная информация уже загружена в bundle
         try:
-            from database import get_ppe_details, get_responsible_person
-                
-            details = get_ppe_details(school_id)
-            responsible = get_responsible_person(school_id)
+            details = bundle.details
+            responsible = bundle.responsible
             
             # Получаем тип ГИА
             try:
-                # Запрос типа ГИА из базы данных
-                query = """
-                    SELECT gia_type FROM dat_ppe
-                    WHERE id = %s
-                """
-                from database import execute_query
-                result = execute_query(query, (ppe_number,))
+                gia_type = bundle.gia_type
                 
-                if result and len(result) > 0:
-                    gia_type = result[0][0]
+                if gia_type is not None:
                     gia_type_name = self._get_gia_type_name(gia_type)
                     
                     # Отображаем тип ГИА
@@ -477,7 +705,7 @@ class ModernPPEApp:
             ).pack(padx=20, pady=20)
 
     """Обновление вкладки с оборудованием."""
-    def _update_equipment_tab(self, ppe_number):
+    def _update_equipment_tab(self, ppe_number, rows, next_key=None):
         # Очищаем текущее содержимое
         for widget in self.equipment_frame.winfo_children():
             widget.destroy()
@@ -513,15 +741,15 @@ class ModernPPEApp:
         y_scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
         x_scrollbar.pack(side=tk.BOTTOM, fill=tk.X)
         
-        # Загружаем данные оборудования
+        # Выводим данные оборудования; следующие страницы догружаются при прокрутке
         try:
-            from database import _fetch_equipment
-            print(ppe_number)
-            rows = _fetch_equipment(self, ppe_number)
-            
             if rows:
-                for row in rows:
-                    equipment_tree.insert("", tk.END, values=row)
+                self._attach_pager(
+                    equipment_tree, y_scrollbar,
+                    lambda key: get_equipment_page(ppe_number, key),
+                    lambda row: equipment_tree.insert("", tk.END, values=row[:5]),
+                    rows, next_key
+                )
             else:
                 # Если нет данных, показываем сообщение
                 for widget in self.equipment_frame.winfo_children():
@@ -720,8 +948,8 @@ class ModernPPEApp:
             import traceback
             traceback.print_exc() 
 
-    """Обновление вкладки с контрактами напрямую по ppe_number."""
-    def _update_contracts_tab(self, ppe_number):
+    """Обновление вкладки с контрактами по уже загруженным строкам."""
+    def _update_contracts_tab(self, ppe_number, rows, next_key=None):
         # Очищаем текущее содержимое
         for widget in self.contracts_frame.winfo_children():
             widget.destroy()
@@ -769,26 +997,21 @@ class ModernPPEApp:
         y_scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
         x_scrollbar.pack(side=tk.BOTTOM, fill=tk.X)
 
-        # Загружаем данные контрактов напрямую по ppe_number
+        # Выводим данные контрактов
         try:
-            query_contracts = """
-                SELECT c.contract_date, c.contract_number, c.supplier, c.supplier_inn, c.contract_name 
-                FROM dat_contract c
-                JOIN equip_data ed ON ed.contract_id = c.id
-                JOIN dat_ppe p ON p.id = ed.ppe_id
-                WHERE p.id = %s
-                GROUP BY c.id, c.contract_date, c.contract_number, c.supplier, c.supplier_inn, c.contract_name
-            """
-            from database import execute_query
-            rows = execute_query(query_contracts, (ppe_number,))
-            
             if rows:
-                for row in rows:
-                    formatted_row = list(row)
+                def insert_contract(row):
+                    formatted_row = list(row[:5])
                     # Форматируем дату, если она есть
                     if row[0] and hasattr(row[0], 'strftime'):
                         formatted_row[0] = row[0].strftime('%d.%m.%Y')
                     self.contracts_tree.insert("", tk.END, values=formatted_row)
+
+                self._attach_pager(
+                    self.contracts_tree, y_scrollbar,
+                    lambda key: get_contracts_page(ppe_number, key),
+                    insert_contract, rows, next_key
+                )
             else:
                 ttk.Label(
                     button_frame, 
@@ -979,7 +1202,130 @@ class ModernPPEApp:
 
         finally:
             loading_window.destroy()
-    
+
+    def _export_data(self):
+        """Выгрузка ППЭ с оборудованием и контрактами в CSV или Parquet в фоновом потоке."""
+        save_path = filedialog.asksaveasfilename(
+            defaultextension=".csv",
+            filetypes=[("CSV (Excel)", "*.csv"), ("Parquet", "*.parquet")],
+            initialfile=f"Выгрузка_ППЭ_{datetime.now():%Y-%m-%d}.csv",
+            title="Экспорт данных"
+        )
+        if not save_path:
+            return
+
+        export_window = tk.Toplevel(self.root)
+        export_window.title("Экспорт данных")
+        export_window.geometry("320x130")
+        export_window.transient(self.root)
+        export_window.grab_set()
+        export_window.protocol("WM_DELETE_WINDOW", lambda: None)
+
+        ttk.Label(export_window, text="Выгрузка данных...", wraplength=300).pack(pady=(20, 10))
+        progress = ttk.Progressbar(export_window, mode="determinate", maximum=100)
+        progress.pack(fill=tk.X, padx=20, pady=5)
+        status_label = ttk.Label(export_window, text="Подготовка...")
+        status_label.pack(pady=5)
+
+        # Поток выгрузки передаёт ход и результат через очередь: Tkinter не потокобезопасен
+        messages = queue.Queue()
+
+        def run():
+            from export_data import export_dataset
+            try:
+                summary = export_dataset(save_path, progress=lambda done, total: messages.put(("progress", done, total)))
+                messages.put(("done", summary))
+            except Exception as e:
+                logger.error(f"Ошибка экспорта данных: {e}")
+                messages.put(("error", e))
+
+        def poll():
+            try:
+                while True:
+                    message = messages.get_nowait()
+                    if message[0] == "progress":
+                        done, total = message[1:]
+                        progress.configure(value=done / total * 100 if total else 100)
+                        status_label.configure(text=f"{done} из {total} строк")
+                        continue
+                    export_window.destroy()
+                    if message[0] == "done":
+                        messagebox.showinfo(
+                            "Успех",
+                            f"Выгружено строк: {message[1]['rows']}\n{save_path}")
+                    else:
+                        messagebox.showerror("Ошибка", f"Не удалось выполнить экспорт:\n{message[1]}")
+                    return
+            except queue.Empty:
+                pass
+            export_window.after(100, poll)
+
+        threading.Thread(target=run, name="export-data", daemon=True).start()
+        poll()
+
+    def _generate_contracts_batch(self):
+        """Генерация договоров для всех ППЭ выбранного типа ГИА в фоновом потоке."""
+        output_dir = filedialog.askdirectory(title="Каталог для договоров")
+        if not output_dir:
+            return
+        gia_type = self.gia_filter.get() or None
+
+        batch_window = tk.Toplevel(self.root)
+        batch_window.title("Пакетная генерация договоров")
+        batch_window.geometry("320x130")
+        batch_window.transient(self.root)
+        batch_window.grab_set()
+        batch_window.protocol("WM_DELETE_WINDOW", lambda: None)
+
+        ttk.Label(batch_window, text="Генерация договоров...", wraplength=300).pack(pady=(20, 10))
+        progress = ttk.Progressbar(batch_window, mode="determinate", maximum=100)
+        progress.pack(fill=tk.X, padx=20, pady=5)
+        status_label = ttk.Label(batch_window, text="Загрузка данных...")
+        status_label.pack(pady=5)
+
+        messages = queue.Queue()
+
+        def run():
+            from batch_contracts import generate_contracts_batch
+            try:
+                # Без пула процессов: на Windows каждый дочерний процесс заново загружает
+                # модули приложения, а в собранном exe запускает его (см. new_main.py)
+                summary = generate_contracts_batch(
+                    output_dir, gia_type=gia_type, workers=1,
+                    progress=lambda done, total: messages.put(("progress", done, total)))
+                messages.put(("done", summary))
+            except Exception as e:
+                logger.error(f"Ошибка пакетной генерации договоров: {e}")
+                messages.put(("error", e))
+
+        def poll():
+            try:
+                while True:
+                    message = messages.get_nowait()
+                    if message[0] == "progress":
+                        done, total = message[1:]
+                        progress.configure(value=done / total * 100 if total else 100)
+                        status_label.configure(text=f"{done} из {total} договоров")
+                        continue
+                    batch_window.destroy()
+                    if message[0] == "done":
+                        summary = message[1]
+                        show = messagebox.showwarning if summary["errors"] else messagebox.showinfo
+                        show(
+                            "Пакетная генерация договоров",
+                            f"Сформировано договоров: {summary['ok']} из {summary['total']}, "
+                            f"ошибок: {summary['errors']}\n"
+                            f"{summary['docs_per_sec']} договоров/с\n\nМанифест: {summary['manifest']}")
+                    else:
+                        messagebox.showerror("Ошибка", f"Не удалось сформировать договоры:\n{message[1]}")
+                    return
+            except queue.Empty:
+                pass
+            batch_window.after(100, poll)
+
+        threading.Thread(target=run, name="contracts-batch", daemon=True).start()
+        poll()
+
     def _show_help(self):
         """Показ справочной информации."""
         help_window = tk.Toplevel(self.root)
@@ -1214,7 +1560,12 @@ if __name__ == "__main__":
         import ttkthemes
     
     root = tk.Tk()
-    app = ModernPPEApp(root)
+    try:
+        app = ModernPPEApp(root)
+    except SchemaVersionError as e:
+        messagebox.showerror("База данных не обновлена", str(e))
+        root.destroy()
+        raise SystemExit(1)
     
     # Устанавливаем иконку, если она существует
     try:
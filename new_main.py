@@ -2,10 +2,14 @@
 попытка нового интерфейса
 """
 
+import multiprocessing
 import tkinter as tk
 from modern_ui import ModernPPEApp
 
 if __name__ == "__main__":
+    # В собранном PyInstaller exe дочерние процессы запускают этот же exe:
+    # без freeze_support каждый из них открыл бы ещё одно окно приложения
+    multiprocessing.freeze_support()
     root = tk.Tk()
     app = ModernPPEApp(root)
     try:
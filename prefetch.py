@@ -0,0 +1,139 @@
+"""
+Модуль предзагрузки карточек соседних ППЭ.
+Операторы обычно идут по списку ППЭ подряд, поэтому, пока открыта карточка
+текущего ППЭ, фоновый поток загружает карточки нескольких следующих
+и предыдущих, и переход к ним отрисовывается из памяти.
+"""
+
+import time
+import logging
+import threading
+from collections import OrderedDict
+
+from database import query_scope, cancel_queries, TIMEOUT_CONFIG
+
+logger = logging.getLogger('database')
+
+
+class BundlePrefetcher:
+    """
+    Ограниченный кэш карточек ППЭ с фоновой загрузкой соседей.
+
+    load(ppe_id) возвращает карточку (database.get_ppe_bundle). В кэше хранится
+    не больше max_entries карточек (вытеснение LRU), каждая не дольше ttl секунд;
+    invalidate() сбрасывает карточки изменённых ППЭ.
+    """
+
+    # Больше соседей не загружается при любой настройке: каждый — запрос к серверу
+    MAX_DEPTH = 10
+
+    def __init__(self, load, depth=2, max_entries=None, ttl=60.0):
+        self.load = load
+        self.depth = max(0, min(int(depth), self.MAX_DEPTH))
+        # Соседи с обеих сторон, текущий ППЭ и недавно покинутые
+        self.max_entries = max_entries or 4 * self.depth + 1
+        self.ttl = ttl
+        self._bundles = OrderedDict()   # ppe_id -> (карточка, срок годности)
+        self._wanted = []               # очередь загрузки по убыванию приоритета
+        self._loading = None            # ppe_id, загружаемый сейчас
+        self._generation = 0            # номер сброса: загрузка, начатая до сброса, не сохраняется
+        self._cond = threading.Condition()
+        self._stop = False
+        self._thread = None
+        self.hits = 0
+        self.misses = 0
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="ppe-prefetch", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        with self._cond:
+            self._stop = True
+            self._cond.notify()
+
+    def get(self, ppe_id):
+        """Карточка из кэша или None."""
+        key = str(ppe_id)
+        with self._cond:
+            entry = self._bundles.get(key)
+            if entry is not None and entry[1] > time.monotonic():
+                self._bundles.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            self._bundles.pop(key, None)
+            self.misses += 1
+            return None
+
+    def put(self, ppe_id, bundle, generation=None):
+        """Сохраняет карточку (например, загруженную интерфейсом для текущего ППЭ)."""
+        with self._cond:
+            if generation is not None and generation != self._generation:
+                return
+            self._bundles[str(ppe_id)] = (bundle, time.monotonic() + self.ttl)
+            self._bundles.move_to_end(str(ppe_id))
+            while len(self._bundles) > self.max_entries:
+                self._bundles.popitem(last=False)
+
+    @property
+    def generation(self):
+        return self._generation
+
+    def schedule(self, ppe_ids):
+        """
+        Заменяет очередь предзагрузки: ppe_ids — соседи по убыванию приоритета.
+        Загрузка ППЭ, выпавшего из очереди, прерывается.
+        """
+        wanted = [str(ppe_id) for ppe_id in ppe_ids]
+        with self._cond:
+            self._wanted = [key for key in wanted if key not in self._bundles]
+            loading = self._loading
+            self._cond.notify()
+        if loading is not None and loading not in wanted:
+            cancel_queries(f"ppe-prefetch-{loading}")
+
+    def invalidate(self, ppe_ids=None):
+        """Сбрасывает карточки указанных ППЭ (None — все)."""
+        with self._cond:
+            self._generation += 1
+            if ppe_ids is None:
+                self._bundles.clear()
+            else:
+                for ppe_id in ppe_ids:
+                    self._bundles.pop(str(ppe_id), None)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._stop and not self._wanted:
+                    self._cond.wait()
+                if self._stop:
+                    return
+                key = self._wanted.pop(0)
+                if key in self._bundles:
+                    continue
+                self._loading = key
+                generation = self._generation
+            try:
+                with query_scope(f"ppe-prefetch-{key}", TIMEOUT_CONFIG['interactive']):
+                    bundle = self.load(key)
+                self.put(key, bundle, generation)
+            except Exception as e:
+                # Предзагрузка необязательна: при ошибке карточка загрузится при выборе
+                logger.debug(f"Предзагрузка ППЭ {key} не выполнена: {e}")
+            finally:
+                with self._cond:
+                    self._loading = None
+
+    def stats(self):
+        """Возвращает счётчики попаданий и промахов."""
+        with self._cond:
+            total = self.hits + self.misses
+            return {
+                "entries": len(self._bundles),
+                "queued": len(self._wanted),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 3) if total else 0.0,
+            }
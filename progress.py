@@ -0,0 +1,16 @@
+"""
+Вывод хода длительных операций командной строки (загрузка, выгрузка, пакетное
+формирование договоров) одной обновляемой строкой консоли.
+"""
+
+import time
+
+
+def print_progress(done, total, started, unit="строк"):
+    """
+    Печатает счётчик done/total, процент и время с момента started
+    (time.perf_counter()) поверх предыдущей строки.
+    """
+    elapsed = time.perf_counter() - started
+    percent = done / total * 100 if total else 100
+    print(f"\r  {done}/{total} {unit} ({percent:5.1f}%), {elapsed:6.1f} с", end="", flush=True)
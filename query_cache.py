@@ -0,0 +1,105 @@
+"""
+Модуль кэша результатов запросов к справочным таблицам.
+Кэш ограничен по размеру (вытеснение LRU) и по времени жизни записей,
+а записи сбрасываются при изменении таблиц, из которых они были получены.
+"""
+
+import re
+import time
+import threading
+from collections import OrderedDict
+
+# Таблицы, которые изменяет запрос: INSERT/UPDATE/DELETE в начале запроса или в CTE
+# (WITH ... AS (UPDATE ... RETURNING ...)). У UPDATE таблица определяется по SET,
+# чтобы не принять за запись SELECT ... FOR UPDATE и ON CONFLICT DO UPDATE
+_WRITE_TARGET_RE = re.compile(
+    r'\b(?:INSERT\s+INTO|DELETE\s+FROM)\s+(?:ONLY\s+)?(?:\w+\.)?"?(\w+)"?'
+    r'|\bUPDATE\s+(?:ONLY\s+)?(?:\w+\.)?"?(\w+)"?(?:\s+(?:AS\s+)?\w+)?\s+SET\b',
+    re.IGNORECASE
+)
+
+
+def write_target_tables(query):
+    """Возвращает имена таблиц, изменяемых запросом, в порядке появления."""
+    tables = []
+    for match in _WRITE_TARGET_RE.finditer(query):
+        table = (match.group(1) or match.group(2)).lower()
+        if table not in tables:
+            tables.append(table)
+    return tables
+
+def write_target_table(query):
+    """Возвращает имя изменяемой таблицы для запроса на запись или None."""
+    tables = write_target_tables(query)
+    return tables[0] if tables else None
+
+
+class QueryCache:
+    """
+    Кэш вида (запрос, параметры) -> результат.
+
+    Каждая запись помечается таблицами, от которых она зависит;
+    invalidate() удаляет все записи, зависящие от указанных таблиц.
+    """
+
+    def __init__(self, max_entries=512, ttl=300.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()   # ключ -> (результат, срок годности, таблицы)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def make_key(query, params):
+        if isinstance(params, dict):
+            params = sorted(params.items())
+        return (" ".join(query.split()), tuple(params or ()))
+
+    def get(self, key):
+        """Возвращает (найдено, результат)."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                result, expires_at, _ = entry
+                if expires_at > time.monotonic():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return True, result
+                del self._entries[key]
+            self.misses += 1
+            return False, None
+
+    def put(self, key, result, tables):
+        with self._lock:
+            self._entries[key] = (result, time.monotonic() + self.ttl, frozenset(tables))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, *tables):
+        """Удаляет записи, зависящие от любой из указанных таблиц."""
+        tables = {t.lower() for t in tables}
+        with self._lock:
+            stale = [key for key, (_, _, deps) in self._entries.items() if deps & tables]
+            for key in stale:
+                del self._entries[key]
+            self.invalidations += len(stale)
+        return len(stale)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """Возвращает счётчики попаданий и промахов."""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 3) if total else 0.0,
+                "invalidations": self.invalidations,
+            }
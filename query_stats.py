@@ -0,0 +1,112 @@
+"""
+Модуль учёта времени выполнения запросов.
+Собирает время, число строк и нормализованный отпечаток каждого запроса,
+пишет медленные запросы в отдельный журнал и формирует сводку за сеанс.
+"""
+
+import re
+import logging
+import threading
+from collections import defaultdict, deque
+
+# Порог медленного запроса, мс
+SLOW_QUERY_THRESHOLD_MS = 200
+SLOW_QUERY_LOG = 'slow_queries.log'
+# Сколько последних замеров хранить на один отпечаток
+MAX_SAMPLES = 10000
+
+_STRING_RE = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_RE = re.compile(r"\b\d+(?:\.\d+)?\b")
+_PLACEHOLDER_RE = re.compile(r"%\(\w+\)s|%s")
+_SPACE_RE = re.compile(r"\s+")
+
+_samples = defaultdict(lambda: {"timings": deque(maxlen=MAX_SAMPLES), "count": 0, "rows": 0})
+_lock = threading.Lock()
+_slow_logger = None
+
+logger = logging.getLogger('database')
+
+
+def fingerprint(query):
+    """Нормализует запрос: литералы и параметры заменяются на ?, пробелы схлопываются."""
+    text = _STRING_RE.sub("?", query)
+    text = _PLACEHOLDER_RE.sub("?", text)
+    text = _NUMBER_RE.sub("?", text)
+    return _SPACE_RE.sub(" ", text).strip().rstrip(";")
+
+def _get_slow_logger():
+    global _slow_logger
+    if _slow_logger is None:
+        slow_logger = logging.getLogger('slow_queries')
+        slow_logger.setLevel(logging.WARNING)
+        slow_logger.propagate = False
+        handler = logging.FileHandler(SLOW_QUERY_LOG, encoding='utf-8')
+        handler.setFormatter(logging.Formatter('%(asctime)s - %(message)s'))
+        slow_logger.addHandler(handler)
+        _slow_logger = slow_logger
+    return _slow_logger
+
+def record(query, elapsed, rows=None):
+    """
+    Учитывает выполненный запрос.
+
+    Args:
+        query (str): SQL-запрос
+        elapsed (float): Время выполнения, с
+        rows (int, optional): Число возвращённых или затронутых строк
+    """
+    key = fingerprint(query)
+    elapsed_ms = elapsed * 1000
+    with _lock:
+        entry = _samples[key]
+        entry["timings"].append(elapsed_ms)
+        entry["count"] += 1
+        entry["rows"] += rows or 0
+
+    if elapsed_ms >= SLOW_QUERY_THRESHOLD_MS:
+        _get_slow_logger().warning(f"{elapsed_ms:.1f} мс, строк: {rows}, запрос: {key}")
+
+def _percentile(ordered, pct):
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+def summary():
+    """
+    Возвращает сводку по отпечаткам, отсортированную по суммарному времени.
+
+    Returns:
+        list: Словари fingerprint, count, rows, p50_ms, p95_ms, total_ms
+    """
+    with _lock:
+        items = [(key, list(entry["timings"]), entry["count"], entry["rows"])
+                 for key, entry in _samples.items()]
+    result = []
+    for key, timings, count, rows in items:
+        ordered = sorted(timings)
+        result.append({
+            "fingerprint": key,
+            "count": count,
+            "rows": rows,
+            "p50_ms": round(_percentile(ordered, 50), 2),
+            "p95_ms": round(_percentile(ordered, 95), 2),
+            "total_ms": round(sum(ordered), 2),
+        })
+    result.sort(key=lambda item: item["total_ms"], reverse=True)
+    return result
+
+def dump_summary():
+    """Записывает сводку за сеанс в журнал медленных запросов."""
+    items = summary()
+    if not items:
+        return
+    slow_logger = _get_slow_logger()
+    slow_logger.warning(f"Сводка запросов за сеанс ({len(items)} отпечатков):")
+    for item in items:
+        slow_logger.warning(
+            f"  count={item['count']:<6} p50={item['p50_ms']:>8} мс  p95={item['p95_ms']:>8} мс  "
+            f"total={item['total_ms']:>10} мс  rows={item['rows']:<8} {item['fingerprint'][:200]}"
+        )
+
+def reset():
+    with _lock:
+        _samples.clear()
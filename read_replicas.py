@@ -0,0 +1,175 @@
+"""
+Модуль маршрутизации читающих запросов на реплики PostgreSQL.
+Запросы SELECT выполняются на репликах только для чтения, если их отставание
+от основного сервера не превышает допустимого; иначе, а также при недоступности
+реплик, чтение идёт на основной сервер.
+"""
+
+import logging
+import threading
+from contextlib import contextmanager
+
+logger = logging.getLogger('database')
+
+# Отставание реплики в секундах. Если всё полученное WAL уже применено, реплика
+# догнала основной сервер — но только пока поток WAL идёт: реплика, потерявшая
+# связь с основным сервером, тоже ничего не получает и не применяет.
+# NULL — поток WAL не идёт (статус приёмника виден ролям с pg_read_all_stats,
+# без этой роли реплика считается отставшей и чтение идёт с основного сервера)
+LAG_QUERY = """
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() THEN 0
+        WHEN NOT EXISTS (SELECT 1 FROM pg_stat_wal_receiver WHERE status = 'streaming') THEN NULL
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+    END
+"""
+
+
+class _Replica:
+    def __init__(self, config):
+        self.config = config
+        self.name = f"{config.get('host')}:{config.get('port', 5432)}"
+        self.pool = None
+        self.lag = None
+        self.fresh = False
+
+
+class ReadReplicaSet:
+    """
+    Пулы соединений реплик с проверкой отставания.
+
+    make_pool(config) создаёт пул (db_pool.ConnectionPool) для параметров реплики;
+    is_failure(error) отличает обрыв соединения от ошибки запроса.
+    Отставание проверяется фоновым потоком раз в check_interval секунд, поэтому
+    выбор реплики не ждёт сети; до первой проверки чтение идёт с основного сервера.
+    """
+
+    def __init__(self, configs, make_pool, is_failure, max_lag=5.0, check_interval=10.0):
+        self._replicas = [_Replica(config) for config in configs]
+        self._make_pool = make_pool
+        self._is_failure = is_failure
+        self.max_lag = max_lag
+        self.check_interval = check_interval
+        self._next = 0
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stop = threading.Event()
+        self.checked = threading.Event()   # первая проверка всех реплик завершена
+        self.reads = 0
+        self.fallbacks = 0           # чтений на основном сервере из-за отставания или недоступности
+
+    # ---------- Проверка отставания ----------
+
+    def start(self):
+        """Запускает фоновый поток проверки реплик."""
+        with self._lock:
+            if self._thread is None and not self._stop.is_set():
+                self._thread = threading.Thread(target=self._run, name="replica-lag-check", daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while not self._stop.is_set():
+            for replica in self._replicas:
+                if self._stop.is_set():
+                    return
+                self._check(replica)
+            self.checked.set()
+            self._stop.wait(self.check_interval)
+
+    def _check(self, replica):
+        """Обновляет признак свежести реплики (вызывается фоновым потоком)."""
+        try:
+            if replica.pool is None:
+                replica.pool = self._make_pool(replica.config)
+            with replica.pool.connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute(LAG_QUERY)
+                lag = cursor.fetchone()[0]
+                conn.rollback()
+        except Exception as e:
+            if replica.fresh or replica.lag is not None or not self.checked.is_set():
+                logger.warning(f"Реплика {replica.name} недоступна: {e}")
+            replica.fresh = False
+            replica.lag = None
+            return
+        was_fresh = replica.fresh
+        if lag is None:
+            replica.lag = None
+            replica.fresh = False
+            if was_fresh or not self.checked.is_set():
+                logger.warning(f"Реплика {replica.name}: нет потока WAL с основного сервера, чтение с основного сервера")
+            return
+        replica.lag = float(lag)
+        replica.fresh = replica.lag <= self.max_lag and not self._stop.is_set()
+        if replica.fresh != was_fresh:
+            state = "используется для чтения" if replica.fresh else "отстаёт, чтение с основного сервера"
+            logger.info(f"Реплика {replica.name}: отставание {replica.lag:.1f} с, {state}")
+
+    def wait_checked(self, timeout=None):
+        """Ждёт завершения первой проверки реплик; True, если она завершилась."""
+        self.start()
+        return self.checked.wait(timeout)
+
+    # ---------- Чтение ----------
+
+    def pick(self):
+        """Следующая по кругу свежая реплика или None (без обращений к сети)."""
+        if self._stop.is_set():
+            return None
+        self.start()
+        with self._lock:
+            start = self._next
+            self._next = (self._next + 1) % max(len(self._replicas), 1)
+        for offset in range(len(self._replicas)):
+            replica = self._replicas[(start + offset) % len(self._replicas)]
+            if replica.fresh:
+                return replica
+        return None
+
+    def note_read(self, on_replica):
+        """Учитывает чтение с реплики или (on_replica=False) с основного сервера."""
+        with self._lock:
+            if on_replica:
+                self.reads += 1
+            else:
+                self.fallbacks += 1
+
+    @contextmanager
+    def connection(self, replica, shared=True):
+        """Соединение с репликой; обрыв исключает её из чтения до следующей проверки."""
+        try:
+            with replica.pool.connection(shared=shared) as conn:
+                yield conn
+        except Exception as e:
+            if self._is_failure(e):
+                replica.fresh = False
+            raise
+
+    def closeall(self):
+        """Останавливает проверку и закрывает пулы; чтение переходит на основной сервер."""
+        self._stop.set()
+        for replica in self._replicas:
+            replica.fresh = False
+        thread = self._thread
+        if thread is not None and thread is not threading.current_thread():
+            thread.join(timeout=1.0)
+        for replica in self._replicas:
+            # Проверка, начатая до остановки, могла снова отметить реплику свежей
+            replica.fresh = False
+            if replica.pool is not None:
+                replica.pool.closeall()
+                replica.pool = None
+
+    def stats(self):
+        """Отставание и состояние каждой реплики, счётчики чтений."""
+        with self._lock:
+            reads, fallbacks = self.reads, self.fallbacks
+        return {
+            "reads": reads,
+            "fallbacks": fallbacks,
+            "replicas": {
+                replica.name: {"fresh": replica.fresh, "lag": replica.lag}
+                for replica in self._replicas
+            },
+        }
@@ -0,0 +1,140 @@
+"""
+Модуль индексов справочных таблиц в памяти.
+dat_ppe, dat_ppe_details и dat_responsible содержат несколько тысяч строк,
+поэтому загружаются целиком одним пакетом запросов при запуске, а точечные
+обращения при каждом выборе ППЭ обслуживаются словарями без обращения к серверу.
+Индексы перестраиваются в фоновом потоке по интервалу и по уведомлениям.
+"""
+
+import logging
+import threading
+
+logger = logging.getLogger('database')
+
+# Загрузка выполняется одним пакетом (database.execute_queries)
+_LOAD_QUERIES = [
+    ("SELECT id, ppe_number, ppe_address_fact, school_id, gia_type FROM dat_ppe", None),
+    ("SELECT school_id, fullname, address, inn, kpp, okpo, ogrn FROM dat_ppe_details", None),
+    ("SELECT school_id, position, surname, first_name, second_name FROM dat_responsible", None),
+]
+
+# Признак изменения таблиц (row_version — миграция 5): индексы не перестраиваются,
+# если с прошлой загрузки ничего не изменилось
+_SIGNATURE_QUERY = """
+    SELECT
+        (SELECT (count(*), max(row_version))::text FROM dat_ppe),
+        (SELECT (count(*), max(row_version))::text FROM dat_ppe_details),
+        (SELECT (count(*), max(row_version))::text FROM dat_responsible)
+"""
+
+
+class ReferenceIndex:
+    """
+    Словари справочных данных:
+    id -> (id, ppe_number, ppe_address_fact, school_id, gia_type),
+    ppe_number -> id, school_id -> реквизиты, school_id -> ответственное лицо.
+
+    Словари заменяются целиком после каждой загрузки, поэтому чтение из других
+    потоков не требует блокировок.
+    """
+
+    def __init__(self, refresh_interval=300):
+        self.refresh_interval = refresh_interval
+        self.ppe_by_id = {}
+        self.ppe_id_by_number = {}
+        self.details_by_school = {}
+        self.responsible_by_school = {}
+        self.loaded = False
+        self._signature = None
+        self._stop = threading.Event()
+        self._wakeup = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """Запускает фоновую загрузку и обновление индексов."""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="reference-index", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._wakeup.set()
+
+    def request_refresh(self):
+        """Просит фоновый поток перестроить индексы, не дожидаясь интервала."""
+        self._wakeup.set()
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.refresh()
+            except Exception as e:
+                logger.warning(f"Не удалось обновить индексы справочников: {e}")
+            self._wakeup.wait(self.refresh_interval)
+            self._wakeup.clear()
+
+    def _current_signature(self):
+        from database import execute_query
+        try:
+            return execute_query(_SIGNATURE_QUERY)[0]
+        except Exception as e:
+            # Без столбцов row_version (миграция 5 не применена) индексы просто перестраиваются
+            logger.debug(f"Признак изменения справочников недоступен: {e}")
+            return None
+
+    def refresh(self):
+        """
+        Перестраивает индексы, если справочники изменились с прошлой загрузки.
+
+        Returns:
+            bool: Были ли индексы перестроены
+        """
+        from database import execute_queries
+        signature = self._current_signature()
+        if self.loaded and signature is not None and signature == self._signature:
+            return False
+
+        ppe_rows, details_rows, responsible_rows = execute_queries(_LOAD_QUERIES)
+        ppe_by_id = {row[0]: tuple(row) for row in ppe_rows}
+        ppe_id_by_number = {}
+        for row in ppe_rows:
+            ppe_id_by_number.setdefault(row[1], row[0])
+        # Как LIMIT 1 в точечных запросах: для организации берётся первая строка
+        details_by_school = {}
+        for row in details_rows:
+            details_by_school.setdefault(row[0], tuple(row[1:]))
+        responsible_by_school = {}
+        for row in responsible_rows:
+            responsible_by_school.setdefault(row[0], tuple(row[1:]))
+
+        self.ppe_by_id = ppe_by_id
+        self.ppe_id_by_number = ppe_id_by_number
+        self.details_by_school = details_by_school
+        self.responsible_by_school = responsible_by_school
+        self._signature = signature
+        self.loaded = True
+        logger.info(
+            f"Индексы справочников загружены: ППЭ {len(ppe_by_id)}, "
+            f"реквизитов {len(details_by_school)}, ответственных {len(responsible_by_school)}"
+        )
+        return True
+
+    # ---------- Чтение ----------
+
+    def get_ppe(self, ppe_id):
+        """(id, ppe_number, ppe_address_fact, school_id, gia_type) или None."""
+        try:
+            return self.ppe_by_id.get(int(ppe_id))
+        except (TypeError, ValueError):
+            return None
+
+    def get_ppe_id(self, ppe_number):
+        return self.ppe_id_by_number.get(ppe_number)
+
+    def get_details(self, school_id):
+        """(fullname, address, inn, kpp, okpo, ogrn) или None."""
+        return self.details_by_school.get(school_id)
+
+    def get_responsible(self, school_id):
+        """(position, surname, first_name, second_name) или None."""
+        return self.responsible_by_school.get(school_id)
@@ -0,0 +1,209 @@
+"""
+Типизированные записи результатов запросов.
+Строки создаются фабрикой строк курсора сразу экземплярами классов со __slots__
+(без промежуточных словарей), поля читаются по имени, а не по позиции в кортеже.
+Записи также отдаются шаблону docxtpl: Jinja обращается к ним через атрибуты.
+"""
+
+from dataclasses import dataclass
+
+from database import (
+    STREAM_BATCH_SIZE, execute_query, execute_prepared, register_statement, get_exam_year,
+    iter_equip_data as _iter_equip_data,
+)
+
+# Брать агрегаты оборудования из таблиц equip_agg_ppe / equip_agg_school,
+# которые поддерживаются триггерами (миграция 3), вместо GROUP BY по equip_data
+USE_EQUIPMENT_AGGREGATES = True
+
+
+@dataclass
+class EquipDataRecord:
+    """Единица оборудования (database.iter_equip_data)."""
+    # __slots__ задаются явно: dataclass(slots=True) доступен только с Python 3.10
+    __slots__ = (
+        "ppe_id", "equip_type", "equip_mark", "equip_mod", "release_year", "name_in_1C",
+        "inv_number", "equip_price", "amount", "agreement", "contract_id",
+    )
+    ppe_id: int
+    equip_type: str
+    equip_mark: str
+    equip_mod: str
+    release_year: object
+    name_in_1C: str
+    inv_number: object
+    equip_price: object
+    amount: int
+    agreement: str
+    contract_id: int
+
+
+@dataclass
+class EquipmentItem:
+    """Позиция спецификации договора: модель оборудования с количеством и суммой."""
+    __slots__ = ("row_number", "equip_name", "count_equip", "inv_numbers", "price", "total")
+    row_number: int
+    equip_name: str
+    count_equip: int
+    inv_numbers: str
+    price: object
+    total: object
+
+    # Шаблон договора выводит цены строками с двумя знаками после запятой
+    @property
+    def equip_price(self):
+        return f"{self.price:.2f}"
+
+    @property
+    def total_price(self):
+        return f"{self.total:.2f}"
+
+
+@dataclass
+class ContractRecord:
+    """Договор, связанный с оборудованием ППЭ."""
+    __slots__ = ("id", "num_contract", "contract_date", "name_contract")
+    id: int
+    num_contract: str
+    contract_date: object
+    name_contract: str
+
+    @property
+    def date_contract(self):
+        return self.contract_date.strftime("%d.%m.%Y") if self.contract_date else ""
+
+
+EQUIPMENT_ITEMS_AGG_QUERY = """
+    SELECT
+    row_number() OVER (ORDER BY equip_name) AS row_num,
+    equip_name,
+    equip_count,
+    inv_numbers,
+    equip_price                    AS price,
+    equip_price * equip_count      AS total_price
+    FROM equip_agg_ppe
+    WHERE exam_year = %s AND ppe_id = %s
+    ORDER BY equip_name
+"""
+EQUIPMENT_ITEMS_QUERY = """
+    SELECT
+    row_number() OVER (ORDER BY "name_in_1C") AS row_num,
+    "name_in_1C"                   AS equip_name,
+    COUNT(*)                       AS equip_count,
+    string_agg(DISTINCT inv_number::text, '\n ') AS inv_numbers,
+    equip_price                    AS price,
+    equip_price * COUNT(*)         AS total_price
+    FROM equip_data
+    JOIN "dat_equip"
+        ON "dat_equip"."id" = equip_data.equip_id
+    WHERE exam_year = %s AND ppe_id = %s
+    GROUP BY "name_in_1C", equip_price
+    ORDER BY "name_in_1C"
+"""
+SCHOOL_EQUIPMENT_ITEMS_AGG_QUERY = """
+    SELECT
+    row_number() OVER (ORDER BY equip_name) AS row_num,
+    equip_name,
+    equip_count,
+    inv_numbers,
+    equip_price                    AS price,
+    equip_price * equip_count      AS total_price
+    FROM equip_agg_school
+    WHERE exam_year = %s AND school_id = %s
+    ORDER BY equip_name
+"""
+SCHOOL_EQUIPMENT_ITEMS_QUERY = """
+    SELECT
+    row_number() OVER (ORDER BY "name_in_1C") AS row_num,
+    "name_in_1C"                   AS equip_name,
+    COUNT(*)                       AS equip_count,
+    string_agg(DISTINCT inv_number::text, '\n ') AS inv_numbers,
+    equip_price                    AS price,
+    equip_price * COUNT(*)         AS total_price
+    FROM equip_data
+    JOIN "dat_equip" ON "dat_equip"."id" = equip_data.equip_id
+    JOIN dat_ppe ON dat_ppe.id = equip_data.ppe_id
+    WHERE equip_data.exam_year = %s AND dat_ppe.school_id = %s
+    AND (agreement IS NULL OR agreement = '')
+    GROUP BY "name_in_1C", equip_price
+    ORDER BY "name_in_1C"
+"""
+PPE_CONTRACTS_QUERY = """
+    SELECT DISTINCT c.id, c.contract_number, c.contract_date, c.contract_name
+    FROM equip_data ed
+    JOIN dat_contract c ON ed.contract_id = c.id AND c.exam_year = ed.exam_year
+    WHERE ed.exam_year = %s AND ed.ppe_id = %s
+"""
+
+# Пакетная генерация договоров (batch_contracts.py): спецификации и договоры
+# сразу для набора ППЭ; первый столбец — ppe_id (см. group_by_ppe)
+EQUIPMENT_ITEMS_BULK_AGG_QUERY = """
+    SELECT
+    ppe_id,
+    row_number() OVER (PARTITION BY ppe_id ORDER BY equip_name) AS row_num,
+    equip_name,
+    equip_count,
+    inv_numbers,
+    equip_price                    AS price,
+    equip_price * equip_count      AS total_price
+    FROM equip_agg_ppe
+    WHERE exam_year = %s AND ppe_id = ANY(%s::integer[])
+    ORDER BY ppe_id, equip_name
+"""
+EQUIPMENT_ITEMS_BULK_QUERY = """
+    SELECT
+    ppe_id,
+    row_number() OVER (PARTITION BY ppe_id ORDER BY "name_in_1C") AS row_num,
+    "name_in_1C"                   AS equip_name,
+    COUNT(*)                       AS equip_count,
+    string_agg(DISTINCT inv_number::text, '\n ') AS inv_numbers,
+    equip_price                    AS price,
+    equip_price * COUNT(*)         AS total_price
+    FROM equip_data
+    JOIN "dat_equip"
+        ON "dat_equip"."id" = equip_data.equip_id
+    WHERE exam_year = %s AND ppe_id = ANY(%s::integer[])
+    GROUP BY ppe_id, "name_in_1C", equip_price
+    ORDER BY ppe_id, "name_in_1C"
+"""
+PPE_CONTRACTS_BULK_QUERY = """
+    SELECT DISTINCT ed.ppe_id, c.id, c.contract_number, c.contract_date, c.contract_name
+    FROM equip_data ed
+    JOIN dat_contract c ON ed.contract_id = c.id AND c.exam_year = ed.exam_year
+    WHERE ed.exam_year = %s AND ed.ppe_id = ANY(%s::integer[])
+    ORDER BY ed.ppe_id, c.id
+"""
+
+# Спецификация запрашивается при генерации каждого договора — готовится один раз на соединение
+register_statement("equipment_list_agg", EQUIPMENT_ITEMS_AGG_QUERY)
+register_statement("equipment_list", EQUIPMENT_ITEMS_QUERY)
+
+
+def get_equipment_items(ppe_id):
+    """Спецификация оборудования ППЭ для договора (список EquipmentItem)."""
+    statement = "equipment_list_agg" if USE_EQUIPMENT_AGGREGATES else "equipment_list"
+    return execute_prepared(statement, (get_exam_year(), ppe_id), record=EquipmentItem)
+
+def get_school_equipment_items(school_id):
+    """Спецификация оборудования организации без договора (список EquipmentItem)."""
+    query = SCHOOL_EQUIPMENT_ITEMS_AGG_QUERY if USE_EQUIPMENT_AGGREGATES else SCHOOL_EQUIPMENT_ITEMS_QUERY
+    return execute_query(query, (get_exam_year(), school_id), record=EquipmentItem)
+
+def get_ppe_contracts(ppe_id):
+    """Договоры, с которыми связано оборудование ППЭ (список ContractRecord)."""
+    return execute_query(PPE_CONTRACTS_QUERY, (get_exam_year(), ppe_id), record=ContractRecord)
+
+def iter_equip_data(ppe_id=None, batch_size=STREAM_BATCH_SIZE):
+    """Потоково отдаёт пачки EquipDataRecord из серверного курсора."""
+    return _iter_equip_data(ppe_id, batch_size, record=EquipDataRecord)
+
+def equipment_items_bulk_query():
+    """Запрос спецификаций для набора ППЭ: параметры (год, список ppe_id)."""
+    return EQUIPMENT_ITEMS_BULK_AGG_QUERY if USE_EQUIPMENT_AGGREGATES else EQUIPMENT_ITEMS_BULK_QUERY
+
+def group_by_ppe(rows, record):
+    """Раскладывает строки пакетного запроса по ppe_id (первый столбец) в записи record."""
+    grouped = {}
+    for row in rows:
+        grouped.setdefault(row[0], []).append(record(*row[1:]))
+    return grouped
@@ -0,0 +1,28 @@
+import pytest
+
+pytest.importorskip("docxtpl")
+pytest.importorskip("num2words")
+pytest.importorskip("pymorphy2")
+
+from batch_contracts import _contract_filename
+
+
+def test_contract_filename_replaces_forbidden_characters():
+    assert _contract_filename("12/2025", 1, set()) == "Договор_12_2025.docx"
+
+
+def test_contract_filename_collisions_get_unique_names():
+    used = set()
+    names = [
+        _contract_filename("1/2", 7, used),
+        _contract_filename("1:2", 8, used),
+        _contract_filename("1_2_8", 9, used),
+        _contract_filename("1|2", 8, used),
+    ]
+    assert names == [
+        "Договор_1_2.docx",
+        "Договор_1_2_8.docx",
+        "Договор_1_2_8_9.docx",
+        "Договор_1_2_8_2.docx",
+    ]
+    assert len(set(names)) == len(names) == len(used)
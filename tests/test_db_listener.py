@@ -0,0 +1,81 @@
+import psycopg2
+import pytest
+
+import database
+import db_listener
+from db_listener import ChangeEvent, ChangeListener
+
+
+class FakeCursor:
+    def __init__(self, conn):
+        self.conn = conn
+
+    def execute(self, query, params=None):
+        self.conn.executed.append(query)
+
+
+class FakeConnection:
+    def __init__(self):
+        self.executed = []
+        self.closed = False
+
+    def cursor(self):
+        return FakeCursor(self)
+
+
+def test_parse_payload():
+    event = ChangeListener._parse('{"table": "dat_responsible", "op": "UPDATE", "ids": [7]}')
+    assert event == ChangeEvent(table="dat_responsible", op="UPDATE", ids=[7])
+    assert ChangeListener._parse("не json") is None
+
+
+def test_psycopg3_backend_listens_with_configured_driver(monkeypatch):
+    opened = []
+
+    def connect(**config):
+        opened.append(config)
+        return FakeConnection()
+
+    def psycopg2_connect(**config):
+        raise AssertionError("при DB_BACKEND = 'psycopg3' psycopg2 не используется")
+
+    monkeypatch.setattr(db_listener.db_psycopg3, "connect", connect)
+    monkeypatch.setattr(db_listener.psycopg2, "connect", psycopg2_connect)
+    listener = ChangeListener({"host": "srv"}, callback=None, backend="psycopg3")
+    conn = listener._connect()
+    assert opened == [{"host": "srv", "autocommit": True}]
+    assert conn.executed == ["LISTEN ppe_changes"]
+
+
+def test_psycopg3_notifications_are_passed_to_callback(monkeypatch):
+    received = []
+    listener = ChangeListener({}, callback=received.append, backend="psycopg3")
+    batches = iter([[], ['{"table": "dat_ppe_details", "op": "INSERT", "ids": [3]}']])
+
+    def wait_notifies(conn, timeout):
+        try:
+            return next(batches)
+        except StopIteration:
+            listener.stop()
+            return []
+
+    monkeypatch.setattr(db_listener.db_psycopg3, "wait_notifies", wait_notifies)
+    listener._listen(FakeConnection())
+    assert received == [[ChangeEvent(table="dat_ppe_details", op="INSERT", ids=[3])]]
+
+
+def test_driver_errors_for_psycopg2_backend():
+    assert ChangeListener({}, None)._driver_errors() is psycopg2.Error
+
+
+@pytest.mark.parametrize("table", ["dat_ppe_details", "dat_responsible"])
+def test_organisation_change_maps_to_its_ppes(monkeypatch, table):
+    calls = []
+
+    def execute_query(query, params=None):
+        calls.append(params)
+        return [(11,), (12,)]
+
+    monkeypatch.setattr(database, "execute_query", execute_query)
+    assert database._changed_ppe_ids(ChangeEvent(table=table, op="UPDATE", ids=[5])) == [11, 12]
+    assert calls == [([5],)]
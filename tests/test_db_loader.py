@@ -0,0 +1,82 @@
+from contextlib import contextmanager
+
+import psycopg2
+import pytest
+
+import db
+
+
+class FakeCursor:
+    def __init__(self, conn):
+        self.conn = conn
+        self.row = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, query, params=None):
+        if params is None:
+            self.row = (len(self.conn.ids),)
+            return
+        if params["after"] in self.conn.fail_after:
+            raise psycopg2.OperationalError("соединение потеряно")
+        chunk = [i for i in self.conn.ids if i > params["after"]][:params["chunk"]]
+        self.row = (max(chunk, default=None), len(chunk), len(chunk), 0)
+
+    def fetchone(self):
+        return self.row
+
+
+class FakeConnection:
+    def __init__(self, ids, fail_after=()):
+        self.ids = ids
+        self.fail_after = fail_after
+        self.commits = 0
+        self.rolled_back = False
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def commit(self):
+        self.commits += 1
+
+    def rollback(self):
+        self.rolled_back = True
+
+
+@pytest.fixture
+def connection(monkeypatch):
+    holder = {}
+
+    @contextmanager
+    def get_connection(shared=True):
+        yield holder["conn"]
+
+    monkeypatch.setattr(db, "get_connection", get_connection)
+    monkeypatch.setattr(db, "invalidate_cache", lambda table: None)
+
+    def use(conn):
+        holder["conn"] = conn
+        return conn
+    return use
+
+
+def test_load_reports_progress_per_chunk(connection):
+    connection(FakeConnection(list(range(1, 6))))
+    calls = []
+    summary = db.load_ppe_details(chunk_size=2, progress=lambda done, total: calls.append((done, total)))
+    assert calls == [(2, 5), (4, 5), (5, 5)]
+    assert summary["read"] == summary["inserted"] == 5
+
+
+def test_load_error_keeps_committed_chunks(connection, caplog):
+    conn = connection(FakeConnection(list(range(1, 6)), fail_after={4}))
+    with pytest.raises(db.LoadError) as info:
+        db.load_ppe_details(chunk_size=2)
+    assert conn.rolled_back
+    assert info.value.after == 4
+    assert info.value.summary["read"] == 4
+    assert "после ППЭ id 4" in caplog.text
@@ -0,0 +1,139 @@
+import threading
+
+import pytest
+from psycopg2.pool import PoolError
+
+from db_pool import ConnectionPool
+
+
+class FakeCursor:
+    def __init__(self, conn):
+        self.conn = conn
+
+    def execute(self, query):
+        if self.conn.broken:
+            raise ConnectionError("server closed the connection")
+
+    def close(self):
+        pass
+
+
+class FakeConnection:
+    def __init__(self):
+        self.closed = False
+        self.broken = False
+        self.rollbacks = 0
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def rollback(self):
+        self.rollbacks += 1
+
+    def get_transaction_status(self):
+        return 0
+
+    def close(self):
+        self.closed = True
+
+
+def make_pool(maxconn=2, **kwargs):
+    opened = []
+
+    def connect():
+        conn = FakeConnection()
+        opened.append(conn)
+        return conn
+
+    kwargs.setdefault("checkout_timeout", 0.2)
+    pool = ConnectionPool(0, maxconn, connect=connect, errors=(ConnectionError,), **kwargs)
+    return pool, opened
+
+
+def test_nested_checkout_in_thread_reuses_connection():
+    pool, opened = make_pool()
+    with pool.connection() as outer:
+        with pool.connection() as inner:
+            assert inner is outer
+        assert pool.stats()["in_use"] == 1
+    assert pool.stats() == {"size": 1, "idle": 1, "in_use": 0, "maxconn": 2}
+    assert len(opened) == 1
+
+
+def test_unshared_checkout_gets_separate_connection():
+    pool, _ = make_pool()
+    with pool.connection() as shared:
+        with pool.connection(shared=False) as own:
+            assert own is not shared
+
+
+def test_returned_connection_is_reused():
+    pool, opened = make_pool()
+    with pool.connection():
+        pass
+    with pool.connection():
+        pass
+    assert len(opened) == 1
+
+
+def test_checkout_times_out_when_pool_is_full():
+    pool, _ = make_pool(maxconn=1)
+    held = pool.getconn(shared=False)
+    with pytest.raises(PoolError):
+        pool.getconn(shared=False)
+    pool.putconn(held)
+    assert pool.getconn(shared=False) is held
+
+
+def test_waiting_thread_gets_returned_connection():
+    pool, _ = make_pool(maxconn=1, checkout_timeout=2.0)
+    held = pool.getconn(shared=False)
+    got = []
+    waiter = threading.Thread(target=lambda: got.append(pool.getconn(shared=False)))
+    waiter.start()
+    pool.putconn(held)
+    waiter.join(2.0)
+    assert got == [held]
+
+
+def test_broken_idle_connection_is_replaced():
+    pool, opened = make_pool(health_check_interval=0)
+    conn = pool.getconn(shared=False)
+    pool.putconn(conn)
+    conn.broken = True
+    fresh = pool.getconn(shared=False)
+    assert fresh is not conn
+    assert conn.closed
+    assert pool.stats()["size"] == 1
+    assert len(opened) == 2
+
+
+def test_failed_connect_releases_slot():
+    calls = []
+
+    def connect():
+        calls.append(1)
+        if len(calls) == 1:
+            raise ConnectionError("refused")
+        return FakeConnection()
+
+    pool = ConnectionPool(0, 1, checkout_timeout=0.2, connect=connect, errors=(ConnectionError,))
+    with pytest.raises(ConnectionError):
+        pool.getconn()
+    assert pool.stats()["size"] == 0
+    assert pool.getconn() is not None
+
+
+def test_rollback_of_open_transaction_on_return():
+    pool, _ = make_pool()
+    conn = pool.getconn(shared=False)
+    conn.get_transaction_status = lambda: 2
+    pool.putconn(conn)
+    assert conn.rollbacks == 1
+
+
+def test_closed_pool_refuses_checkout():
+    pool, _ = make_pool()
+    pool.closeall()
+    with pytest.raises(PoolError):
+        pool.getconn()
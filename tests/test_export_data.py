@@ -0,0 +1,48 @@
+import pytest
+
+import export_data
+from export_data import EXPORT_COUNT_QUERY, _FROM_CLAUSE, _format_of, export_dataset
+
+
+@pytest.mark.parametrize("path, fmt", [("a.csv", "csv"), ("B.TXT", "csv"), ("a.parquet", "parquet"), ("a.pq", "parquet")])
+def test_format_of(path, fmt):
+    assert _format_of(path) == fmt
+
+
+def test_format_of_unknown_extension():
+    with pytest.raises(ValueError):
+        _format_of("a.xlsx")
+
+
+def test_count_query_uses_export_joins():
+    assert EXPORT_COUNT_QUERY.endswith(_FROM_CLAUSE)
+
+
+def test_export_writes_csv_batches(tmp_path, monkeypatch):
+    row = tuple(range(len(export_data.EXPORT_COLUMNS)))
+    monkeypatch.setattr(export_data, "stream_query_batches", lambda query, params, size: iter([[row], [row, row]]))
+    monkeypatch.setattr(export_data, "execute_query", lambda query, params: [(3,)])
+    progress = []
+    path = tmp_path / "out.csv"
+    summary = export_dataset(str(path), progress=lambda done, total: progress.append((done, total)), exam_year=2025)
+    assert summary["rows"] == 3
+    assert progress == [(1, 3), (3, 3)]
+    assert len(path.read_text(encoding="utf-8-sig").splitlines()) == 4
+
+
+def test_failed_export_removes_file_and_keeps_original_error(tmp_path, monkeypatch):
+    def failing_batches(query, params, size):
+        yield [tuple(range(len(export_data.EXPORT_COLUMNS)))]
+        raise RuntimeError("связь с сервером потеряна")
+
+    class BrokenCloseWriter(export_data._CsvWriter):
+        def close(self):
+            super().close()
+            raise OSError("диск недоступен")
+
+    monkeypatch.setattr(export_data, "stream_query_batches", failing_batches)
+    monkeypatch.setitem(export_data.WRITERS, "csv", BrokenCloseWriter)
+    path = tmp_path / "out.csv"
+    with pytest.raises(RuntimeError, match="связь с сервером потеряна"):
+        export_dataset(str(path), exam_year=2025)
+    assert not path.exists()
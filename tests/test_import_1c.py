@@ -0,0 +1,77 @@
+import csv
+import io
+
+import pytest
+
+from import_1c import _CsvStream, _detect_encoding, _map_header, _normalize_price, _read_csv, _staging_rows
+
+
+def test_map_header_accepts_1c_aliases_in_any_order():
+    header = ["Цена", " Инв. № ", "Номенклатура", "ППЭ", "Прочее"]
+    assert _map_header(header) == [3, 2, 1, 0]
+
+
+def test_map_header_reports_missing_column():
+    with pytest.raises(ValueError, match="inv_number"):
+        _map_header(["ППЭ", "Наименование", "Цена"])
+
+
+@pytest.mark.parametrize("value, expected", [
+    ("1 234,50", "1234.50"),
+    ("12\xa0000", "12000"),
+    (1500, 1500),
+    (None, None),
+    ("  ", None),
+])
+def test_normalize_price(value, expected):
+    assert _normalize_price(value) == expected
+
+
+def test_staging_rows_skip_incomplete_and_number_lines():
+    rows = iter([
+        ["ППЭ", "Наименование", "Инвентарный номер", "Цена"],
+        [101.0, " Ноутбук ", 5001.0, "45 000,00"],
+        [101, "Принтер", "", "9000"],
+        [102, "Камера", "A-17"],
+        ["", "Сканер", "5003", "1"],
+    ])
+    stats = {"read": 0, "skipped": 0}
+    assert list(_staging_rows(rows, stats)) == [
+        (101, "Ноутбук", 5001, "45000.00", 2),
+        (102, "Камера", "A-17", None, 4),
+    ]
+    assert stats == {"read": 2, "skipped": 2}
+
+
+def test_staging_rows_of_empty_file():
+    assert list(_staging_rows(iter([]), {"read": 0, "skipped": 0})) == []
+
+
+def test_read_csv_detects_cp1251_and_delimiter(tmp_path):
+    path = tmp_path / "export.csv"
+    path.write_bytes("ППЭ;Наименование;Инв. номер;Цена\n101;Ноутбук;5001;1 000,00\n".encode("cp1251"))
+    assert _detect_encoding(path) == "cp1251"
+    assert list(_read_csv(path)) == [
+        ["ППЭ", "Наименование", "Инв. номер", "Цена"],
+        ["101", "Ноутбук", "5001", "1 000,00"],
+    ]
+
+
+def test_read_csv_utf8_with_bom(tmp_path):
+    path = tmp_path / "export.csv"
+    path.write_text("ППЭ,Наименование,Инв. номер,Цена\n101,Ноутбук,5001,100\n", encoding="utf-8-sig")
+    assert _detect_encoding(path) == "utf-8-sig"
+    assert next(_read_csv(path))[0] == "ППЭ"
+
+
+def test_csv_stream_yields_all_rows_in_small_reads():
+    rows = [(1, "Ноутбук, 15\"", 5001, "100.00", 2), (2, "Принтер", 5002, None, 3)]
+    stream = _CsvStream(iter(rows))
+    data = b""
+    while True:
+        chunk = stream.read(7)
+        if not chunk:
+            break
+        data += chunk
+    parsed = list(csv.reader(io.StringIO(data.decode("utf-8"))))
+    assert parsed == [["1", "Ноутбук, 15\"", "5001", "100.00", "2"], ["2", "Принтер", "5002", "", "3"]]
@@ -0,0 +1,305 @@
+import re
+from contextlib import contextmanager
+
+import psycopg2
+import pytest
+
+import database
+import local_replica
+from local_replica import LocalReplica
+
+
+@pytest.fixture
+def replica(tmp_path):
+    replica = LocalReplica(str(tmp_path / "replica.sqlite3"))
+    yield replica
+    replica._db.close()
+
+
+# ---------- Очередь записи ----------
+
+@pytest.fixture
+def server_writes(monkeypatch):
+    """Команды записи, дошедшие до «сервера»; down[0] = True имитирует обрыв связи."""
+    applied, down = [], [False]
+
+    def operation(*args):
+        if down[0]:
+            raise psycopg2.OperationalError("server closed the connection")
+        applied.append(args)
+        return 1
+
+    monkeypatch.setitem(database._WRITE_OPERATIONS, "update_equipment_agreement", operation)
+    return applied, down
+
+
+def test_flush_sends_queued_writes_in_order(replica, server_writes):
+    applied, _ = server_writes
+    for n in range(3):
+        replica.queue_write("update_equipment_agreement", [n, f"К-{n}", "01.03.2025", 2025])
+    replica.flush_pending_writes()
+    assert [args[0] for args in applied] == [0, 1, 2]
+    assert replica.pending_count() == 0
+
+
+def test_flush_stops_at_connection_error_and_keeps_rest(replica, server_writes):
+    applied, down = server_writes
+    replica.queue_write("update_equipment_agreement", [1, "К-1", "01.03.2025", 2025])
+    down[0] = True
+    with pytest.raises(psycopg2.OperationalError):
+        replica.flush_pending_writes()
+    assert replica.pending_count() == 1
+    down[0] = False
+    replica.flush_pending_writes()
+    assert applied == [(1, "К-1", "01.03.2025", 2025)]
+
+
+def test_new_write_goes_after_queued_writes(replica, server_writes, monkeypatch):
+    applied, _ = server_writes
+    monkeypatch.setattr(database, "_replica", replica)
+    replica.queue_write("update_equipment_agreement", [1, "старый", "01.03.2025", 2025])
+    assert database._write_or_queue("update_equipment_agreement", 1, "новый", "02.03.2025", 2025) == 1
+    assert [args[1] for args in applied] == ["старый", "новый"]
+
+
+def test_new_write_is_queued_while_server_is_down(replica, server_writes, monkeypatch):
+    applied, down = server_writes
+    monkeypatch.setattr(database, "_replica", replica)
+    replica.queue_write("update_equipment_agreement", [1, "старый", "01.03.2025", 2025])
+    down[0] = True
+    assert database._write_or_queue("update_equipment_agreement", 1, "новый", "02.03.2025", 2025) is None
+    down[0] = False
+    replica.flush_pending_writes()
+    assert [args[1] for args in applied] == ["старый", "новый"]
+
+
+# ---------- Синхронизация ----------
+
+class FakeServer:
+    """Таблица dat_equip с xmin строк и журналом удалений dat_equip_deleted."""
+
+    def __init__(self):
+        self.columns = ["id", "equip_type"]
+        self.rows = {}        # id -> (xmin, строка)
+        self.deleted = {}     # id -> row_version
+        self.has_delete_log = True
+        self.horizon = None   # последняя версия, удалённая из журнала (delete_log_horizon)
+        self.watermark = 100
+        self.queries = []
+
+    def put(self, xmin, *row):
+        self.rows[row[0]] = (xmin, row)
+
+    def delete(self, key, row_version):
+        del self.rows[key]
+        self.deleted[key] = row_version
+
+    @contextmanager
+    def connection(self, shared=True):
+        yield FakeConnection(self)
+
+
+class FakeConnection:
+    def __init__(self, server):
+        self.server = server
+
+    def cursor(self):
+        return FakeCursor(self.server)
+
+    def rollback(self):
+        pass
+
+
+class FakeCursor:
+    def __init__(self, server):
+        self.server = server
+        self.description = None
+        self._result = []
+
+    def execute(self, query, params=()):
+        server = self.server
+        query = " ".join(query.split())
+        server.queries.append(query)
+        self.description = None
+        if "txid_snapshot_xmin" in query:
+            self._result = [(server.watermark,)]
+        elif "to_regclass" in query:
+            self._result = [(server.has_delete_log, server.horizon is not None)]
+        elif "FROM delete_log_horizon" in query:
+            modulo, since, table = params
+            self._result = [(server.horizon % modulo >= since,)]
+        elif "dat_equip_deleted" in query:
+            modulo, since = params
+            self._result = [(key,) for key, version in server.deleted.items() if version % modulo >= since]
+        elif query.startswith("SELECT * FROM dat_equip"):
+            since = params[0] if "xmin" in query else 0
+            self.description = [(column,) for column in server.columns]
+            self._result = [row for xmin, row in server.rows.values() if xmin >= since]
+        elif re.match(r"SELECT id FROM dat_equip\b", query):
+            self._result = [(key,) for key in server.rows]
+        else:
+            raise AssertionError(f"Неожиданный запрос: {query}")
+
+    def fetchone(self):
+        return self._result[0] if self._result else None
+
+    def fetchall(self):
+        return list(self._result)
+
+
+@pytest.fixture
+def server(monkeypatch):
+    server = FakeServer()
+    monkeypatch.setattr(local_replica, "REPLICA_TABLES", {"dat_equip": "id"})
+    monkeypatch.setattr(database, "get_connection", server.connection)
+    return server
+
+
+def local_rows(replica):
+    return replica._query('SELECT * FROM "dat_equip" ORDER BY id')
+
+
+def test_full_copy_is_built_in_staging_table(replica, server, monkeypatch):
+    monkeypatch.setattr(local_replica, "STAGING_CHUNK_SIZE", 2)
+    for key in range(1, 6):
+        server.put(50, key, f"тип {key}")
+    assert replica.sync() == ["dat_equip"]
+    assert local_rows(replica) == [(key, f"тип {key}") for key in range(1, 6)]
+    assert replica.is_ready()
+    tables = {row[0] for row in replica._query("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    assert "dat_equip_staging" not in tables
+
+
+def test_incremental_sync_applies_changes_and_delete_log(replica, server):
+    server.put(50, 1, "ноутбук")
+    server.put(50, 2, "принтер")
+    server.put(50, 3, "сканер")
+    replica.sync()
+
+    server.put(120, 2, "МФУ")
+    server.delete(3, 110)
+    server.delete(1, 90)          # удалён до прошлой синхронизации — уже учтён
+    server.put(130, 4, "камера")
+    server.watermark = 140
+    assert replica.sync() == ["dat_equip"]
+    assert local_rows(replica) == [(1, "ноутбук"), (2, "МФУ"), (4, "камера")]
+    # Удаления берутся из журнала, без чтения всех ключей таблицы
+    assert not any(query.startswith("SELECT id FROM dat_equip ") for query in server.queries)
+
+
+def test_deleted_and_recreated_key_is_kept(replica, server):
+    server.put(50, 1, "ноутбук")
+    replica.sync()
+    server.delete(1, 110)
+    server.put(120, 1, "ноутбук (замена)")
+    server.watermark = 130
+    replica.sync()
+    assert local_rows(replica) == [(1, "ноутбук (замена)")]
+
+
+def test_server_without_delete_log_compares_keys(replica, server):
+    server.has_delete_log = False
+    server.put(50, 1, "ноутбук")
+    server.put(50, 2, "принтер")
+    replica.sync()
+    del server.rows[1]
+    server.watermark = 130
+    assert replica.sync() == ["dat_equip"]
+    assert local_rows(replica) == [(2, "принтер")]
+
+
+def test_schema_change_triggers_full_copy(replica, server):
+    server.put(50, 1, "ноутбук")
+    server.put(50, 2, "принтер")
+    replica.sync()
+    server.columns = ["id", "equip_type", "release_year"]
+    server.rows = {key: (50, row + (2020,)) for key, (_, row) in server.rows.items()}
+    server.watermark = 130
+    replica.sync()
+    assert local_rows(replica) == [(1, "ноутбук", 2020), (2, "принтер", 2020)]
+
+
+def test_pruned_delete_log_triggers_full_copy(replica, server):
+    server.put(50, 1, "ноутбук")
+    server.put(50, 2, "принтер")
+    replica.sync()
+    # Удаление строки 1 записано в журнал после синхронизации, но запись уже удалена
+    del server.rows[1]
+    server.horizon = 120
+    server.watermark = 130
+    assert replica.sync() == ["dat_equip"]
+    assert local_rows(replica) == [(2, "принтер")]
+
+    server.put(140, 3, "сканер")
+    server.watermark = 150
+    replica.sync()
+    assert local_rows(replica) == [(2, "принтер"), (3, "сканер")]
+    assert server.queries[-1].startswith("SELECT id FROM dat_equip_deleted")
+
+
+class FakeKeylessServer:
+    """Таблица dat_responsible без ключа: строки (xmin, строка)."""
+
+    def __init__(self):
+        self.rows = []
+        self.watermark = 100
+        self.full_reads = 0
+
+    @contextmanager
+    def connection(self, shared=True):
+        server = self
+
+        class Cursor:
+            description = None
+
+            def execute(self, query, params=()):
+                query = " ".join(query.split())
+                if "txid_snapshot_xmin" in query:
+                    self._result = [(server.watermark,)]
+                elif query.startswith("SELECT count(*)"):
+                    since = params[0]
+                    self._result = [(len(server.rows), sum(1 for xmin, _ in server.rows if xmin >= since))]
+                elif query == "SELECT * FROM dat_responsible":
+                    server.full_reads += 1
+                    self.description = [("school_id",), ("fullname",)]
+                    self._result = [row for _, row in server.rows]
+                else:
+                    raise AssertionError(f"Неожиданный запрос: {query}")
+
+            def fetchone(self):
+                return self._result[0]
+
+            def fetchall(self):
+                return list(self._result)
+
+        class Connection:
+            def cursor(self):
+                return Cursor()
+
+            def rollback(self):
+                pass
+
+        yield Connection()
+
+
+def test_keyless_table_is_reread_only_after_changes(replica, monkeypatch):
+    server = FakeKeylessServer()
+    monkeypatch.setattr(local_replica, "REPLICA_TABLES", {"dat_responsible": None})
+    monkeypatch.setattr(database, "get_connection", server.connection)
+    server.rows = [(50, (1, "Иванов")), (50, (2, "Петров"))]
+    assert replica.sync() == ["dat_responsible"]
+    assert server.full_reads == 1
+
+    server.watermark = 130
+    assert replica.sync() == []
+    assert server.full_reads == 1
+
+    server.rows[1] = (140, (2, "Сидоров"))
+    server.watermark = 150
+    assert replica.sync() == ["dat_responsible"]
+    assert server.full_reads == 2
+
+    del server.rows[0]          # удаление не меняет xmin оставшихся строк
+    server.watermark = 160
+    assert replica.sync() == ["dat_responsible"]
+    assert replica._query('SELECT * FROM "dat_responsible"') == [(2, "Сидоров")]
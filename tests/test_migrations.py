@@ -0,0 +1,161 @@
+from contextlib import contextmanager
+
+import pytest
+
+import database
+import migrations
+
+
+def _statements(version):
+    return next(statements for v, _, statements in migrations.MIGRATIONS if v == version)
+
+
+def _position(statements, fragment):
+    return next(i for i, statement in enumerate(statements) if fragment in statement)
+
+
+def test_partitioning_recreates_foreign_keys_after_copy():
+    statements = _statements(9)
+    captured = _position(statements, "CREATE TEMP TABLE exam_year_fkeys")
+    renamed = _position(statements, "RENAME TO dat_contract_unpartitioned")
+    copied = _position(statements, "INSERT INTO equip_data")
+    unique_key = _position(statements, "CREATE UNIQUE INDEX dat_contract_contract_number_key")
+    restored = statements.index(migrations._RESTORE_FOREIGN_KEYS)
+    # Ключи снимаются до переименования и восстанавливаются, когда есть
+    # все уникальные ключи новых таблиц, на которые они могут ссылаться
+    assert captured < renamed < copied < restored
+    assert unique_key < restored
+
+
+def test_partitioning_keeps_old_tables_and_years_from_data():
+    statements = _statements(9)
+    assert not any("DROP TABLE" in statement for statement in statements)
+    contracts = statements[_position(statements, "INSERT INTO dat_contract")]
+    assert "EXTRACT(YEAR FROM contract_date)" in contracts
+    equipment = statements[_position(statements, "INSERT INTO equip_data")]
+    assert "c.exam_year" in equipment
+
+
+class FakeCursor:
+    def __init__(self, conn):
+        self.conn = conn
+
+    def execute(self, query, params=None):
+        self.conn.queries.append((query, params))
+
+
+class FakeConnection:
+    def __init__(self):
+        self.queries = []
+        self.committed = False
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def commit(self):
+        self.committed = True
+
+
+def test_create_year_partitions_calls_server_function(monkeypatch):
+    conn = FakeConnection()
+
+    @contextmanager
+    def get_connection(shared=True):
+        yield conn
+    monkeypatch.setattr(migrations, "get_connection", get_connection)
+    migrations.create_year_partitions(2026)
+    assert conn.queries == [("SELECT create_exam_year_partitions(%s)", (2026,))]
+    assert conn.committed
+
+
+class FakeSchemaCursor:
+    def __init__(self, version):
+        self.version = version
+        self.row = None
+
+    def execute(self, query, params=None):
+        if "to_regclass" in query:
+            self.row = (self.version is not None,)
+        else:
+            self.row = (self.version,)
+
+    def fetchone(self):
+        return self.row
+
+
+class FakeSchemaPool:
+    def __init__(self, version):
+        self.version = version
+        self.closed = False
+
+    @contextmanager
+    def connection(self, shared=True):
+        conn = FakeConnection()
+        conn.cursor = lambda: FakeSchemaCursor(self.version)
+        conn.rollback = lambda: None
+        yield conn
+
+    def closeall(self):
+        self.closed = True
+
+
+@pytest.mark.parametrize("version", [None, 8])
+def test_pool_refuses_outdated_schema(monkeypatch, version):
+    pool = FakeSchemaPool(version)
+    monkeypatch.setattr(database, "_pool", None)
+    monkeypatch.setattr(database, "_make_pool", lambda config: pool)
+    with pytest.raises(database.SchemaVersionError, match="migrations.py migrate"):
+        database.get_pool()
+    assert pool.closed
+    assert database._pool is None
+
+
+def test_pool_accepts_migrated_schema(monkeypatch):
+    pool = FakeSchemaPool(database.REQUIRED_SCHEMA_VERSION)
+    monkeypatch.setattr(database, "_pool", None)
+    monkeypatch.setattr(database, "_make_pool", lambda config: pool)
+    monkeypatch.setattr(database.atexit, "register", lambda func: None)
+    assert database.get_pool() is pool
+
+
+class FakeDropCursor:
+    def __init__(self, conn):
+        self.conn = conn
+        self.row = None
+
+    def execute(self, query, params=None):
+        self.conn.queries.append(query)
+        if params:
+            self.row = (params[0] in self.conn.old_tables, True)
+        elif query.startswith("SELECT count(*)"):
+            self.row = (self.conn.missing[query.split()[3]],)
+
+    def fetchone(self):
+        return self.row
+
+
+class FakeDropConnection(FakeConnection):
+    def __init__(self, old_tables, missing):
+        super().__init__()
+        self.old_tables = old_tables
+        self.missing = missing
+
+    def cursor(self):
+        return FakeDropCursor(self)
+
+
+def test_drop_unpartitioned_keeps_tables_with_missing_rows(monkeypatch):
+    conn = FakeDropConnection(
+        {"equip_data_unpartitioned", "dat_contract_unpartitioned"},
+        {"equip_data_unpartitioned": 0, "dat_contract_unpartitioned": 3},
+    )
+
+    @contextmanager
+    def get_connection(shared=True):
+        yield conn
+    monkeypatch.setattr(migrations, "get_connection", get_connection)
+    missing = migrations.drop_unpartitioned_tables()
+    assert missing == {"equip_data": 0, "dat_contract": 3}
+    assert "DROP TABLE equip_data_unpartitioned" in conn.queries
+    assert "DROP TABLE dat_contract_unpartitioned" not in conn.queries
+    assert conn.committed
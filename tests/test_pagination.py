@@ -0,0 +1,82 @@
+import pytest
+
+import database
+from database import _page, get_ppe_page
+from local_replica import LocalReplica
+
+
+def test_page_without_extra_row_is_last():
+    assert _page([(1,), (2,)], 2, lambda row: row[0]) == ([(1,), (2,)], None)
+
+
+def test_page_with_extra_row_returns_key_of_last_kept_row():
+    assert _page([(1,), (2,), (3,)], 2, lambda row: row[0]) == ([(1,), (2,)], 2)
+
+
+def test_empty_page():
+    assert _page([], 2, lambda row: row[0]) == ([], None)
+
+
+# (id, ppe_address_fact, gia_type, ppe_number): повторяющиеся номера и ППЭ без номера
+PPE_ROWS = [
+    (1, "адрес 1", 1, "0102"),
+    (2, "адрес 2", 3, "0101"),
+    (3, "адрес 3", 1, "0102"),
+    (4, "адрес 4", 1, None),
+    (5, "адрес 5", 1, "0100"),
+    (6, "адрес 6", 3, None),
+    (7, "адрес 7", 1, "0103"),
+]
+
+
+@pytest.fixture
+def replica(tmp_path, monkeypatch):
+    replica = LocalReplica(str(tmp_path / "replica.sqlite3"))
+    replica._db.execute("CREATE TABLE dat_ppe (id PRIMARY KEY, ppe_address_fact, gia_type, ppe_number)")
+    replica._db.executemany("INSERT INTO dat_ppe VALUES (?, ?, ?, ?)", PPE_ROWS)
+    monkeypatch.setattr(database, "get_replica", lambda: replica)
+    yield replica
+    replica._db.close()
+
+
+def walk(limit, gia_type=None):
+    rows, after = [], None
+    while True:
+        page, after = get_ppe_page(after, gia_type, limit)
+        rows.extend(row[0] for row in page)
+        if after is None:
+            return rows
+
+
+@pytest.mark.parametrize("limit", [1, 2, 3, 7, 10])
+def test_pages_cover_list_once_in_server_order(replica, limit):
+    assert walk(limit) == [5, 2, 1, 3, 7, 4, 6]
+
+
+@pytest.mark.parametrize("limit", [1, 2, 4])
+def test_pages_with_gia_filter(replica, limit):
+    assert walk(limit, gia_type=1) == [5, 1, 3, 7, 4]
+
+
+def test_server_query_continues_after_key(monkeypatch):
+    calls = []
+    monkeypatch.setattr(database, "get_replica", lambda: None)
+    monkeypatch.setattr(database, "execute_query", lambda query, params: calls.append((query, params)) or [])
+
+    get_ppe_page(("0102", 3), 1, 2)
+    query, params = calls[-1]
+    assert "((ppe_number, id) > (%s, %s) OR ppe_number IS NULL)" in query
+    assert params == (1, "0102", 3, 3)
+
+    get_ppe_page((None, 4), None, 2)
+    query, params = calls[-1]
+    assert "ppe_number IS NULL AND id > %s" in query
+    assert params == (4, 3)
+
+
+@pytest.mark.parametrize("gia_type", [None, 1])
+def test_full_and_streamed_lists_use_page_order(replica, gia_type):
+    paged = walk(3, gia_type)
+    assert [row[0] for row in database.get_ppe_list(gia_type)] == paged
+    streamed = [row[0] for batch in database.iter_ppe_list(gia_type, batch_size=2) for row in batch]
+    assert streamed == paged
@@ -0,0 +1,88 @@
+import threading
+
+import prefetch
+from prefetch import BundlePrefetcher
+
+
+def test_depth_is_capped_and_sets_cache_size():
+    assert BundlePrefetcher(lambda key: key, depth=50).depth == BundlePrefetcher.MAX_DEPTH
+    assert BundlePrefetcher(lambda key: key, depth=2).max_entries == 9
+
+
+def test_lru_eviction_and_hit_counters():
+    prefetcher = BundlePrefetcher(lambda key: key, max_entries=2)
+    prefetcher.put(1, "первый")
+    prefetcher.put(2, "второй")
+    assert prefetcher.get(1) == "первый"      # 1 становится последним использованным
+    prefetcher.put(3, "третий")
+    assert prefetcher.get(2) is None
+    assert prefetcher.get("1") == "первый"
+    stats = prefetcher.stats()
+    assert (stats["entries"], stats["hits"], stats["misses"]) == (2, 2, 1)
+
+
+def test_expired_entry_is_dropped(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(prefetch.time, "monotonic", lambda: now[0])
+    prefetcher = BundlePrefetcher(lambda key: key, ttl=10)
+    prefetcher.put(1, "карточка")
+    now[0] = 111.0
+    assert prefetcher.get(1) is None
+    assert prefetcher.stats()["entries"] == 0
+
+
+def test_load_started_before_invalidate_is_discarded():
+    prefetcher = BundlePrefetcher(lambda key: key)
+    generation = prefetcher.generation
+    prefetcher.invalidate([1])
+    prefetcher.put(1, "устаревшая", generation)
+    assert prefetcher.get(1) is None
+    prefetcher.put(1, "новая", prefetcher.generation)
+    assert prefetcher.get(1) == "новая"
+
+
+def test_invalidate_selected_and_all():
+    prefetcher = BundlePrefetcher(lambda key: key)
+    for ppe_id in (1, 2, 3):
+        prefetcher.put(ppe_id, ppe_id)
+    prefetcher.invalidate([2])
+    assert [prefetcher.get(ppe_id) for ppe_id in (1, 2, 3)] == [1, None, 3]
+    prefetcher.invalidate()
+    assert prefetcher.stats()["entries"] == 0
+
+
+def test_background_thread_loads_scheduled_neighbours(monkeypatch):
+    monkeypatch.setattr(prefetch, "TIMEOUT_CONFIG", {"interactive": None})
+    loaded = []
+    done = threading.Event()
+
+    def load(key):
+        loaded.append(key)
+        if len(loaded) == 2:
+            done.set()
+        return f"карточка {key}"
+
+    prefetcher = BundlePrefetcher(load, depth=1)
+    prefetcher.put(5, "уже есть")
+    prefetcher.start()
+    try:
+        prefetcher.schedule([6, 5, 4])
+        assert done.wait(5)
+    finally:
+        prefetcher.stop()
+    prefetcher._thread.join(5)
+    # Карточка из кэша повторно не загружается
+    assert loaded == ["6", "4"]
+    assert prefetcher.get(4) == "карточка 4"
+
+
+def test_dropped_neighbour_load_is_cancelled(monkeypatch):
+    cancelled = []
+    monkeypatch.setattr(prefetch, "cancel_queries", cancelled.append)
+    prefetcher = BundlePrefetcher(lambda key: key)
+    prefetcher._loading = "7"
+    prefetcher.schedule([8, 9])
+    assert cancelled == ["ppe-prefetch-7"]
+    prefetcher._loading = "8"
+    prefetcher.schedule([8])
+    assert cancelled == ["ppe-prefetch-7"]
@@ -0,0 +1,94 @@
+from contextlib import contextmanager
+
+import psycopg2
+import pytest
+
+import database
+
+
+class FakeCursor:
+    def __init__(self, conn):
+        self.conn = conn
+
+    def execute(self, query, params=()):
+        if self.conn.fail:
+            error, self.conn.fail = self.conn.fail, None
+            raise error
+        self.conn.executed.append((query, params))
+
+    def fetchall(self):
+        return [("строка",)]
+
+
+class FakeConnection:
+    def __init__(self):
+        self.executed = []
+        self.fail = None
+        self.closed = False
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+
+@pytest.fixture
+def connections(monkeypatch):
+    """Соединения по очереди выдаются пулом; каждое помнит выполненные команды."""
+    pool = [FakeConnection(), FakeConnection()]
+    current = {"conn": pool[0]}
+
+    @contextmanager
+    def get_connection(shared=True):
+        yield current["conn"]
+
+    monkeypatch.setattr(database, "DB_BACKEND", "psycopg2")
+    monkeypatch.setattr(database, "get_connection", get_connection)
+    monkeypatch.setattr(database, "get_read_connection", get_connection)
+    monkeypatch.setitem(database._statements, "test_stmt", "SELECT name FROM dat_ppe WHERE id = %s AND gia_type = %s")
+    monkeypatch.setattr(database, "_prepared_stats", database.defaultdict(
+        lambda: {"prepares": 0, "executions": 0, "prepare_ms": 0.0, "execute_ms": 0.0}))
+    return pool, current
+
+
+def test_to_positional():
+    assert database._to_positional("SELECT %s, %s FROM t WHERE a = %s") == "SELECT $1, $2 FROM t WHERE a = $3"
+    assert database._to_positional("SELECT 1") == "SELECT 1"
+
+
+def test_statement_is_prepared_once_per_connection(connections):
+    pool, current = connections
+    assert database.execute_prepared("test_stmt", (1, 2)) == [("строка",)]
+    database.execute_prepared("test_stmt", (3, 4))
+    assert pool[0].executed == [
+        ("PREPARE test_stmt AS SELECT name FROM dat_ppe WHERE id = $1 AND gia_type = $2", ()),
+        ("EXECUTE test_stmt (%s, %s)", (1, 2)),
+        ("EXECUTE test_stmt (%s, %s)", (3, 4)),
+    ]
+
+    current["conn"] = pool[1]
+    database.execute_prepared("test_stmt", (5, 6))
+    assert pool[1].executed[0][0].startswith("PREPARE test_stmt")
+
+    stats = database._prepared_stats["test_stmt"]
+    assert stats["prepares"] == 2 and stats["executions"] == 3
+
+
+def test_lost_connection_is_retried_once(connections):
+    pool, _ = connections
+    pool[0].fail = psycopg2.OperationalError("обрыв")
+    assert database.execute_prepared("test_stmt", (1, 2)) == [("строка",)]
+    # Оператор не был подготовлен: повтор снова готовит его и выполняет
+    assert [query.split()[0] for query, _ in pool[0].executed] == ["PREPARE", "EXECUTE"]
+
+
+def test_query_error_is_not_retried(connections):
+    pool, _ = connections
+    pool[0].fail = psycopg2.ProgrammingError("ошибка запроса")
+    with pytest.raises(psycopg2.ProgrammingError):
+        database.execute_prepared("test_stmt", (1, 2))
+    assert pool[0].executed == []
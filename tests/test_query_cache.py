@@ -0,0 +1,79 @@
+import query_cache
+from query_cache import QueryCache, write_target_table, write_target_tables
+
+
+def test_key_normalizes_whitespace_and_dict_params():
+    assert QueryCache.make_key("SELECT  *\n FROM t", None) == QueryCache.make_key("SELECT * FROM t", ())
+    assert QueryCache.make_key("q", {"b": 2, "a": 1}) == QueryCache.make_key("q", {"a": 1, "b": 2})
+
+
+def test_get_counts_hits_and_misses():
+    cache = QueryCache()
+    key = QueryCache.make_key("SELECT 1", ())
+    assert cache.get(key) == (False, None)
+    cache.put(key, [(1,)], {"t"})
+    assert cache.get(key) == (True, [(1,)])
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["hit_rate"]) == (1, 1, 0.5)
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = QueryCache(max_entries=2)
+    cache.put("a", 1, ())
+    cache.put("b", 2, ())
+    cache.get("a")
+    cache.put("c", 3, ())
+    assert cache.get("b") == (False, None)
+    assert cache.get("a") == (True, 1)
+    assert cache.get("c") == (True, 3)
+
+
+def test_expired_entry_is_dropped(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(query_cache.time, "monotonic", lambda: now[0])
+    cache = QueryCache(ttl=10)
+    cache.put("a", 1, ())
+    now[0] = 109.9
+    assert cache.get("a") == (True, 1)
+    now[0] = 110.0
+    assert cache.get("a") == (False, None)
+    assert cache.stats()["entries"] == 0
+
+
+def test_invalidate_drops_only_dependent_entries():
+    cache = QueryCache()
+    cache.put("ppe", 1, {"dat_ppe"})
+    cache.put("join", 2, {"dat_ppe", "dat_equip"})
+    cache.put("equip", 3, {"dat_equip"})
+    assert cache.invalidate("DAT_PPE") == 2
+    assert cache.get("equip") == (True, 3)
+    assert cache.get("ppe") == (False, None)
+    assert cache.stats()["invalidations"] == 2
+
+
+def test_write_target_table():
+    assert write_target_table("INSERT INTO dat_contract (a) VALUES (1)") == "dat_contract"
+    assert write_target_table('  update public."Equip_Data" SET x = 1') == "equip_data"
+    assert write_target_table("DELETE FROM ONLY dat_ppe WHERE id = 1") == "dat_ppe"
+    assert write_target_table("SELECT * FROM dat_ppe") is None
+
+
+def test_write_target_tables_in_cte_and_not_locking_reads():
+    query = """
+        WITH moved AS (
+            UPDATE equip_data ed SET contract_id = %s WHERE ed.id = ANY(%s) RETURNING ed.id
+        )
+        INSERT INTO dat_contract_log (equip_id) SELECT id FROM moved
+        ON CONFLICT (equip_id) DO UPDATE SET equip_id = EXCLUDED.equip_id
+    """
+    assert write_target_tables(query) == ["equip_data", "dat_contract_log"]
+    assert write_target_tables("WITH d AS (DELETE FROM dat_ppe RETURNING id) SELECT count(*) FROM d") == ["dat_ppe"]
+    assert write_target_tables("SELECT * FROM equip_data WHERE id = 1 FOR UPDATE") == []
+    assert write_target_tables("SELECT * FROM equip_data FOR UPDATE OF equip_data SKIP LOCKED") == []
+
+
+def test_cte_write_is_not_a_read():
+    import database
+    assert database._is_read_query("WITH p AS (SELECT 1) SELECT * FROM p")
+    assert not database._is_read_query("WITH u AS (UPDATE dat_ppe SET gia_type = 1 RETURNING id) SELECT * FROM u")
+    assert not database._is_routable_read("SELECT id FROM dat_ppe FOR SHARE")
@@ -0,0 +1,82 @@
+import psycopg2
+import psycopg2.errors
+import pytest
+
+import database
+
+
+class FakeConnection:
+    def __init__(self):
+        self.executed = []
+        self.cancels = 0
+
+    def cursor(self):
+        conn = self
+
+        class Cursor:
+            def execute(self, query, params=()):
+                conn.executed.append((query, params))
+        return Cursor()
+
+    def cancel(self):
+        self.cancels += 1
+
+
+@pytest.fixture(autouse=True)
+def backend(monkeypatch):
+    monkeypatch.setattr(database, "DB_BACKEND", "psycopg2")
+
+
+def test_without_scope_nothing_is_registered():
+    conn = FakeConnection()
+    with database._scoped(conn):
+        assert not database._running.get("any")
+    assert conn.executed == []
+
+
+def test_scope_sets_statement_timeout_and_registers_connection():
+    conn = FakeConnection()
+    with database.query_scope("ppe-1", timeout=5000):
+        with database._scoped(conn):
+            assert conn in database._running["ppe-1"]
+            assert conn.executed == [("SELECT set_config('statement_timeout', %s, true)", ("5000",))]
+        assert conn not in database._running["ppe-1"]
+    assert "ppe-1" not in database._scopes
+
+
+def test_cancel_interrupts_running_and_rejects_later_queries():
+    conn = FakeConnection()
+    with database.query_scope("ppe-2"):
+        with database._scoped(conn):
+            assert database.cancel_queries("ppe-2") == 1
+        assert conn.cancels == 1
+        with pytest.raises(psycopg2.errors.QueryCanceled) as error:
+            with database._scoped(FakeConnection()):
+                pass
+        assert database.is_cancelled_error(error.value)
+    # После выхода из блока группа снова доступна
+    with database.query_scope("ppe-2"):
+        with database._scoped(FakeConnection()):
+            pass
+
+
+def test_cancel_of_inactive_group_does_nothing():
+    assert database.cancel_queries("ppe-3") == 0
+    with database.query_scope("ppe-3"):
+        with database._scoped(FakeConnection()):
+            pass
+
+
+def test_nested_scope_restores_outer_group():
+    with database.query_scope("outer"):
+        with database.query_scope("inner", timeout=100):
+            assert database._scope.current == ("inner", 100)
+        assert database._scope.current == ("outer", None)
+    assert database._scope.current is None
+
+
+def test_cancelled_error_is_not_a_connection_error():
+    cancelled = psycopg2.errors.QueryCanceled("отмена")
+    assert database.is_cancelled_error(cancelled)
+    assert not database._is_connection_error(cancelled)
+    assert database._is_connection_error(psycopg2.OperationalError("обрыв"))
@@ -0,0 +1,60 @@
+import pytest
+
+import query_stats
+
+
+@pytest.fixture(autouse=True)
+def clean_stats(monkeypatch):
+    slow = []
+
+    class SlowLogger:
+        def warning(self, message):
+            slow.append(message)
+
+    monkeypatch.setattr(query_stats, "_get_slow_logger", lambda: SlowLogger())
+    query_stats.reset()
+    yield slow
+    query_stats.reset()
+
+
+def test_fingerprint_replaces_literals_and_parameters():
+    assert query_stats.fingerprint(
+        "SELECT *  FROM dat_ppe\n WHERE id = 15 AND name = 'О''Нил' AND gia_type = %s;"
+    ) == "SELECT * FROM dat_ppe WHERE id = ? AND name = ? AND gia_type = ?"
+    assert query_stats.fingerprint("SELECT %(id)s, 1.5") == "SELECT ?, ?"
+    # Цифры в именах не считаются литералами
+    assert query_stats.fingerprint("SELECT col1 FROM t2") == "SELECT col1 FROM t2"
+
+
+def test_summary_percentiles_and_totals():
+    for ms in range(1, 101):
+        query_stats.record(f"SELECT * FROM dat_ppe WHERE id = {ms}", ms / 1000, rows=1)
+    query_stats.record("SELECT 1", 0.5)
+    fast, slow = sorted(query_stats.summary(), key=lambda item: item["count"])
+    assert fast["fingerprint"] == "SELECT ?" and fast["count"] == 1
+    assert slow["count"] == 100
+    assert slow["rows"] == 100
+    assert slow["p50_ms"] == pytest.approx(51, abs=1)
+    assert slow["p95_ms"] == pytest.approx(95, abs=1)
+    assert slow["total_ms"] == pytest.approx(5050)
+    # Сводка отсортирована по суммарному времени
+    assert query_stats.summary()[0]["fingerprint"] == slow["fingerprint"]
+
+
+def test_only_slow_queries_are_logged(clean_stats, monkeypatch):
+    monkeypatch.setattr(query_stats, "SLOW_QUERY_THRESHOLD_MS", 100)
+    query_stats.record("SELECT 1", 0.05)
+    query_stats.record("SELECT 2", 0.25, rows=3)
+    assert len(clean_stats) == 1
+    assert "250.0 мс" in clean_stats[0] and "SELECT ?" in clean_stats[0]
+
+
+def test_samples_are_bounded(monkeypatch):
+    monkeypatch.setattr(query_stats, "MAX_SAMPLES", 5)
+    monkeypatch.setattr(query_stats, "_samples", query_stats.defaultdict(
+        lambda: {"timings": query_stats.deque(maxlen=query_stats.MAX_SAMPLES), "count": 0, "rows": 0}))
+    for i in range(20):
+        query_stats.record("SELECT 1", 0.001)
+    [item] = query_stats.summary()
+    assert item["count"] == 20
+    assert item["total_ms"] == pytest.approx(5.0)
@@ -0,0 +1,138 @@
+import threading
+from contextlib import contextmanager
+
+import pytest
+
+from read_replicas import ReadReplicaSet, LAG_QUERY
+
+
+class FakeCursor:
+    def __init__(self, pool):
+        self.pool = pool
+
+    def execute(self, query, params=None):
+        assert query == LAG_QUERY
+        if self.pool.error:
+            raise self.pool.error
+
+    def fetchone(self):
+        return (self.pool.lag,)
+
+
+class FakeConnection:
+    def __init__(self, pool):
+        self.pool = pool
+
+    def cursor(self):
+        return FakeCursor(self.pool)
+
+    def rollback(self):
+        pass
+
+
+class FakePool:
+    def __init__(self, config):
+        self.config = config
+        self.lag = 0
+        self.error = None
+        self.closed = False
+
+    @contextmanager
+    def connection(self, shared=True):
+        yield FakeConnection(self)
+
+    def closeall(self):
+        self.closed = True
+
+
+@pytest.fixture
+def pools():
+    return {}
+
+
+def make_set(pools, configs, **kwargs):
+    def make_pool(config):
+        pool = pools.setdefault(config["host"], FakePool(config))
+        return pool
+    return ReadReplicaSet(configs, make_pool, lambda e: isinstance(e, ConnectionError), **kwargs)
+
+
+def test_pick_returns_none_until_first_check(pools):
+    replicas = make_set(pools, [{"host": "r1"}])
+    replica = replicas._replicas[0]
+    assert replica.fresh is False
+    # Без проверки реплика не используется, и pick не обращается к сети сам
+    replicas._stop.set()
+    assert replicas.pick() is None
+    assert pools == {}
+
+
+def test_background_check_marks_fresh_replicas(pools):
+    replicas = make_set(pools, [{"host": "r1"}, {"host": "r2"}], check_interval=60)
+    pools["r2"] = FakePool({"host": "r2"})
+    pools["r2"].lag = 30
+    try:
+        assert replicas.wait_checked(timeout=5)
+        assert replicas.pick().name == "r1:5432"
+        assert replicas.pick().name == "r1:5432"
+        assert replicas.stats()["replicas"]["r2:5432"] == {"fresh": False, "lag": 30.0}
+    finally:
+        replicas.closeall()
+    assert pools["r1"].closed and pools["r2"].closed
+    assert not replicas._thread.is_alive()
+
+
+def test_closeall_stops_reading_from_replicas(pools):
+    replicas = make_set(pools, [{"host": "r1"}], check_interval=60)
+    assert replicas.wait_checked(timeout=5)
+    replicas.closeall()
+    # После закрытия пул пуст, поэтому реплика не должна выбираться
+    assert replicas._replicas[0].fresh is False
+    assert replicas._replicas[0].pool is None
+    assert replicas.pick() is None
+
+
+def test_not_streaming_replica_is_stale(pools):
+    replicas = make_set(pools, [{"host": "r1"}])
+    pools["r1"] = FakePool({"host": "r1"})
+    pools["r1"].lag = None
+    replicas._check(replicas._replicas[0])
+    assert replicas._replicas[0].fresh is False
+    assert replicas._replicas[0].lag is None
+
+
+def test_unavailable_replica_is_stale(pools):
+    replicas = make_set(pools, [{"host": "r1"}])
+    replica = replicas._replicas[0]
+    replicas._check(replica)
+    assert replica.fresh is True
+    pools["r1"].error = ConnectionError("нет связи")
+    replicas._check(replica)
+    assert replica.fresh is False and replica.lag is None
+
+
+def test_connection_failure_excludes_replica(pools):
+    replicas = make_set(pools, [{"host": "r1"}])
+    replica = replicas._replicas[0]
+    replicas._check(replica)
+    with pytest.raises(ConnectionError):
+        with replicas.connection(replica):
+            raise ConnectionError("обрыв")
+    assert replica.fresh is False
+
+
+def test_note_read_counts_under_concurrency(pools):
+    replicas = make_set(pools, [{"host": "r1"}])
+
+    def worker():
+        for i in range(2000):
+            replicas.note_read(i % 2 == 0)
+
+    threads = [threading.Thread(target=worker) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    stats = replicas.stats()
+    assert stats["reads"] == 8000
+    assert stats["fallbacks"] == 8000
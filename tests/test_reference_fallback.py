@@ -0,0 +1,55 @@
+import pytest
+
+import database
+
+
+class FakeIndex:
+    def __init__(self, ppe=None, details=None, responsible=None):
+        self.ppe, self.details, self.responsible = ppe or {}, details or {}, responsible or {}
+
+    def get_ppe(self, ppe_id):
+        return self.ppe.get(ppe_id)
+
+    def get_details(self, school_id):
+        return self.details.get(school_id)
+
+    def get_responsible(self, school_id):
+        return self.responsible.get(school_id)
+
+
+@pytest.fixture
+def server(monkeypatch):
+    """Запросы, ушедшие на сервер мимо индексов."""
+    queries = []
+
+    def cached_query(query, params=None, tables=()):
+        queries.append(query)
+        return [(3,)] if query.startswith("SELECT gia_type") else [(1, "0101", "адрес", 10, 3)]
+
+    def cached_prepared(name, params, tables=()):
+        queries.append(name)
+        return [(f"{name} с сервера",)]
+
+    monkeypatch.setattr(database, "cached_query", cached_query)
+    monkeypatch.setattr(database, "cached_prepared", cached_prepared)
+    monkeypatch.setattr(database, "get_replica", lambda: None)
+    return queries
+
+
+def test_indexed_values_do_not_query_server(server, monkeypatch):
+    index = FakeIndex(ppe={1: (1, "0101", "адрес", 10, 1)}, details={10: ("школа",)}, responsible={10: ("директор",)})
+    monkeypatch.setattr(database, "get_reference_index", lambda: index)
+    assert database.get_ppe_gia_type(1) == 1
+    assert database.get_ppe_info(1)[1] == "0101"
+    assert database.get_ppe_details(10) == ("школа",)
+    assert database.get_responsible_person(10) == ("директор",)
+    assert server == []
+
+
+def test_index_miss_falls_back_to_server(server, monkeypatch):
+    monkeypatch.setattr(database, "get_reference_index", lambda: FakeIndex())
+    assert database.get_ppe_gia_type(1) == 3
+    assert database.get_ppe_info(1) == (1, "0101", "адрес", 10, 3)
+    assert database.get_ppe_details(10) == ("ppe_details с сервера",)
+    assert database.get_responsible_person(10) == ("responsible_person с сервера",)
+    assert len(server) == 4
@@ -0,0 +1,41 @@
+from datetime import date
+
+import pytest
+
+from repository import ContractRecord, EquipDataRecord, EquipmentItem, group_by_ppe
+
+
+def test_records_have_no_instance_dict():
+    item = EquipmentItem(1, "Ноутбук", 2, "5001\n 5002", 1000, 2000)
+    assert not hasattr(item, "__dict__")
+    with pytest.raises(AttributeError):
+        item.extra = 1
+
+
+def test_record_fields_and_template_properties():
+    item = EquipmentItem(1, "Ноутбук", 2, "5001", 1000, 2000.5)
+    assert (item.equip_price, item.total_price) == ("1000.00", "2000.50")
+    assert item == EquipmentItem(1, "Ноутбук", 2, "5001", 1000, 2000.5)
+    contract = ContractRecord(7, "К-1", date(2025, 3, 1), "Поставка")
+    assert contract.date_contract == "01.03.2025"
+    assert ContractRecord(7, "К-1", None, "Поставка").date_contract == ""
+    assert EquipDataRecord(*range(11)).contract_id == 10
+
+
+
+
+
+def test_group_by_ppe_keeps_row_order_per_ppe():
+    rows = [
+        (2, 1, "К-1", None, "первый"),
+        (1, 5, "К-5", None, "пятый"),
+        (2, 3, "К-3", None, "третий"),
+    ]
+    grouped = group_by_ppe(rows, ContractRecord)
+    assert list(grouped) == [2, 1]
+    assert [c.num_contract for c in grouped[2]] == ["К-1", "К-3"]
+    assert grouped[1] == [ContractRecord(5, "К-5", None, "пятый")]
+
+
+def test_group_by_ppe_empty():
+    assert group_by_ppe([], ContractRecord) == {}
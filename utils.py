@@ -315,10 +315,15 @@ def save_contract_file(app, ppe_id, temp_file, contract_number, contract_date):
         from database import save_contract_data
         save_contract_data(ppe_id, contract_number, contract_date)
         
+        if affected_rows is None:
+            # Сервер недоступен: запись в очереди локальной реплики
+            equipment_status = "Сервер недоступен, отметка оборудования будет записана после восстановления связи"
+        else:
+            equipment_status = f"Обновлено записей оборудования: {affected_rows}"
         messagebox.showinfo(
-            "Успех", 
+            "Успех",
             f"Договор сохранен: {save_path}\n"
-            f"Обновлено записей оборудования: {affected_rows}"
+            f"{equipment_status}"
         )
         
         # Удаляем временный файл